@@ -13,7 +13,7 @@ from PyQt6.QtWidgets import (
     QSpinBox, QDialogButtonBox, QVBoxLayout, QHBoxLayout, QLabel, QTextEdit,
     QTableWidgetItem, QHeaderView, QInputDialog, QWidget, QFileDialog
 )
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal
 
 from ui.admin_ui import Ui_AdminWindow
 from modules import (
@@ -26,22 +26,42 @@ from modules import (
     chatbot as bot,
     recommendation as rec,
     excel_export,
+    export_cache,
+    product_import,
+    stock_watch,
+    stock_ledger,
+    forecast,
+    pricing,
+    cart as cart_mod,
 )
+from modules.print_queue import PrintQueue
 
 BASE_DIR = Path(__file__).resolve().parent
 
 
 class AdminWindow(QMainWindow):
+    # Sự kiện đổi trạng thái tồn kho (có thể phát từ luồng khác, Qt chuyển về luồng giao diện)
+    stockStatusChanged = pyqtSignal(object, object, object)
+
     def __init__(self, account: dict):
         super().__init__()
         self.account = account
         self.ui = Ui_AdminWindow()
         self.ui.setupUi(self)
-        self._cart = []          # [{"product_id", "name", "price", "quantity"}]
+        self._cart = cart_mod.Cart()    # giỏ hàng: tổng tiền cộng dồn, báo đổi theo từng dòng
+        self._cart.subscribe(self._on_cart_changed)
         self._current_customer = None
         self._chat_context = bot.new_context()
+        self._print_queue = PrintQueue(
+            window=3.0, on_flush=self._on_print_batch_done,
+            schedule=lambda delay, cb: QTimer.singleShot(int(delay * 1000), cb))
         self._connect_signals()
         self._load_all()
+        self._refresh_cart()
+        self.stockStatusChanged.connect(self._on_stock_status_changed)
+        self._stock_listener = self.stockStatusChanged.emit
+        stock_watch.subscribe(self._stock_listener)
+        self._update_low_stock_badge()
 
     # ── Kết nối sự kiện ──────────────────────────────────────────────────────
     def _connect_signals(self):
@@ -52,6 +72,8 @@ class AdminWindow(QMainWindow):
         u.btnAddProduct.clicked.connect(self.add_product)
         u.btnEditProduct.clicked.connect(self.edit_product)
         u.btnDeleteProduct.clicked.connect(self.delete_product)
+        u.btnImportProducts.clicked.connect(self.import_products)
+        u.btnReceipt.clicked.connect(self.record_receipt)
         u.btnLowStock.clicked.connect(self.show_low_stock)
         u.btnExpired.clicked.connect(self.show_expired)
         u.txtSearchProduct.returnPressed.connect(self.search_products)
@@ -66,7 +88,9 @@ class AdminWindow(QMainWindow):
         u.btnNewOrder.clicked.connect(self.new_order)
         u.btnViewOrder.clicked.connect(self.view_order)
         u.btnPrintInvoice.clicked.connect(self.print_invoice)
-        u.btnExportPDF.clicked.connect(self.export_excel)
+        u.btnExportPDF.clicked.connect(self.export_invoice_excel)
+        u.btnExportInvoicePDF.clicked.connect(self.export_invoice_pdf)
+        u.btnPrintBatch.clicked.connect(self.queue_print_batch)
         u.btnFindCustomer.clicked.connect(self.find_customer)
         u.btnAddToCart.clicked.connect(self.add_to_cart)
         u.btnRemoveFromCart.clicked.connect(self.remove_from_cart)
@@ -186,14 +210,116 @@ class AdminWindow(QMainWindow):
                          ["ID", "Tên sản phẩm", "Tồn kho", "Tối thiểu", "Ghi chú"])
         self.ui.statusbar.showMessage(f"  ⚠ Có {len(products)} sản phẩm sắp hết hàng")
 
+    def _update_low_stock_badge(self):
+        count = stock_watch.low_count()
+        self.ui.btnLowStock.setText(f"⚠️ Sắp hết hàng ({count})" if count else "⚠️ Sắp hết hàng")
+
+    def _on_stock_status_changed(self, product, before, after):
+        """Cập nhật huy hiệu khi một sản phẩm vượt ngưỡng tối thiểu (không quét lại kho)."""
+        self._update_low_stock_badge()
+        if after in (stock_watch.LOW, stock_watch.OUT):
+            self.ui.statusbar.showMessage(
+                f"  ⚠ {product.get('name', product.get('product_id', ''))}: {after} "
+                f"(còn {product.get('stock_quantity', 0)})")
+
+    def closeEvent(self, event):
+        stock_watch.unsubscribe(self._stock_listener)
+        super().closeEvent(event)
+
+    def import_products(self):
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Nhập sản phẩm từ file", "", "CSV / Excel (*.csv *.xlsx)")
+        if not path:
+            return
+        try:
+            summary, errors = product_import.import_products(path)
+        except (RuntimeError, ValueError, OSError) as e:
+            QMessageBox.critical(self, "Lỗi", str(e))
+            return
+        msg = (f"✅ Đã đọc {summary['rows']} dòng\n"
+               f"➕ Thêm mới: {summary['added']}\n"
+               f"✏️ Cập nhật: {summary['updated']}\n"
+               f"❌ Lỗi: {len(errors)}")
+        if errors:
+            report = product_import.write_error_report(errors, path)
+            msg += "\n\n" + "\n".join(f"Dòng {n}: {e}" for n, e in errors[:10])
+            msg += f"\n\nBáo cáo lỗi đầy đủ: {report}"
+        QMessageBox.information(self, "Nhập sản phẩm", msg)
+        self.load_products()
+
+    def record_receipt(self):
+        products = inv.get_all_products()
+        if not products:
+            QMessageBox.warning(self, "Chú ý", "Chưa có sản phẩm nào trong kho!")
+            return
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Nhập hàng")
+        dialog.resize(460, 300)
+        layout = QFormLayout(dialog)
+        cbo_product = QComboBox()
+        for p in products:
+            cbo_product.addItem(f"{p.get('product_id', '')} - {p.get('name', '')}",
+                                p.get("product_id"))
+        row = self.ui.tblProducts.currentRow()
+        if row >= 0 and self.ui.tblProducts.item(row, 0):
+            idx = cbo_product.findData(self.ui.tblProducts.item(row, 0).text())
+            if idx >= 0:
+                cbo_product.setCurrentIndex(idx)
+        spn_qty = QSpinBox()
+        spn_qty.setRange(1, 1_000_000)
+        txt_price = QLineEdit("0")
+        txt_date = QLineEdit(datetime.now().strftime(dh.ORDER_DATETIME_FORMAT))
+        txt_exp = QLineEdit()
+        txt_exp.setPlaceholderText("YYYY-MM-DD (tùy chọn)")
+        lbl_stock = QLabel()
+        layout.addRow("Sản phẩm *:", cbo_product)
+        layout.addRow("Số lượng *:", spn_qty)
+        layout.addRow("Giá nhập (đ):", txt_price)
+        layout.addRow("Ngày nhập:", txt_date)
+        layout.addRow("Hạn sử dụng:", txt_exp)
+        layout.addRow("Tồn kho tại ngày nhập:", lbl_stock)
+
+        def show_stock_at():
+            pid = cbo_product.currentData()
+            when = dh.parse_datetime(txt_date.text().strip())
+            lbl_stock.setText(str(stock_ledger.stock_at(when, pid)) if when and pid else "—")
+
+        cbo_product.currentIndexChanged.connect(show_stock_at)
+        txt_date.editingFinished.connect(show_stock_at)
+        show_stock_at()
+        btns = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        btns.accepted.connect(dialog.accept)
+        btns.rejected.connect(dialog.reject)
+        layout.addRow(btns)
+        if dialog.exec() != QDialog.DialogCode.Accepted:
+            return
+        when = dh.parse_datetime(txt_date.text().strip())
+        if when is None:
+            QMessageBox.warning(self, "Lỗi", "Ngày nhập không hợp lệ (DD/MM/YYYY HH:MM)!")
+            return
+        try:
+            price = int(float(txt_price.text().strip().replace(",", "") or 0))
+        except (ValueError, OverflowError):
+            QMessageBox.warning(self, "Lỗi", "Giá nhập không hợp lệ!")
+            return
+        import_id, err = stock_ledger.record_receipt(
+            cbo_product.currentData(), spn_qty.value(), price,
+            when=when, exp_date=txt_exp.text().strip() or None)
+        if err:
+            QMessageBox.warning(self, "Lỗi", err)
+            return
+        QMessageBox.information(self, "Thành công", f"✅ Đã ghi phiếu nhập {import_id}")
+        self.load_products()
+
     def show_expired(self):
         products = inv.check_expired()
         rows = [(p.get("product_id", ""), p.get("name", ""),
+                 f"{p['import_id']} ({p['lot_quantity']} SP)" if p.get("import_id") else "—",
                  p.get("exp_date", ""), p.get("days_left", ""),
                  "🔴 Hết hạn" if p.get("days_left", 1) <= 0 else "🟡 Sắp hết hạn")
                 for p in products]
         self._fill_table(self.ui.tblProducts, rows,
-                         ["ID", "Tên sản phẩm", "Ngày HH", "Còn (ngày)", "Trạng thái"])
+                         ["ID", "Tên sản phẩm", "Lô nhập", "Ngày HH", "Còn (ngày)", "Trạng thái"])
 
     def _product_dialog(self, product=None):
         dialog = QDialog(self)
@@ -367,17 +493,18 @@ class AdminWindow(QMainWindow):
             self._current_customer = c
             self.ui.txtOrderCustomerName.setText(c.get("name", ""))
             rank = c.get("rank", "")
-            discount = ord_mod.DISCOUNT_MAP.get(rank, 0)
+            discount = pricing.rank_rate(rank)
             self.ui.lineEdit.setText(f"Giỏ hàng | Hạng: {rank} | Giảm: {int(discount*100)}%")
         else:
             self._current_customer = None
             self.ui.txtOrderCustomerName.setText("Không tìm thấy")
             self.ui.lineEdit.setText("Giỏ hàng: (Khách lẻ)")
+        self._cart.set_rank(self._current_customer.get("rank", "") if self._current_customer else "")
 
     def add_to_cart(self):
-        products = inv.get_all_products()
+        products = stock_watch.in_stock_products()
         names = [f"{p.get('product_id','')} - {p.get('name','')} ({p.get('price',0):,.0f}đ)"
-                 for p in products if p.get("stock_quantity", 0) > 0]
+                 for p in products]
         if not names:
             QMessageBox.warning(self, "Thông báo", "Không có sản phẩm còn hàng!")
             return
@@ -385,65 +512,73 @@ class AdminWindow(QMainWindow):
         if not ok:
             return
         pid = name.split(" - ")[0]
-        product = inv.get_product_by_id(pid)
+        product = stock_watch.get_product(pid)
         if not product:
             return
         qty, ok2 = QInputDialog.getInt(self, "Số lượng", f"Số lượng ({product.get('stock_quantity',0)} còn lại):",
                                         1, 1, product.get("stock_quantity", 1))
         if not ok2:
             return
-        # Thêm vào giỏ
-        for item in self._cart:
-            if item["product_id"] == pid:
-                item["quantity"] += qty
-                self._refresh_cart()
-                return
-        self._cart.append({
-            "product_id": pid,
-            "name": product.get("name", pid),
-            "price": product.get("price", 0),
-            "quantity": qty,
-        })
-        self._refresh_cart()
+        # Thêm vào giỏ (cộng dồn nếu đã có, kiểm tra tồn kho trong bộ nhớ)
+        _, err = self._cart.add(product, qty)
+        if err:
+            QMessageBox.warning(self, "Thông báo", err)
 
     def remove_from_cart(self):
         row = self.ui.tblCart.currentRow()
         if row < 0:
             return
-        if row < len(self._cart):
-            self._cart.pop(row)
-        self._refresh_cart()
+        self._cart.remove_row(row)
+
+    def _on_cart_changed(self, action, row, item):
+        """Giỏ hàng đổi -> chỉ vẽ lại dòng bị đổi và dòng tổng tiền."""
+        if action == cart_mod.RESET:
+            self._refresh_cart()
+            return
+        if action == cart_mod.INSERTED:
+            self.ui.tblCart.insertRow(row)
+            self._set_cart_row(row, item)
+        elif action == cart_mod.UPDATED:
+            self._set_cart_row(row, item)
+        elif action == cart_mod.REMOVED:
+            self.ui.tblCart.removeRow(row)
+        self._update_cart_totals()
+
+    def _set_cart_row(self, r, item):
+        self.ui.tblCart.setItem(r, 0, QTableWidgetItem(item["name"]))
+        self.ui.tblCart.setItem(r, 1, QTableWidgetItem(str(item["quantity"])))
+        line_total = item["price"] * item["quantity"]
+        self.ui.tblCart.setItem(r, 2, QTableWidgetItem(f"{line_total:,.0f}đ"))
 
     def _refresh_cart(self):
+        """Vẽ lại toàn bộ bảng giỏ hàng (khi mở cửa sổ / xóa giỏ)."""
         self.ui.tblCart.setRowCount(0)
         self.ui.tblCart.setColumnCount(3)
         self.ui.tblCart.setHorizontalHeaderLabels(["Sản phẩm", "SL", "Giá"])
-        total = 0
         for r, item in enumerate(self._cart):
             self.ui.tblCart.insertRow(r)
-            self.ui.tblCart.setItem(r, 0, QTableWidgetItem(item["name"]))
-            self.ui.tblCart.setItem(r, 1, QTableWidgetItem(str(item["quantity"])))
-            line_total = item["price"] * item["quantity"]
-            self.ui.tblCart.setItem(r, 2, QTableWidgetItem(f"{line_total:,.0f}đ"))
-            total += line_total
-        discount_rate = ord_mod.DISCOUNT_MAP.get(
-            self._current_customer.get("rank", "") if self._current_customer else "", 0)
-        final = total * (1 - discount_rate)
+            self._set_cart_row(r, item)
+        self._update_cart_totals()
+
+    def _update_cart_totals(self):
+        t = self._cart.totals()
+        promo = " + KM" if t["line_discount"] or t["order_discount"] else ""
         self.ui.lblTotal.setText(
-            f"💰 Tạm tính: {total:,.0f}đ  |  Giảm ({int(discount_rate*100)}%): -{total*discount_rate:,.0f}đ  |  TỔNG: {final:,.0f}đ")
+            f"💰 Tạm tính: {t['subtotal']:,.0f}đ  |  Giảm ({int(t['discount_rate']*100)}%{promo}): "
+            f"-{t['discount']:,.0f}đ  |  TỔNG: {t['total']:,.0f}đ")
 
     def checkout(self):
         if not self._cart:
             QMessageBox.warning(self, "Chú ý", "Giỏ hàng trống!")
             return
         cid = self._current_customer.get("customer_id") if self._current_customer else ""
-        order, err = ord_mod.create_order(cid, self._cart)
+        order, err = ord_mod.create_order(cid, self._cart.items, voucher=self._cart.voucher)
         if err:
             QMessageBox.warning(self, "Lỗi", f"Không thể tạo đơn hàng:\n{err}")
             return
-        self._cart = []
-        self._refresh_cart()
+        self._cart.clear()
         self._current_customer = None
+        self._cart.set_rank("")
         self.ui.txtOrderPhone.clear()
         self.ui.txtOrderCustomerName.clear()
         self.ui.lineEdit.setText("Giỏ hàng:")
@@ -455,8 +590,7 @@ class AdminWindow(QMainWindow):
 
     def new_order(self):
         self.ui.tabWidget.setCurrentWidget(self.ui.tabOrders)
-        self._cart = []
-        self._refresh_cart()
+        self._cart.clear()
         self.ui.txtOrderPhone.setFocus()
 
     def view_order(self):
@@ -512,11 +646,19 @@ class AdminWindow(QMainWindow):
         ]
         QMessageBox.information(self, "Hóa đơn", "\n".join(lines))
 
-    def export_excel(self):
+    def export_invoice_excel(self):
         """Xuất hóa đơn Excel."""
+        self._export_invoice("excel")
+
+    def export_invoice_pdf(self):
+        """Xuất hóa đơn PDF."""
+        self._export_invoice("pdf")
+
+    def _export_invoice(self, kind):
+        label = "PDF" if kind == "pdf" else "Excel"
         row = self.ui.tblOrders.currentRow()
         if row < 0:
-            QMessageBox.warning(self, "Chú ý", "Vui lòng chọn đơn hàng để xuất Excel!")
+            QMessageBox.warning(self, "Chú ý", f"Vui lòng chọn đơn hàng để xuất {label}!")
             return
         oid = self.ui.tblOrders.item(row, 0).text()
         order = ord_mod.get_order_by_id(oid)
@@ -526,14 +668,33 @@ class AdminWindow(QMainWindow):
         products = inv.get_all_products()
         pmap = {p["product_id"]: p for p in products}
         try:
-            path = excel_export.export_invoice_excel(order, customer, pmap)
-            QMessageBox.information(self, "Xuất Excel thành công",
-                                     f"✅ Hóa đơn đã được xuất:\n{path}")
+            path, cached = export_cache.get_or_export_invoice(kind, order, customer, pmap)
+            note = " (đã có sẵn, không cần xuất lại)" if cached else ""
+            QMessageBox.information(self, f"Xuất {label} thành công",
+                                     f"✅ Hóa đơn đã được xuất{note}:\n{path}")
             os.startfile(path) if sys.platform == "win32" else None
         except RuntimeError as e:
             QMessageBox.warning(self, "Lỗi", str(e))
         except Exception as e:
-            QMessageBox.critical(self, "Lỗi", f"Không thể xuất Excel:\n{str(e)}")
+            QMessageBox.critical(self, "Lỗi", f"Không thể xuất {label}:\n{str(e)}")
+
+    def queue_print_batch(self):
+        """Đưa các đơn đang chọn vào hàng đợi in gộp một file PDF."""
+        rows = sorted({idx.row() for idx in self.ui.tblOrders.selectedIndexes()})
+        if not rows:
+            QMessageBox.warning(self, "Chú ý", "Vui lòng chọn đơn hàng cần in!")
+            return
+        oids = [self.ui.tblOrders.item(r, 0).text() for r in rows]
+        count = self._print_queue.submit(oids)
+        self.ui.statusbar.showMessage(
+            f"  🖨️ Đang chờ in gộp {count} hóa đơn (tự in sau {self._print_queue.window:.0f} giây)...")
+
+    def _on_print_batch_done(self, path, order_ids, err):
+        if err:
+            QMessageBox.warning(self, "Lỗi", f"Không thể in gộp hóa đơn {', '.join(order_ids)}:\n{err}")
+            return
+        self.ui.statusbar.showMessage(f"  ✅ Đã in gộp {len(order_ids)} hóa đơn: {path}")
+        os.startfile(path) if sys.platform == "win32" else None
 
     # ══════════════════════════════════════════════════════════════════════════
     #  GỢI Ý SẢN PHẨM
@@ -542,9 +703,7 @@ class AdminWindow(QMainWindow):
         skin_type = self.ui.cboSkinType.currentText().lower()
         concerns_text = self.ui.txtSkinConcerns.text().strip()
         concerns = [c.strip() for c in concerns_text.split(",") if c.strip()]
-        from modules.chatbot import extract_effects
-        effects = extract_effects(concerns) if concerns else []
-        products = rec.recommendation(skin_type=skin_type, effects=effects, limit=10)
+        products = rec.recommend_by_profile(skin_type, concerns, limit=10)
         self._show_recommend(products)
 
     def get_routine(self):
@@ -604,20 +763,35 @@ class AdminWindow(QMainWindow):
         self.ui.lblTotalCustomers.setText(f"👥 Tổng khách hàng: {summary['total_customers']}")
         self.ui.lblTotalOrders.setText(f"🛒 Tổng đơn hàng: {summary['total_orders']}")
         self.ui.lblTotalRevenue.setText(f"💰 Tổng doanh thu: {summary['total_revenue']:,.0f}đ")
+        gm = ana.get_margin_summary()
+        self.ui.lblGrossMargin.setText(
+            f"📊 Lãi gộp: {gm['gross_margin']:,.0f}đ ({gm['margin_pct']:.1f}%)")
 
         top = ana.get_top_products()
-        rows = [(i + 1, p["name"], p["sold"], f"{p['revenue']:,.0f}đ")
+        by_product = ana.get_margin_by_product()
+        rows = [(i + 1, p["name"], p["sold"], f"{p['revenue']:,.0f}đ",
+                 f"{by_product.get(p['product_id'], {}).get('gross_margin', 0):,.0f}đ")
                 for i, p in enumerate(top)]
         self._fill_table(self.ui.tblTopProducts, rows,
-                         ["Hạng", "Sản phẩm", "Đã bán", "Doanh thu"])
+                         ["Hạng", "Sản phẩm", "Đã bán", "Doanh thu", "Lãi gộp"])
 
-        low = ana.get_low_stock_products()
-        rows2 = [("⚠ Sắp hết", p.get("name", ""),
-                  p.get("stock_quantity", 0), p.get("min_quantity", 5),
-                  max(0, p.get("min_quantity", 5) * 3 - p.get("stock_quantity", 0)))
-                 for p in low]
+        # Kế hoạch nhập cho mọi sản phẩm: hàng bán nhanh có thể cần nhập dù tồn kho còn > 10
+        products = inv.get_all_products()
+        plans = forecast.reorder_plan(products)
+        rows2 = []
+        for p in products:
+            plan = plans[p["product_id"]]
+            if plan["suggested_quantity"] <= 0:
+                continue
+            status = stock_watch.status_of(p.get("stock_quantity", 0),
+                                           p.get("min_quantity", stock_watch.DEFAULT_MIN_QUANTITY))
+            rows2.append(("🔄 Cần nhập" if status == stock_watch.IN_STOCK else f"⚠ {status}",
+                          p.get("name", ""), p.get("stock_quantity", 0), p.get("min_quantity", 5),
+                          f"{plan['velocity']:.2f}", plan["reorder_point"],
+                          plan["suggested_quantity"]))
         self._fill_table(self.ui.tblLowStock, rows2,
-                         ["Trạng thái", "Sản phẩm", "Tồn kho", "Tối thiểu", "Đề xuất nhập"])
+                         ["Trạng thái", "Sản phẩm", "Tồn kho", "Tối thiểu", "Bán/ngày",
+                          "Điểm đặt hàng", "Đề xuất nhập"])
 
     def export_excel(self):
         """Xuất báo cáo doanh thu Excel."""
@@ -17,6 +17,9 @@ from modules import (
     customers as cust_mod,
     chatbot as bot,
     recommendation as rec,
+    bought_together,
+    stock_watch,
+    cart as cart_mod,
 )
 
 
@@ -28,11 +31,13 @@ class CustomerWindow(QMainWindow):
         self.customer = cust_mod.get_customer_by_id(self.customer_id) if self.customer_id else {}
         self.ui = Ui_CustomerWindow()
         self.ui.setupUi(self)
-        self._cart = []          # [{"product_id", "name", "price", "quantity"}]
+        self._cart = cart_mod.Cart(self.customer.get("rank", "") if self.customer else "")
+        self._cart.subscribe(self._on_cart_changed)   # vẽ lại đúng dòng bị đổi
         self._chat_context = bot.new_context()
         self._selected_product = None   # sản phẩm đang xem chi tiết
         self._connect_signals()
         self._load_all()
+        self._refresh_cart()
 
     # ── Kết nối sự kiện ──────────────────────────────────────────────────────
     def _connect_signals(self):
@@ -195,15 +200,29 @@ class CustomerWindow(QMainWindow):
         u.spinDetailQty.setMaximum(max(1, stock))
         u.btnDetailAddCart.setEnabled(stock > 0)
 
-        # Sản phẩm tương tự
+        # Khách mua sản phẩm này cũng mua + sản phẩm tương tự
+        pid = product.get("product_id")
+        also = self._in_stock_products(bought_together.also_bought(pid, limit=5))
         related = rec.recommend_by_skin_type(
-            (product.get("skin-type") or ["mọi loại da"])[0], limit=6)
-        related = [p for p in related if p.get("product_id") != product.get("product_id")][:5]
-        rows = [(p.get("name",""), p.get("brand",""),
+            (product.get("skin-type") or ["mọi loại da"])[0], limit=6 + len(also))
+        seen = {pid} | {p.get("product_id") for p in also}
+        similar = [p for p in related if p.get("product_id") not in seen]
+        rows = [("🛒 " + p.get("name",""), p.get("brand",""),
                  f"{p.get('price',0):,.0f}đ", ", ".join(p.get("effects",[])))
-                for p in related]
+                for p in also[:3]]
+        rows += [(p.get("name",""), p.get("brand",""),
+                  f"{p.get('price',0):,.0f}đ", ", ".join(p.get("effects",[])))
+                 for p in similar[:5 - len(rows)]]
         self._fill_table(u.tblRelated, rows, ["Tên", "Thương hiệu", "Giá", "Công dụng"])
 
+    @staticmethod
+    def _in_stock_products(product_ids):
+        """Đổi danh sách mã sản phẩm thành sản phẩm còn hàng (giữ thứ tự)."""
+        if not product_ids:
+            return []
+        products = [stock_watch.get_product(pid) for pid in product_ids]
+        return [p for p in products if p and p.get("stock_quantity", 0) > 0]
+
     def detail_add_cart(self):
         if not self._selected_product:
             return
@@ -233,9 +252,7 @@ class CustomerWindow(QMainWindow):
             skin_type = ""
         concerns_text = self.ui.txtMySkinConcerns.text().strip()
         concerns = [c.strip() for c in concerns_text.split(",") if c.strip()]
-        from modules.chatbot import extract_effects
-        effects = extract_effects(concerns)
-        products = rec.recommendation(skin_type=skin_type.lower(), effects=effects, limit=10)
+        products = rec.recommend_for_profile_cached(self.customer_id, skin_type, concerns, limit=10)
         self._show_my_recommend(products)
 
     def get_my_routine(self):
@@ -308,75 +325,88 @@ class CustomerWindow(QMainWindow):
     #  TAB GIỎ HÀNG
     # ══════════════════════════════════════════════════════════════════════════
     def _add_product_to_cart(self, product, quantity):
-        pid = product.get("product_id", "")
-        stock = product.get("stock_quantity", 0)
-        if stock == 0:
-            QMessageBox.warning(self, "Thông báo", "Sản phẩm này đã hết hàng!")
+        existed = self._cart.quantity_of(product.get("product_id", "")) > 0
+        _, err = self._cart.add(product, quantity)
+        if err:
+            QMessageBox.warning(self, "Thông báo", err)
             return
-        for item in self._cart:
-            if item["product_id"] == pid:
-                new_qty = item["quantity"] + quantity
-                if new_qty > stock:
-                    QMessageBox.warning(self, "Thông báo",
-                                         f"Chỉ còn {stock} sản phẩm trong kho!")
-                    return
-                item["quantity"] = new_qty
-                self._refresh_cart()
-                self.ui.statusbar.showMessage(f"  ✅ Đã cập nhật giỏ hàng: {product.get('name','')}")
-                return
-        self._cart.append({
-            "product_id": pid,
-            "name": product.get("name", pid),
-            "price": product.get("price", 0),
-            "quantity": quantity,
-        })
-        self._refresh_cart()
-        self.ui.statusbar.showMessage(f"  ✅ Đã thêm vào giỏ: {product.get('name','')}")
-        # Chuyển sang tab giỏ hàng sau khi thêm lần đầu (optional)
+        if existed:
+            self.ui.statusbar.showMessage(f"  ✅ Đã cập nhật giỏ hàng: {product.get('name','')}")
+        else:
+            self.ui.statusbar.showMessage(f"  ✅ Đã thêm vào giỏ: {product.get('name','')}")
+
+    def _on_cart_changed(self, action, row, item):
+        """Giỏ hàng đổi -> chỉ vẽ lại dòng bị đổi, tổng tiền và gợi ý mua kèm."""
+        if action == cart_mod.RESET:
+            self._refresh_cart()
+            return
+        if action == cart_mod.INSERTED:
+            self.ui.tblCart.insertRow(row)
+            self._set_cart_row(row, item)
+        elif action == cart_mod.UPDATED:
+            self._set_cart_row(row, item)
+        elif action == cart_mod.REMOVED:
+            self.ui.tblCart.removeRow(row)
+        self._update_cart_totals()
+        if action != cart_mod.TOTALS:
+            self._refresh_also_bought()
+
+    def _set_cart_row(self, r, item):
+        line = item["price"] * item["quantity"]
+        for c, val in enumerate([
+            item["product_id"], item["name"],
+            f"{item['price']:,.0f}đ", str(item["quantity"]),
+            f"{line:,.0f}đ"
+        ]):
+            wi = QTableWidgetItem(val)
+            wi.setFlags(wi.flags() & ~Qt.ItemFlag.ItemIsEditable)
+            self.ui.tblCart.setItem(r, c, wi)
 
     def _refresh_cart(self):
+        """Vẽ lại toàn bộ bảng giỏ hàng (khi mở cửa sổ / xóa giỏ)."""
         u = self.ui
         u.tblCart.setRowCount(0)
         u.tblCart.setColumnCount(5)
         u.tblCart.setHorizontalHeaderLabels(["ID", "Tên sản phẩm", "Đơn giá", "SL", "Thành tiền"])
         u.tblCart.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
 
-        subtotal = 0
         for r, item in enumerate(self._cart):
             u.tblCart.insertRow(r)
-            line = item["price"] * item["quantity"]
-            subtotal += line
-            for c, val in enumerate([
-                item["product_id"], item["name"],
-                f"{item['price']:,.0f}đ", str(item["quantity"]),
-                f"{line:,.0f}đ"
-            ]):
-                wi = QTableWidgetItem(val)
-                wi.setFlags(wi.flags() & ~Qt.ItemFlag.ItemIsEditable)
-                u.tblCart.setItem(r, c, wi)
-
-        discount_rate = ord_mod.DISCOUNT_MAP.get(self.customer.get("rank", "") if self.customer else "", 0)
-        discount = subtotal * discount_rate
-        total = subtotal - discount
-        u.lblCartSubtotal.setText(f"Tạm tính: {subtotal:,.0f}đ")
-        u.lblCartDiscount.setText(f"Giảm giá ({int(discount_rate*100)}%): -{discount:,.0f}đ")
-        u.lblCartTotal.setText(f"💰 TỔNG: {total:,.0f}đ")
+            self._set_cart_row(r, item)
+        self._update_cart_totals()
+        self._refresh_also_bought()
+
+    def _update_cart_totals(self):
+        u = self.ui
+        t = self._cart.totals()
+        promo = " + KM" if t["line_discount"] or t["order_discount"] else ""
+        u.lblCartSubtotal.setText(f"Tạm tính: {t['subtotal']:,.0f}đ")
+        u.lblCartDiscount.setText(
+            f"Giảm giá ({int(t['discount_rate']*100)}%{promo}): -{t['discount']:,.0f}đ")
+        u.lblCartTotal.setText(f"💰 TỔNG: {t['total']:,.0f}đ")
+
+    def _refresh_also_bought(self):
+        """Gợi ý 'Khách mua các sản phẩm này cũng mua' cho giỏ hàng."""
+        pids = self._cart.product_ids()
+        also = self._in_stock_products(bought_together.also_bought_for_cart(pids, limit=3))
+        if also:
+            names = "\n".join(f"• {p.get('name', '')}" for p in also)
+            self.ui.lblCartAlsoBought.setText(f"🛒 Khách mua các sản phẩm này cũng mua:\n{names}")
+        else:
+            self.ui.lblCartAlsoBought.setText("")
 
     def cart_remove(self):
         row = self.ui.tblCart.currentRow()
         if row < 0:
             return
-        if row < len(self._cart):
-            self._cart.pop(row)
-        self._refresh_cart()
+        self._cart.remove_row(row)
 
     def cart_clear(self):
         if self._cart:
             reply = QMessageBox.question(self, "Xác nhận", "Xóa tất cả sản phẩm trong giỏ?",
                                           QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
             if reply == QMessageBox.StandardButton.Yes:
-                self._cart = []
-                self._refresh_cart()
+                self._cart.clear()
 
     def place_order(self):
         if not self._cart:
@@ -390,14 +420,15 @@ class CustomerWindow(QMainWindow):
         if reply != QMessageBox.StandardButton.Yes:
             return
 
-        order, err = ord_mod.create_order(self.customer_id, self._cart)
+        order, err = ord_mod.create_order(self.customer_id, self._cart.items,
+                                          voucher=self._cart.voucher)
         if err:
             QMessageBox.warning(self, "Lỗi đặt hàng", f"❌ {err}")
             return
-        self._cart = []
-        self._refresh_cart()
-        # Cập nhật thông tin khách hàng
+        self._cart.clear()
+        # Cập nhật thông tin khách hàng (hạng mới áp dụng cho giỏ tiếp theo)
         self.customer = cust_mod.get_customer_by_id(self.customer_id) or self.customer
+        self._cart.set_rank(self.customer.get("rank", "") if self.customer else "")
         QMessageBox.information(
             self, "Đặt hàng thành công!",
             f"✅ Đơn hàng {order['order_id']} đã được tạo!\n\n"
@@ -6,7 +6,7 @@ from PyQt6.QtWidgets import QMainWindow, QMessageBox
 from PyQt6.QtCore import Qt
 
 from ui.login_ui import Ui_LoginWindow
-from modules.data_handler import load_accounts, save_accounts, load_customers, save_customers, generate_account_id, generate_customer_id
+from modules import auth, registration
 
 
 class LoginWindow(QMainWindow):
@@ -45,12 +45,7 @@ class LoginWindow(QMainWindow):
             self.ui.lblLoginError.setText("⚠ Vui lòng nhập đầy đủ thông tin!")
             return
 
-        accounts = load_accounts()
-        account = next(
-            (a for a in accounts
-             if a.get("username") == username and a.get("password") == password),
-            None
-        )
+        account = auth.authenticate(username, password)
 
         if not account:
             self.ui.lblLoginError.setText("❌ Tên đăng nhập hoặc mật khẩu không đúng!")
@@ -84,55 +79,10 @@ class LoginWindow(QMainWindow):
         username = self.ui.txtRegUsername.text().strip()
         password = self.ui.txtRegPassword.text().strip()
 
-        # Validate
-        if not all([name, phone, username, password]):
-            self.ui.lblRegError.setText("⚠ Vui lòng điền đầy đủ thông tin!")
-            return
-        if len(password) < 4:
-            self.ui.lblRegError.setText("⚠ Mật khẩu phải có ít nhất 4 ký tự!")
+        customer_id, err = registration.register(name, phone, username, password)
+        if err:
+            self.ui.lblRegError.setText(err)
             return
-        if not phone.isdigit() or len(phone) < 9:
-            self.ui.lblRegError.setText("⚠ Số điện thoại không hợp lệ!")
-            return
-
-        accounts = load_accounts()
-        # Kiểm tra trùng username
-        if any(a.get("username") == username for a in accounts):
-            self.ui.lblRegError.setText("❌ Tên đăng nhập đã tồn tại!")
-            return
-        # Kiểm tra trùng SĐT trong customers
-        customers = load_customers()
-        if any(c.get("phone") == phone for c in customers):
-            self.ui.lblRegError.setText("❌ Số điện thoại đã được đăng ký!")
-            return
-
-        # Tạo khách hàng mới
-        customer_id = generate_customer_id(customers)
-        new_customer = {
-            "customer_id": customer_id,
-            "name": name,
-            "phone": phone,
-            "email": "",
-            "skin-type": "",
-            "skin_concern": [],
-            "rank": "Đồng",
-            "loyalty_points": 0,
-        }
-        customers.append(new_customer)
-        save_customers(customers)
-
-        # Tạo account mới
-        account_id = generate_account_id(accounts)
-        new_account = {
-            "account_id": account_id,
-            "username": username,
-            "password": password,
-            "role": "customer",
-            "customer_id": customer_id,
-            "full_name": name,
-        }
-        accounts.append(new_account)
-        save_accounts(accounts)
 
         QMessageBox.information(
             self, "Đăng ký thành công",
@@ -26,6 +26,26 @@ Cấu trúc:
     recommendation.py  - Engine gợi ý sản phẩm theo da
     pdf_export.py      - Xuất hóa đơn PDF (yêu cầu: pip install reportlab)
     excel_export.py    - Xuất báo cáo Excel (yêu cầu: pip install openpyxl)
+    export_cache.py    - Cache file hóa đơn PDF/Excel theo nội dung đơn
+    print_queue.py     - Hàng đợi in gộp hóa đơn
+    bought_together.py - Gợi ý "khách mua X cũng mua" từ lịch sử đơn
+    cache.py           - Cache LRU/TTL dùng chung
+    chat_service.py    - Dịch vụ chatbot nhiều phiên + API HTTP cục bộ
+    ingredients.py     - Tri thức thành phần (data/ingredients.json), tra cứu + SP liên quan
+    search_index.py    - Chỉ mục TF-IDF tìm sản phẩm theo mô tả tự do
+    product_types.py   - Phân loại sản phẩm theo loại (dùng chung gợi ý + chatbot)
+    auth.py            - Băm mật khẩu PBKDF2 + chỉ mục tài khoản khi đăng nhập
+    registration.py    - Đăng ký KH qua chỉ mục username/SĐT, ghi 2 file một giao dịch
+    product_import.py  - Nhập sản phẩm hàng loạt từ CSV/Excel + báo cáo lỗi
+    stock_ledger.py    - Sổ cái xuất nhập kho (JSONL) + checkpoint, phiếu nhập hàng
+    margin.py          - Giá vốn (bình quân / FIFO) + lãi gộp cập nhật dần
+    sales_facts.py     - Kho dữ kiện bán hàng chỉ ghi nối (JSONL) + đối soát với đơn
+    expiry.py          - Chỉ mục hạn sử dụng theo ngày (sản phẩm + từng lô nhập)
+    stock_watch.py     - Theo dõi tồn kho thấp + sự kiện khi vượt ngưỡng tối thiểu
+    forecast.py        - Dự báo tốc độ bán (làm trơn hàm mũ) + điểm đặt hàng, SL đề xuất
+    loyalty.py         - Sổ điểm tích lũy (cộng/trừ theo đơn), hạng thành viên, tính lại hàng loạt
+    pricing.py         - Bộ tính giá dùng chung: giảm theo hạng, khuyến mãi, chiến dịch, voucher
+    cart.py            - Giỏ hàng dùng chung: tổng tiền cộng dồn, kiểm tra tồn kho, báo đổi từng dòng
 
   data/
     accounts.json      - Tài khoản đăng nhập (admin + khách hàng)
@@ -64,12 +84,15 @@ from PyQt6.QtGui import QFont, QIcon
 from PyQt6.QtCore import Qt
 
 from login_window import LoginWindow
+from modules import recommendation, auth, loyalty
 
 
 def main():
     app = QApplication(sys.argv)
     app.setApplicationName("NHÓM 6- Beauty Store")
     app.setApplicationVersion("2.0")
+    # Ghi nốt điểm tích lũy còn giữ trong bộ nhớ trước khi thoát
+    app.aboutToQuit.connect(loyalty.flush)
 
     # Font mặc định
     font = QFont("Bahnschrift", 11)
@@ -80,6 +103,12 @@ def main():
     if icon_path.exists():
         app.setWindowIcon(QIcon(str(icon_path)))
 
+    # Băm các mật khẩu cũ còn lưu dạng chữ thường (chỉ tốn thời gian ở lần chạy đầu)
+    auth.migrate_all()
+
+    # Tính sẵn gợi ý cho khách hàng đang hoạt động (chạy nền)
+    recommendation.start_warm_up()
+
     # Hiển thị màn hình đăng nhập
     window = LoginWindow()
     window.show()
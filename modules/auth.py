@@ -0,0 +1,145 @@
+"""
+auth.py - Băm mật khẩu (PBKDF2-SHA256 có salt) và đăng nhập qua chỉ mục username
+Mật khẩu dạng chữ thường của dữ liệu cũ được băm hết một lần khi khởi động
+(migrate_all); hash có số vòng lặp khác cấu hình hiện tại được băm lại ở lần
+đăng nhập đúng tiếp theo.
+"""
+import os
+import hmac
+import time
+import base64
+import hashlib
+
+from modules.data_handler import load_accounts, save_accounts, data_version
+
+ALGORITHM = "pbkdf2_sha256"
+# Độ khó băm (số vòng PBKDF2); chỉnh qua biến môi trường để cân bằng với thời gian đăng nhập
+HASH_ITERATIONS = int(os.environ.get("GLOWUP_HASH_ITERATIONS", 200_000))
+SALT_BYTES = 16
+
+
+def _b64(raw):
+    return base64.b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _unb64(text):
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def hash_password(password, iterations=None):
+    """Trả về chuỗi 'pbkdf2_sha256$<vòng lặp>$<salt>$<hash>'."""
+    iterations = iterations or HASH_ITERATIONS
+    salt = os.urandom(SALT_BYTES)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations)
+    return f"{ALGORITHM}${iterations}${_b64(salt)}${_b64(digest)}"
+
+
+def is_hashed(stored):
+    return isinstance(stored, str) and stored.startswith(ALGORITHM + "$")
+
+
+def verify_password(password, stored):
+    """So khớp mật khẩu với giá trị đã lưu (hash hoặc chữ thường của dữ liệu cũ)."""
+    if not stored:
+        return False
+    if not is_hashed(stored):
+        return hmac.compare_digest(password.encode("utf-8"), str(stored).encode("utf-8"))
+    try:
+        _, iterations, salt, digest = stored.split("$")
+        expected = _unb64(digest)
+        actual = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"),
+                                     _unb64(salt), int(iterations))
+    except (ValueError, TypeError):
+        return False
+    return hmac.compare_digest(actual, expected)
+
+
+def needs_rehash(stored):
+    """Mật khẩu chưa băm, hoặc băm với số vòng khác HASH_ITERATIONS."""
+    if not is_hashed(stored):
+        return True
+    try:
+        return int(stored.split("$")[1]) != HASH_ITERATIONS
+    except (IndexError, ValueError):
+        return True
+
+
+# ── Chỉ mục tài khoản ─────────────────────────────────────────────────────────
+_INDEX = {}
+_INDEX_VERSION = None
+
+
+def get_account_index():
+    """{username: account}; chỉ nạp lại khi accounts.json thay đổi."""
+    global _INDEX, _INDEX_VERSION
+    version = data_version("accounts.json")
+    if version != _INDEX_VERSION:
+        _INDEX = {a.get("username"): a for a in load_accounts() if a.get("username")}
+        _INDEX_VERSION = version
+    return _INDEX
+
+
+def get_account(username):
+    return get_account_index().get(username)
+
+
+def username_exists(username):
+    return username in get_account_index()
+
+
+def authenticate(username, password):
+    """Trả về account nếu đúng tên đăng nhập + mật khẩu, ngược lại None."""
+    account = get_account(username)
+    if not account or not verify_password(password, account.get("password")):
+        return None
+    if needs_rehash(account.get("password")):
+        _rehash(account.get("account_id"), username, password)
+    return account
+
+
+def _rehash(account_id, username, password):
+    accounts = load_accounts()
+    for a in accounts:
+        if a.get("account_id") == account_id and a.get("username") == username:
+            a["password"] = hash_password(password)
+            save_accounts(accounts)
+            return True
+    return False
+
+
+def migrate_all():
+    """
+    Băm mọi mật khẩu còn ở dạng chữ thường, ghi accounts.json một lần.
+    Trả về số tài khoản đã băm (0 nếu không còn mật khẩu chữ thường).
+    """
+    accounts = load_accounts()
+    count = 0
+    for a in accounts:
+        if a.get("password") and not is_hashed(a["password"]):
+            a["password"] = hash_password(str(a["password"]))
+            count += 1
+    if count:
+        save_accounts(accounts)
+    return count
+
+
+# ── Benchmark ─────────────────────────────────────────────────────────────────
+def benchmark_hashing(iterations=(50_000, 100_000, 200_000, 400_000), logins=20):
+    """
+    Thời gian xác thực một mật khẩu và thời gian xử lý `logins` lượt đăng nhập liên tiếp
+    (giờ giao ca) với từng mức độ khó. Trả về {vòng lặp: (ms/lượt, ms cho cả đợt)}.
+    """
+    result = {}
+    for n in iterations:
+        stored = hash_password("benchmark", n)
+        start = time.perf_counter()
+        for _ in range(logins):
+            verify_password("benchmark", stored)
+        total = time.perf_counter() - start
+        result[n] = (total / logins * 1000, total * 1000)
+    return result
+
+
+if __name__ == "__main__":
+    for n, (per_login, burst) in benchmark_hashing().items():
+        print(f"{n:>8,} vòng | {per_login:7.1f} ms/lượt | {burst:8.1f} ms cho 20 lượt")
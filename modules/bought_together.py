@@ -0,0 +1,166 @@
+"""
+bought_together.py - Gợi ý "Khách mua X cũng mua" từ lịch sử đơn hàng
+Mô hình đồng xuất hiện item-item dựng từ orders.json và cập nhật dần theo
+từng đơn mới/đơn hủy; danh sách gợi ý được tính sẵn nên tra cứu chỉ là đọc dict.
+"""
+import json
+import heapq
+from collections import Counter
+
+from modules.data_handler import DATA_DIR, data_version
+
+TOP_N = 10            # số sản phẩm gợi ý tính sẵn cho mỗi sản phẩm
+MAX_NEIGHBORS = 200   # số cặp giữ lại cho mỗi sản phẩm (giới hạn bộ nhớ khi dựng từ lịch sử lớn)
+CANCELLED = "Đã hủy"
+
+
+class CoOccurrenceModel:
+    """Đếm số đơn hàng chứa đồng thời từng cặp sản phẩm."""
+
+    def __init__(self, top_n=TOP_N, max_neighbors=MAX_NEIGHBORS):
+        self.top_n = top_n
+        self.max_neighbors = max_neighbors
+        self.counts = {}              # pid -> {pid khác: số đơn mua cùng}
+        self.item_orders = Counter()  # pid -> số đơn chứa pid
+        self._top = {}                # pid -> [(pid khác, số đơn)] đã sắp xếp
+        self._dirty = set()
+
+    def add_order(self, order, weight=1):
+        """Cộng (weight=1) hoặc trừ (weight=-1, khi hủy đơn) một đơn hàng vào mô hình."""
+        pids = {it.get("product_id") for it in order.get("items", []) if it.get("product_id")}
+        if not pids:
+            return
+        for a in pids:
+            self.item_orders[a] += weight
+            row = self.counts.setdefault(a, {})
+            for b in pids:
+                if b != a:
+                    row[b] = row.get(b, 0) + weight
+            if len(row) > 2 * self.max_neighbors:
+                self._prune(row)
+        self._dirty |= pids
+
+    def _prune(self, row):
+        """Chỉ giữ max_neighbors cặp mạnh nhất để bộ nhớ không tăng theo số đơn."""
+        keep = heapq.nlargest(self.max_neighbors, row.items(), key=lambda kv: kv[1])
+        row.clear()
+        row.update(keep)
+
+    def refresh(self):
+        """Tính lại danh sách gợi ý cho các sản phẩm vừa thay đổi."""
+        for pid in self._dirty:
+            row = self.counts.get(pid, {})
+            top = heapq.nlargest(self.top_n, row.items(), key=lambda kv: kv[1])
+            self._top[pid] = [(b, c) for b, c in top if c > 0]
+        self._dirty.clear()
+
+    def also_bought(self, product_id, limit=5):
+        """Các mã sản phẩm hay được mua cùng product_id (mạnh nhất trước)."""
+        if self._dirty:
+            self.refresh()
+        return [b for b, _ in self._top.get(product_id, [])[:limit]]
+
+    def also_bought_for_cart(self, product_ids, limit=5):
+        """Gợi ý cho cả giỏ hàng: cộng điểm đồng xuất hiện của từng sản phẩm trong giỏ."""
+        if self._dirty:
+            self.refresh()
+        in_cart = set(product_ids)
+        score = Counter()
+        for pid in in_cart:
+            for b, c in self._top.get(pid, []):
+                if b not in in_cart:
+                    score[b] += c
+        return [b for b, _ in score.most_common(limit)]
+
+
+def iter_orders_file(path, chunk_size=1 << 16):
+    """Đọc lần lượt từng đơn trong file JSON dạng mảng mà không nạp cả file vào bộ nhớ."""
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf = ""
+        started = False
+        eof = False
+        while True:
+            if not eof and len(buf) < chunk_size:
+                data = f.read(chunk_size)
+                eof = not data
+                buf += data
+            buf = buf.lstrip()
+            if not started:
+                if not buf:
+                    return
+                if buf[0] != "[":
+                    raise ValueError("File đơn hàng phải là một mảng JSON")
+                buf = buf[1:]
+                started = True
+                continue
+            if buf.startswith(","):
+                buf = buf[1:]
+                continue
+            if buf.startswith("]") or (eof and not buf):
+                return
+            try:
+                obj, end = decoder.raw_decode(buf)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                data = f.read(chunk_size)
+                eof = not data
+                buf += data
+                continue
+            yield obj
+            buf = buf[end:]
+
+
+def build_model(orders, top_n=TOP_N, max_neighbors=MAX_NEIGHBORS):
+    """Dựng mô hình từ một iterable đơn hàng (có thể là generator)."""
+    model = CoOccurrenceModel(top_n, max_neighbors)
+    for o in orders:
+        if o.get("status") != CANCELLED:
+            model.add_order(o)
+    model.refresh()
+    return model
+
+
+_MODEL = None
+_MODEL_VERSION = None
+
+
+def get_model():
+    """Mô hình hiện tại; dựng lại khi orders.json bị thay đổi từ nơi khác."""
+    global _MODEL, _MODEL_VERSION
+    version = data_version("orders.json")
+    if _MODEL is None or version != _MODEL_VERSION:
+        path = DATA_DIR / "orders.json"
+        try:
+            _MODEL = build_model(iter_orders_file(path))
+        except (FileNotFoundError, ValueError):
+            _MODEL = build_model([])
+        _MODEL_VERSION = version
+    return _MODEL
+
+
+def on_order_created(order):
+    """Cập nhật dần khi có đơn mới (gọi sau khi đã lưu orders.json)."""
+    global _MODEL_VERSION
+    if _MODEL is None:
+        return
+    _MODEL.add_order(order)
+    _MODEL_VERSION = data_version("orders.json")
+
+
+def on_order_cancelled(order):
+    """Trừ đơn vừa hủy khỏi mô hình (gọi sau khi đã lưu orders.json)."""
+    global _MODEL_VERSION
+    if _MODEL is None:
+        return
+    _MODEL.add_order(order, weight=-1)
+    _MODEL_VERSION = data_version("orders.json")
+
+
+def also_bought(product_id, limit=5):
+    return get_model().also_bought(product_id, limit)
+
+
+def also_bought_for_cart(product_ids, limit=5):
+    return get_model().also_bought_for_cart(product_ids, limit)
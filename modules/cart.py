@@ -0,0 +1,132 @@
+"""
+cart.py - Giỏ hàng dùng chung cho cửa sổ Admin và Khách hàng
+Giữ danh sách dòng hàng + chỉ mục product_id -> dòng; tổng tiền (tạm tính, giảm giá,
+tổng) cộng dồn qua pricing.Quote nên mỗi lần thêm/sửa/xóa chỉ tính lại một dòng.
+Tồn kho được kiểm tra trong bộ nhớ (stock_watch), không đọc lại products.json.
+Mỗi thay đổi gọi các hàm đã đăng ký qua subscribe(callback(action, row, item)) để
+giao diện chỉ vẽ lại đúng dòng bị đổi.
+"""
+from modules import pricing, stock_watch
+
+INSERTED = "insert"   # thêm dòng mới ở vị trí row
+UPDATED = "update"    # đổi số lượng của dòng row
+REMOVED = "remove"    # xóa dòng row
+RESET = "reset"       # xóa toàn bộ giỏ
+TOTALS = "totals"     # chỉ tổng tiền đổi (đổi hạng khách hàng / voucher), row = -1
+
+
+class Cart:
+    def __init__(self, rank=""):
+        self.items = []          # [{"product_id", "name", "price", "quantity"}] — truyền thẳng cho create_order
+        self._rows = {}          # product_id -> vị trí trong items
+        self._info = {}          # product_id -> (danh mục, thương hiệu) cho khuyến mãi
+        self.quote = pricing.Quote(rank)
+        self._listeners = []
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def subscribe(self, callback):
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _notify(self, action, row=-1, item=None):
+        for callback in list(self._listeners):
+            callback(action, row, item)
+
+    def product_ids(self):
+        return [item["product_id"] for item in self.items]
+
+    def quantity_of(self, product_id):
+        row = self._rows.get(product_id)
+        return self.items[row]["quantity"] if row is not None else 0
+
+    # ── Thay đổi giỏ ──────────────────────────────────────────────────────────
+    def add(self, product, quantity=1):
+        """
+        Thêm quantity sản phẩm (cộng dồn nếu đã có trong giỏ).
+        Trả về (dòng hàng, None) hoặc (None, lỗi) khi hết hàng / vượt tồn kho.
+        """
+        pid = product.get("product_id", "")
+        return self.set_quantity(product, self.quantity_of(pid) + quantity)
+
+    def set_quantity(self, product, quantity):
+        """Đặt số lượng của một sản phẩm (quantity <= 0 = xóa khỏi giỏ)."""
+        pid = product.get("product_id", "")
+        if quantity <= 0:
+            row = self._rows.get(pid)
+            return (self.remove_row(row), None) if row is not None else (None, None)
+        stock = stock_watch.stock_of(pid)
+        if stock is None:
+            stock = product.get("stock_quantity", 0)
+        if stock <= 0:
+            return None, "Sản phẩm này đã hết hàng!"
+        if quantity > stock:
+            return None, f"Chỉ còn {stock} sản phẩm trong kho!"
+        row = self._rows.get(pid)
+        if row is None:
+            item = {
+                "product_id": pid,
+                "name": product.get("name", pid),
+                "price": product.get("price", 0),
+                "quantity": quantity,
+            }
+            row = len(self.items)
+            self.items.append(item)
+            self._rows[pid] = row
+            self._info[pid] = (product.get("category", ""), product.get("brand", ""))
+            action = INSERTED
+        else:
+            item = self.items[row]
+            item["quantity"] = quantity
+            action = UPDATED
+        self.quote.set_line(pid, item["price"], quantity, *self._info[pid])
+        self._notify(action, row, item)
+        return item, None
+
+    def remove_row(self, row):
+        """Xóa dòng thứ row; trả về dòng đã xóa (None nếu row không hợp lệ)."""
+        if not 0 <= row < len(self.items):
+            return None
+        item = self.items.pop(row)
+        pid = item["product_id"]
+        del self._rows[pid]
+        self._info.pop(pid, None)
+        for later in self.items[row:]:
+            self._rows[later["product_id"]] -= 1
+        self.quote.remove_line(pid)
+        self._notify(REMOVED, row, item)
+        return item
+
+    def clear(self):
+        self.items = []
+        self._rows.clear()
+        self._info.clear()
+        self.quote.clear()
+        self._notify(RESET)
+
+    def set_rank(self, rank):
+        if (rank or "") != self.quote.rank:
+            self.quote.set_rank(rank)
+            self._notify(TOTALS)
+
+    def set_voucher(self, code):
+        ok, err = self.quote.set_voucher(code)
+        if ok:
+            self._notify(TOTALS)
+        return ok, err
+
+    @property
+    def voucher(self):
+        return self.quote.voucher
+
+    def totals(self):
+        """Tạm tính / giảm giá / tổng — xem pricing.Quote.totals()."""
+        return self.quote.totals()
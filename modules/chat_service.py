@@ -0,0 +1,190 @@
+"""
+chat_service.py - Dịch vụ chatbot nhiều phiên chạy đồng thời
+Mỗi phiên giữ context riêng trong kho phiên LRU/TTL có giới hạn; tin nhắn được
+xử lý trên thread pool. Có API HTTP cục bộ (JSON) và bộ sinh tải đo độ trễ p50/p99.
+"""
+import json
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from modules.cache import LRUCache
+from modules.chatbot import new_context, generate_response, SAMPLE_CHAT_LINES
+
+MAX_SESSIONS = 10_000      # số phiên giữ tối đa (phiên ít dùng nhất bị loại)
+SESSION_TTL = 30 * 60      # phiên không hoạt động quá 30 phút sẽ hết hạn
+WORKERS = 8
+
+
+class ChatService:
+    """Giữ nhiều phiên chat độc lập, mỗi phiên xử lý tuần tự theo thứ tự tin nhắn."""
+
+    def __init__(self, max_sessions=MAX_SESSIONS, session_ttl=SESSION_TTL, workers=WORKERS):
+        self.sessions = LRUCache(max_sessions, ttl=session_ttl)
+        self._create_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chat")
+
+    def new_session(self):
+        session_id = uuid.uuid4().hex
+        self._get_session(session_id)
+        return session_id
+
+    def _get_session(self, session_id):
+        session = self.sessions.get(session_id)
+        if session is None:
+            with self._create_lock:
+                session = self.sessions.get(session_id)
+                if session is None:
+                    session = {"context": new_context(), "lock": threading.Lock()}
+                    self.sessions.put(session_id, session)
+        return session
+
+    def handle(self, session_id, message):
+        """Xử lý đồng bộ một tin nhắn, trả về câu trả lời của bot."""
+        session = self._get_session(session_id)
+        with session["lock"]:
+            return generate_response(message, session["context"])
+
+    def submit(self, session_id, message):
+        """Xử lý bất đồng bộ trên thread pool, trả về Future."""
+        return self._pool.submit(self.handle, session_id, message)
+
+    def reset(self, session_id):
+        self.sessions.pop(session_id)
+
+    def stats(self):
+        return self.sessions.stats()
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+
+# ── API HTTP cục bộ ───────────────────────────────────────────────────────────
+def _make_handler(service):
+    class ChatHandler(BaseHTTPRequestHandler):
+        def _send(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/stats":
+                self._send(200, service.stats())
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                data = json.loads(self.rfile.read(length) or b"{}")
+            except (ValueError, json.JSONDecodeError):
+                self._send(400, {"error": "JSON không hợp lệ"})
+                return
+            if not isinstance(data, dict):
+                self._send(400, {"error": "Nội dung phải là một đối tượng JSON"})
+                return
+            if data.get("session_id") is not None and not isinstance(data["session_id"], str):
+                self._send(400, {"error": "session_id phải là chuỗi"})
+                return
+            if self.path == "/chat":
+                message = str(data.get("message", "")).strip()
+                if not message:
+                    self._send(400, {"error": "Thiếu message"})
+                    return
+                session_id = data.get("session_id") or service.new_session()
+                response = service.handle(session_id, message)
+                self._send(200, {"session_id": session_id, "response": response})
+            elif self.path == "/reset":
+                service.reset(data.get("session_id", ""))
+                self._send(200, {"ok": True})
+            else:
+                self._send(404, {"error": "not found"})
+
+        def log_message(self, format, *args):
+            pass
+
+    return ChatHandler
+
+
+def serve(host="127.0.0.1", port=8765, service=None):
+    """
+    Chạy API cục bộ:
+      POST /chat  {"session_id": "...", "message": "..."} -> {"session_id", "response"}
+      POST /reset {"session_id": "..."}
+      GET  /stats
+    """
+    service = service or ChatService()
+    server = ThreadingHTTPServer((host, port), _make_handler(service))
+    server.daemon_threads = True
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        service.close()
+
+
+# ── Bộ sinh tải ───────────────────────────────────────────────────────────────
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+def load_test(sessions=2000, messages_per_session=4, workers=WORKERS, corpus=None):
+    """
+    Mô phỏng `sessions` phiên cùng lúc, mỗi phiên gửi tuần tự `messages_per_session`
+    tin nhắn. Trả về dict: số tin, thông lượng và độ trễ p50/p99 (ms).
+    """
+    corpus = corpus or SAMPLE_CHAT_LINES
+    service = ChatService(max_sessions=max(sessions, 1), workers=workers)
+    latencies = []
+    lat_lock = threading.Lock()
+    done = threading.Event()
+    remaining = [sessions]
+
+    def send(session_id, k):
+        message = corpus[(hash(session_id) + k) % len(corpus)]
+        sent = time.perf_counter()
+        fut = service.submit(session_id, message)
+        fut.add_done_callback(lambda f: on_done(session_id, k, sent))
+
+    def on_done(session_id, k, sent):
+        with lat_lock:
+            latencies.append(time.perf_counter() - sent)
+        if k + 1 < messages_per_session:
+            send(session_id, k + 1)
+            return
+        with lat_lock:
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                done.set()
+
+    start = time.perf_counter()
+    if sessions:
+        for i in range(sessions):
+            send(f"load-{i}", 0)
+        done.wait()
+    elapsed = time.perf_counter() - start
+    service.close()
+
+    latencies.sort()
+    return {
+        "sessions": sessions,
+        "messages": len(latencies),
+        "per_sec": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+    }
+
+
+if __name__ == "__main__":
+    for n in (100, 1000, 5000):
+        r = load_test(sessions=n)
+        print(f"{r['sessions']:>5} phiên | {r['messages']} tin | {r['per_sec']:,.0f} tin/s | "
+              f"p50 {r['p50_ms']:.1f} ms | p99 {r['p99_ms']:.1f} ms")
@@ -3,8 +3,12 @@ chatbot.py - Chatbot tư vấn mỹ phẩm AI
 Xử lý hội thoại, nhận diện intent, gợi ý sản phẩm theo da
 """
 import re
-from modules.data_handler import load_products
-from modules.recommendation import recommendation
+import threading
+from modules.data_handler import load_products, data_version
+from modules.recommendation import recommendation, recommend_by_text
+from modules.cache import LRUCache
+from modules import ingredients
+from modules.product_types import PRODUCT_TYPES
 
 # ── Kiến thức về loại da ──────────────────────────────────────────────────────
 SKIN_TYPES_INFO = {
@@ -137,19 +141,6 @@ SKIN_CONCERNS_INFO = {
         "ingredients": ["Zinc Oxide", "Titanium Dioxide", "Uvinul", "Tinosorb"]},
 }
 
-# ── Loại sản phẩm ─────────────────────────────────────────────────────────────
-PRODUCT_TYPES = {
-    "serum": ["serum", "retinol"],
-    "mask": ["mặt nạ", "mask", "sleeping mask"],
-    "cleanser": ["sữa rửa mặt", "gel rửa mặt", "cleanser"],
-    "toner": ["toner", "nước hoa hồng", "nước cân bằng", "xịt khoáng"],
-    "moisturizer": ["kem dưỡng", "gel dưỡng", "cream", "dưỡng ẩm", "thạch"],
-    "sunscreen": ["chống nắng", "sunscreen", "spf"],
-    "exfoliant": ["tẩy da chết", "aha", "bha"],
-    "cleansing": ["tẩy trang", "micellar"],
-    "lipcare": ["son dưỡng", "dưỡng môi"],
-}
-
 # ── Intent patterns ───────────────────────────────────────────────────────────
 INTENT_PATTERNS = {
     "greeting": [r"xin chào", r"hello", r"hi", r"chào", r"hey", r"ê", r"alo"],
@@ -173,129 +164,262 @@ INTENT_PATTERNS = {
 }
 
 
-def detect_intents(message):
-    message = message.lower()
-    intents = []
+# ── Từ khóa trích xuất thông tin (thứ tự khai báo = thứ tự ưu tiên) ──────────
+SKIN_TYPE_KEYWORDS = {
+    "da dầu": "da dầu",
+    "da khô": "da khô",
+    "da hỗn hợp": "da hỗn hợp",
+    "da nhạy cảm": "da nhạy cảm/ kích ứng",
+    "da kích ứng": "da nhạy cảm/ kích ứng",
+    "da mụn": "da mụn",
+    "da yếu": "da yếu",
+    "da xỉn màu": "da xỉn màu",
+    "da thâm": "da thâm",
+    "da lão hóa": "da lão hóa",
+    "da nám": "da nám",
+    "da sần": "da sần",
+    "da hỗn hợp thiên dầu": "da hỗn hợp",
+    "da hỗn hợp thiên khô": "da hỗn hợp",
+    "viêm da cơ địa": "viêm da cơ địa",
+}
+
+CONCERN_KEYWORDS = {
+    "làm sạch": ["dầu", "nhờn", "bóng dầu", "bụi bẩn", "mụn ẩn", "tắc lỗ chân lông"],
+    "giảm thâm": ["thâm", "bị thâm", "vết thâm", "thâm mụn"],
+    "dưỡng ẩm": ["da khô", "khô", "bong tróc", "căng da", "thiếu nước"],
+    "kiểm soát dầu": ["da dầu", "tiết dầu", "bóng dầu", "nhờn"],
+    "giảm mụn": ["mụn", "mụn viêm", "mụn ẩn", "acne", "nổi mụn"],
+    "làm dịu da": ["nhạy cảm", "kích ứng", "đỏ da", "ngứa", "rát"],
+    "phục hồi da": ["da yếu", "da tổn thương", "sau treatment"],
+    "làm sáng da": ["xỉn màu", "tối da", "không đều màu"],
+    "chống lão hóa": ["lão hóa", "nếp nhăn", "chống già"],
+    "chống nắng": ["sợ nắng", "dị ứng nắng"],
+}
+
+CONCERN_TO_EFFECT = {
+    "giảm mụn": ["giảm mụn", "kháng viêm", "kháng khuẩn", "làm dịu"],
+    "thâm mụn": ["mờ thâm", "làm sáng", "đều màu da"],
+    "kiểm soát dầu": ["kiểm soát dầu", "giảm bã nhờn"],
+    "làm sạch": ["làm sạch", "thông thoáng lỗ chân lông"],
+    "dưỡng ẩm": ["cấp ẩm", "giữ ẩm", "phục hồi"],
+    "phục hồi da": ["phục hồi", "làm dịu", "tăng hàng rào bảo vệ da"],
+    "làm dịu da": ["làm dịu", "giảm kích ứng"],
+    "giảm thâm": ["mờ thâm", "làm sáng"],
+    "làm sáng da": ["làm sáng", "đều màu da"],
+    "chống lão hóa": ["chống lão hóa", "tăng đàn hồi", "giảm nếp nhăn"],
+    "chống nắng": ["chống nắng", "bảo vệ da"],
+}
+
+
+# ── Bộ so khớp từ khóa biên dịch sẵn (Aho-Corasick) ─────────────────────────
+class KeywordMatcher:
+    """
+    Automaton Aho-Corasick: tìm mọi từ khóa (kể cả chồng lấn nhau) trong một
+    lần duyệt văn bản. Mỗi từ khóa mang một payload tùy ý.
+    """
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+
+    def add(self, word, payload):
+        node = 0
+        for ch in word:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._goto[node][ch] = nxt
+            node = nxt
+        self._out[node].append((len(word), payload))
+
+    def build(self):
+        queue = list(self._goto[0].values())
+        for node in queue:
+            for ch, nxt in self._goto[node].items():
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+                queue.append(nxt)
+        return self
+
+    def iter_matches(self, text):
+        """Sinh (start, end, payload) cho mọi lần xuất hiện từ khóa trong text."""
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for length, payload in out[node]:
+                yield i - length + 1, i + 1, payload
+
+
+def _is_word_char(ch):
+    # Tương đương \w của re với chuỗi Unicode
+    return ch.isalnum() or ch == "_"
+
+
+def _at_boundary(text, pos, n):
+    """Tương đương \\b của re tại vị trí pos."""
+    before = pos > 0 and _is_word_char(text[pos - 1])
+    after = pos < n and _is_word_char(text[pos])
+    return before != after
+
+
+_BOUNDED_GROUP = re.compile(r"^\\b\((.*)\)\\b$")
+_REGEX_META = set(".^$*+?{}[]\\()")
+
+
+def _expand_intent_pattern(pattern):
+    """
+    Đổi pattern intent thành danh sách (từ khóa, cần ranh giới từ).
+    Hỗ trợ dạng 'a|b' và '\\b(a|b)\\b'; trả về None nếu pattern phức tạp hơn.
+    """
+    m = _BOUNDED_GROUP.match(pattern)
+    body, bounded = (m.group(1), True) if m else (pattern, False)
+    words = body.split("|")
+    if any(not w or _REGEX_META & set(w) for w in words):
+        return None
+    return [(w, bounded) for w in words]
+
+
+def _build_matcher():
+    matcher = KeywordMatcher()
+    fallback = {}
     for intent, patterns in INTENT_PATTERNS.items():
         for p in patterns:
-            if re.search(p, message):
-                intents.append(intent)
-                break
-    return intents or ["general"]
+            expanded = _expand_intent_pattern(p)
+            if expanded is None:
+                fallback.setdefault(intent, []).append(re.compile(p))
+                continue
+            for word, bounded in expanded:
+                matcher.add(word, ("intent", intent, bounded))
+    for kw in SKIN_TYPE_KEYWORDS:
+        matcher.add(kw, ("skin_type", kw, False))
+    for concern, keywords in CONCERN_KEYWORDS.items():
+        for kw in keywords:
+            matcher.add(kw, ("concern", concern, False))
+    for ptype, keywords in PRODUCT_TYPES.items():
+        for kw in keywords:
+            matcher.add(kw, ("product_type", ptype, False))
+    return matcher.build(), fallback
 
 
-def extract_skin_type(message):
-    message = message.lower()
-    mapping = {
-        "da dầu": "da dầu",
-        "da khô": "da khô",
-        "da hỗn hợp": "da hỗn hợp",
-        "da nhạy cảm": "da nhạy cảm/ kích ứng",
-        "da kích ứng": "da nhạy cảm/ kích ứng",
-        "da mụn": "da mụn",
-        "da yếu": "da yếu",
-        "da xỉn màu": "da xỉn màu",
-        "da thâm": "da thâm",
-        "da lão hóa": "da lão hóa",
-        "da nám": "da nám",
-        "da sần": "da sần",
-        "da hỗn hợp thiên dầu": "da hỗn hợp",
-        "da hỗn hợp thiên khô": "da hỗn hợp",
-        "viêm da cơ địa": "viêm da cơ địa",
+_MATCHER, _FALLBACK_INTENTS = _build_matcher()
+
+
+def analyze_message(message):
+    """
+    Phân tích tin nhắn trong một lần duyệt: trả về dict gồm
+    intents, skin_type, concerns, product_type.
+    """
+    msg = message.lower()
+    n = len(msg)
+    found = {"intent": set(), "skin_type": set(), "concern": set(), "product_type": set()}
+    for start, end, (kind, name, bounded) in _MATCHER.iter_matches(msg):
+        if bounded and not (_at_boundary(msg, start, n) and _at_boundary(msg, end, n)):
+            continue
+        found[kind].add(name)
+    for intent, regexes in _FALLBACK_INTENTS.items():
+        if intent not in found["intent"] and any(r.search(msg) for r in regexes):
+            found["intent"].add(intent)
+
+    intents = [i for i in INTENT_PATTERNS if i in found["intent"]]
+    skin_key = next((k for k in SKIN_TYPE_KEYWORDS if k in found["skin_type"]), None)
+    return {
+        "intents": intents or ["general"],
+        "skin_type": SKIN_TYPE_KEYWORDS[skin_key] if skin_key else None,
+        "concerns": [c for c in CONCERN_KEYWORDS if c in found["concern"]],
+        "product_type": next((t for t in PRODUCT_TYPES if t in found["product_type"]), None),
     }
-    for k, v in mapping.items():
-        if k in message:
-            return v
-    return None
+
+
+def detect_intents(message):
+    return analyze_message(message)["intents"]
+
+
+def extract_skin_type(message):
+    return analyze_message(message)["skin_type"]
 
 
 def extract_concerns(message):
-    message = message.lower()
-    found = []
-    concern_map = {
-        "làm sạch": ["dầu", "nhờn", "bóng dầu", "bụi bẩn", "mụn ẩn", "tắc lỗ chân lông"],
-        "giảm thâm": ["thâm", "bị thâm", "vết thâm", "thâm mụn"],
-        "dưỡng ẩm": ["da khô", "khô", "bong tróc", "căng da", "thiếu nước"],
-        "kiểm soát dầu": ["da dầu", "tiết dầu", "bóng dầu", "nhờn"],
-        "giảm mụn": ["mụn", "mụn viêm", "mụn ẩn", "acne", "nổi mụn"],
-        "làm dịu da": ["nhạy cảm", "kích ứng", "đỏ da", "ngứa", "rát"],
-        "phục hồi da": ["da yếu", "da tổn thương", "sau treatment"],
-        "làm sáng da": ["xỉn màu", "tối da", "không đều màu"],
-        "chống lão hóa": ["lão hóa", "nếp nhăn", "chống già"],
-        "chống nắng": ["sợ nắng", "dị ứng nắng"],
-    }
-    for concern, keywords in concern_map.items():
-        for kw in keywords:
-            if kw in message:
-                found.append(concern)
-                break
-    return found
+    return analyze_message(message)["concerns"]
 
 
 def extract_effects(concerns):
     effects = set()
-    concern_to_effect = {
-        "giảm mụn": ["giảm mụn", "kháng viêm", "kháng khuẩn", "làm dịu"],
-        "thâm mụn": ["mờ thâm", "làm sáng", "đều màu da"],
-        "kiểm soát dầu": ["kiểm soát dầu", "giảm bã nhờn"],
-        "làm sạch": ["làm sạch", "thông thoáng lỗ chân lông"],
-        "dưỡng ẩm": ["cấp ẩm", "giữ ẩm", "phục hồi"],
-        "phục hồi da": ["phục hồi", "làm dịu", "tăng hàng rào bảo vệ da"],
-        "làm dịu da": ["làm dịu", "giảm kích ứng"],
-        "giảm thâm": ["mờ thâm", "làm sáng"],
-        "làm sáng da": ["làm sáng", "đều màu da"],
-        "chống lão hóa": ["chống lão hóa", "tăng đàn hồi", "giảm nếp nhăn"],
-        "chống nắng": ["chống nắng", "bảo vệ da"],
-    }
     for c in concerns:
-        effects.update(concern_to_effect.get(c, []))
+        effects.update(CONCERN_TO_EFFECT.get(c, []))
     return list(effects)
 
 
 def detect_product_type_from_message(message):
-    message = message.lower()
-    for ptype, keywords in PRODUCT_TYPES.items():
-        for kw in keywords:
-            if kw in message:
-                return ptype
-    return None
+    return analyze_message(message)["product_type"]
 
 
 def explain_ingredient(message):
-    message = message.lower()
-    if "niacinamide" in message:
-        return ("💊 **NIACINAMIDE (Vitamin B3)**\n\n"
-                "• Kiểm soát dầu, se lỗ chân lông\n"
-                "• Làm sáng da, mờ thâm\n"
-                "• Tăng cường hàng rào bảo vệ da\n\n"
-                "Phù hợp: Mọi loại da | Nồng độ: 2–10%")
-    elif "hyaluronic acid" in message or " ha " in message:
-        return ("💧 **HYALURONIC ACID (HA)**\n\n"
-                "• Cấp nước sâu, giữ ẩm, làm da căng mịn\n\n"
-                "Phù hợp: Mọi loại da | Nồng độ: 0.1–2%")
-    elif "bha" in message or "salicylic" in message:
-        return ("🌿 **BHA (Salicylic Acid)**\n\n"
-                "• Làm sạch sâu lỗ chân lông\n"
-                "• Giảm mụn, giảm viêm, kiểm soát dầu\n\n"
-                "Phù hợp: Da dầu, da mụn | Nồng độ: 0.5–2%")
-    elif "retinol" in message:
-        return ("✨ **RETINOL (Vitamin A)**\n\n"
-                "• Chống lão hóa, kích thích tái tạo da\n"
-                "• Giảm nếp nhăn, làm đều màu da\n\n"
-                "Phù hợp: Da lão hóa | Bắt đầu với nồng độ thấp 0.025%")
-    elif "vitamin c" in message:
-        return ("🍋 **VITAMIN C**\n\n"
-                "• Làm sáng da, mờ thâm nám\n"
-                "• Chống oxy hóa mạnh\n\n"
-                "Phù hợp: Mọi loại da | Nồng độ: 5–20%")
-    elif "ceramide" in message:
-        return ("🛡️ **CERAMIDE**\n\n"
-                "• Phục hồi hàng rào bảo vệ da\n"
-                "• Giữ ẩm, chống kích ứng\n\n"
-                "Phù hợp: Da khô, da yếu, da nhạy cảm")
-    else:
+    """Giải thích thành phần được nhắc tới và liệt kê sản phẩm còn hàng có chứa nó."""
+    found = ingredients.find_in_text(message)
+    if not found:
         return ("🤔 Mình chưa có dữ liệu về thành phần này.\n"
                 "Bạn có thể hỏi về: niacinamide, HA, BHA, retinol, vitamin C, ceramide…")
+    entry = found[0]
+    resp = ingredients.format_entry(entry)
+    products = ingredients.get_index().products_with(entry, in_stock=True, limit=3)
+    if products:
+        resp += f"\n\n🛍️ **Sản phẩm có {entry['name']}:**"
+        for p in products:
+            resp += f"\n• {p['name']} ({p.get('brand', '')}) - {p['price']:,}đ"
+    return resp
+
+
+# ── Cache gợi ý sản phẩm của chatbot ──────────────────────────────────────────
+SUGGESTION_CACHE_SIZE = 512
+_suggestion_cache = LRUCache(SUGGESTION_CACHE_SIZE)
+_suggestion_version = None
+_suggestion_lock = threading.Lock()
+
+
+def _suggestion_key(skin_type, effects, product_type, limit):
+    """Khóa đã chuẩn hóa (chữ thường, bỏ khoảng trắng thừa): "Da dầu " và "da dầu" là một."""
+    skin_key = " ".join(str(skin_type or "").lower().split()) or None
+    effects_key = tuple(sorted(" ".join(str(ef).lower().split()) for ef in effects or []))
+    type_key = " ".join(str(product_type or "").lower().split()) or None
+    return (skin_key, effects_key, type_key, limit)
+
+
+def suggest_products(skin_type=None, effects=None, product_type=None, limit=5):
+    """
+    recommendation() có ghi nhớ theo (loại da, hiệu ứng, loại SP, limit).
+    Cache bị xóa khi products.json thay đổi (kể cả tồn kho, vì câu trả lời hiển thị số lượng còn).
+    """
+    global _suggestion_version
+    version = data_version("products.json")
+    with _suggestion_lock:
+        if version != _suggestion_version:
+            _suggestion_cache.clear()
+            _suggestion_version = version
+    key = _suggestion_key(skin_type, effects, product_type, limit)
+    products = _suggestion_cache.get(key)
+    if products is None:
+        # tính theo giá trị đã chuẩn hóa để mọi cách viết của cùng một khóa cho cùng kết quả
+        skin_key, effects_key, type_key, _ = key
+        products = recommendation(skin_type=skin_key, effects=list(effects_key),
+                                  product_type=type_key, limit=limit)
+        _suggestion_cache.put(key, products)
+    return list(products)
+
+
+def suggestion_cache_stats():
+    """Số liệu cache gợi ý: size, hits, misses, evictions, hit_rate."""
+    return _suggestion_cache.stats()
 
 
 def new_context():
@@ -312,24 +436,25 @@ def new_context():
 def generate_response(message, context):
     """Sinh phản hồi chatbot từ tin nhắn và context hiện tại."""
     msg = message.lower()
+    info = analyze_message(msg)
 
     # Cập nhật context từ tin nhắn
-    skin_type = extract_skin_type(msg)
+    skin_type = info["skin_type"]
     if skin_type and skin_type != context.get("skin_type"):
         context["skin_type"] = skin_type
         context["concerns"] = []
         context["effects"] = []
 
-    product_type = detect_product_type_from_message(msg)
+    product_type = info["product_type"]
     if product_type:
         context["product_type"] = product_type
 
-    concerns = extract_concerns(msg)
+    concerns = info["concerns"]
     if concerns:
         context["concerns"] = concerns
         context["effects"] = extract_effects(concerns)
 
-    intents = detect_intents(msg)
+    intents = info["intents"]
 
     # Greeting
     if "greeting" in intents:
@@ -406,6 +531,14 @@ def generate_response(message, context):
 
     if step == "ask_concern":
         if not concerns:
+            # Không nhận ra vấn đề da quen thuộc -> thử tìm theo mô tả tự do
+            found = recommend_by_text(msg, skin_type=context.get("skin_type"), limit=3)
+            if found:
+                resp = "🔎 Mình chưa rõ vấn đề da của bạn, nhưng các sản phẩm này có vẻ liên quan:\n"
+                for i, p in enumerate(found, 1):
+                    resp += (f"\n{i}. **{p['name']}** ({p.get('brand','')})\n"
+                             f"   ✨ {', '.join(p.get('effects', []))}\n")
+                return resp + "\nBạn mô tả thêm giúp mình nhé (vd: mụn, thâm, khô, lão hóa...)"
             return ("Bạn đang gặp vấn đề gì?\n"
                     "Ví dụ: mụn, thâm mụn, da khô, da dầu, lão hóa...")
         context["step"] = "done"
@@ -413,7 +546,7 @@ def generate_response(message, context):
 
     # Gợi ý sản phẩm
     if "product_query" in intents or "confirm_yes" in intents:
-        products = recommendation(
+        products = suggest_products(
             skin_type=context.get("skin_type"),
             effects=context.get("effects"),
             product_type=context.get("product_type"),
@@ -452,3 +585,51 @@ def _give_concern_advice(context):
             resp += f"Nên dùng: {', '.join(info['ingredients'][:3])}\n\n"
     resp += "💬 Bạn có muốn mình gợi ý sản phẩm phù hợp không?"
     return resp
+
+
+# ── Đo hiệu năng bộ so khớp ──────────────────────────────────────────────────
+SAMPLE_CHAT_LINES = [
+    "Xin chào", "hello shop", "Tôi có da dầu và hay bị mụn", "da khô bong tróc quá",
+    "mình bị thâm mụn với lỗ chân lông to", "có", "không cần đâu", "ok",
+    "tư vấn giúp mình serum cho da nhạy cảm", "niacinamide có tác dụng gì",
+    "routine skincare như thế nào", "da hỗn hợp thiên dầu thì dùng toner gì",
+    "muốn mua kem chống nắng spf 50", "cảm ơn nhiều nha", "bye shop",
+    "da lão hóa có nếp nhăn nên dùng gì", "gợi ý sữa rửa mặt cho da mụn",
+    "retinol dùng thế nào", "mình bị kích ứng đỏ da", "tẩy trang micellar loại nào tốt",
+]
+
+
+def _legacy_analyze(message):
+    """Cách cũ: re.search từng pattern và quét chuỗi con từng từ khóa (chỉ để so sánh)."""
+    msg = message.lower()
+    intents = [intent for intent, patterns in INTENT_PATTERNS.items()
+               if any(re.search(p, msg) for p in patterns)]
+    skin_key = next((k for k in SKIN_TYPE_KEYWORDS if k in msg), None)
+    return {
+        "intents": intents or ["general"],
+        "skin_type": SKIN_TYPE_KEYWORDS[skin_key] if skin_key else None,
+        "concerns": [c for c, kws in CONCERN_KEYWORDS.items() if any(kw in msg for kw in kws)],
+        "product_type": next((t for t, kws in PRODUCT_TYPES.items()
+                              if any(kw in msg for kw in kws)), None),
+    }
+
+
+def benchmark_matcher(corpus=None, rounds=200):
+    """So sánh số tin nhắn/giây giữa cách cũ và bộ so khớp biên dịch sẵn."""
+    import time
+    corpus = corpus or SAMPLE_CHAT_LINES
+    result = {"messages": len(corpus) * rounds}
+    for name, fn in (("legacy", _legacy_analyze), ("compiled", analyze_message)):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for line in corpus:
+                fn(line)
+        elapsed = time.perf_counter() - start
+        result[f"{name}_per_sec"] = result["messages"] / elapsed if elapsed > 0 else 0.0
+    return result
+
+
+if __name__ == "__main__":
+    stats = benchmark_matcher()
+    print(f"{stats['messages']} tin nhắn | cũ: {stats['legacy_per_sec']:,.0f}/s | "
+          f"biên dịch sẵn: {stats['compiled_per_sec']:,.0f}/s")
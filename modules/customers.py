@@ -2,27 +2,28 @@
 customers.py - Quản lý khách hàng (CRUD + loyalty)
 """
 from modules.data_handler import load_customers, save_customers, generate_customer_id
-
-DISCOUNT_MAP = {"Vàng": 0.10, "Bạc": 0.08, "Đồng": 0.05}
+from modules.recommendation import invalidate_customer
+from modules.pricing import DISCOUNT_MAP, rank_rate   # DISCOUNT_MAP: giữ tên cũ
+from modules.loyalty import with_balances
 
 
 def get_all_customers():
-    return load_customers()
+    return with_balances(load_customers())
 
 
 def get_customer_by_id(customer_id):
-    customers = load_customers()
+    customers = with_balances(load_customers())
     return next((c for c in customers if c.get("customer_id") == customer_id), None)
 
 
 def get_customer_by_phone(phone):
-    customers = load_customers()
+    customers = with_balances(load_customers())
     return next((c for c in customers if c.get("phone") == phone.strip()), None)
 
 
 def search_customers(keyword=""):
     """Tìm theo tên hoặc SĐT."""
-    customers = load_customers()
+    customers = with_balances(load_customers())
     kw = keyword.lower().strip()
     if not kw:
         return customers
@@ -53,6 +54,7 @@ def update_customer(customer_id, updated_data: dict):
         if c.get("customer_id") == customer_id:
             customers[i].update(updated_data)
             save_customers(customers)
+            invalidate_customer(customer_id)
             return True
     return False
 
@@ -71,4 +73,4 @@ def get_discount_rate(customer_id):
     c = get_customer_by_id(customer_id)
     if not c:
         return 0.0
-    return DISCOUNT_MAP.get(c.get("rank", ""), 0.0)
+    return rank_rate(c.get("rank", ""))
@@ -1,12 +1,17 @@
 """
 data_handler.py - Tiện ích đọc/ghi JSON và sinh ID tự động
 """
+import os
 import json
+from datetime import datetime
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 DATA_DIR = BASE_DIR / "data"
 
+# Số lần mỗi file được ghi trong process hiện tại (dùng cho data_version)
+_WRITE_COUNTS = {}
+
 
 def load_json(filename):
     """Đọc file JSON từ thư mục data."""
@@ -23,6 +28,81 @@ def save_json(filename, data):
     path = DATA_DIR / filename
     with open(path, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
+    _WRITE_COUNTS[filename] = _WRITE_COUNTS.get(filename, 0) + 1
+
+
+def save_json_many(files):
+    """
+    Ghi nhiều file JSON như một giao dịch: ghi hết ra file tạm trước, rồi mới thay
+    thế file thật; nếu lỗi giữa chừng thì khôi phục các file đã thay.
+    files: {tên file: dữ liệu}
+    """
+    temps = {}
+    try:
+        for filename, data in files.items():
+            tmp = DATA_DIR / f"{filename}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            temps[filename] = tmp
+    except (OSError, TypeError, ValueError):
+        for tmp in temps.values():
+            tmp.unlink(missing_ok=True)
+        raise
+
+    originals = {}
+    replaced = []
+    try:
+        for filename, tmp in temps.items():
+            path = DATA_DIR / filename
+            originals[filename] = path.read_bytes() if path.exists() else None
+            os.replace(tmp, path)
+            replaced.append(filename)
+    except OSError:
+        for filename in replaced:
+            path = DATA_DIR / filename
+            if originals[filename] is None:
+                path.unlink(missing_ok=True)
+            else:
+                path.write_bytes(originals[filename])
+        for tmp in temps.values():
+            tmp.unlink(missing_ok=True)
+        raise
+    finally:
+        for filename in replaced:
+            _WRITE_COUNTS[filename] = _WRITE_COUNTS.get(filename, 0) + 1
+
+
+def data_version(filename):
+    """
+    Phiên bản hiện tại của một file dữ liệu, đổi mỗi khi file được ghi
+    (kể cả khi bị sửa từ bên ngoài). Dùng làm khóa cho các chỉ mục/cache.
+    """
+    try:
+        st = (DATA_DIR / filename).stat()
+        stamp = (st.st_mtime_ns, st.st_size)
+    except FileNotFoundError:
+        stamp = (0, 0)
+    return (_WRITE_COUNTS.get(filename, 0),) + stamp
+
+
+ORDER_DATETIME_FORMAT = "%d/%m/%Y %H:%M"
+
+
+def parse_datetime(text):
+    """
+    Đọc thời điểm của đơn hàng / phiếu: 'DD/MM/YYYY HH:MM' (ứng dụng ghi) hoặc ISO
+    ('YYYY-MM-DD HH:MM:SS', dữ liệu cũ). Sai định dạng -> None.
+    """
+    try:
+        return datetime.strptime(text, ORDER_DATETIME_FORMAT)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return datetime.fromisoformat(text)
+    except (TypeError, ValueError):
+        return None
 
 
 def load_products():
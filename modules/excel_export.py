@@ -202,9 +202,11 @@ def export_revenue_excel(orders: list, products_map: dict = None,
     return str(filename)
 
 
-def export_invoice_excel(order: dict, customer: dict = None, products_map: dict = None) -> str:
+def export_invoice_excel(order: dict, customer: dict = None, products_map: dict = None,
+                         out_path=None) -> str:
     """
     Xuất hóa đơn Excel cho đơn hàng.
+    out_path: đường dẫn file cố định (mặc định sinh tên theo thời gian).
     Trả về đường dẫn file hoặc raise RuntimeError nếu thiếu openpyxl.
     """
     if not OPENPYXL_OK:
@@ -213,9 +215,13 @@ def export_invoice_excel(order: dict, customer: dict = None, products_map: dict
             "Vui lòng chạy: pip install openpyxl"
         )
 
-    _ensure_export_dir()
     order_id = order.get("order_id", "UNKNOWN")
-    filename = EXPORT_DIR / f"HoaDon_{order_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    if out_path:
+        filename = Path(out_path)
+        filename.parent.mkdir(parents=True, exist_ok=True)
+    else:
+        _ensure_export_dir()
+        filename = EXPORT_DIR / f"HoaDon_{order_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
 
     wb = openpyxl.Workbook()
     ws = wb.active
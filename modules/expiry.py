@@ -0,0 +1,181 @@
+"""
+expiry.py - Chỉ mục hạn sử dụng sắp xếp theo ngày (số thứ tự ngày - ordinal)
+Gồm hạn của sản phẩm (exp_date trong products.json) và hạn của từng lô nhập
+(exp_date trong imports.json), nên một sản phẩm có thể có nhiều hạn sử dụng.
+"Hết hạn hoặc sắp hết hạn trong N ngày" chỉ là lấy đoạn đầu danh sách (bisect).
+Số lượng còn lại của mỗi lô: tồn kho được phân bổ cho các lô mới nhất trước
+(hàng nhập trước bán trước).
+"""
+import bisect
+from datetime import date
+from functools import lru_cache
+
+from modules.data_handler import load_products, load_json, data_version
+from modules import stock_watch
+
+
+@lru_cache(maxsize=4096)
+def to_ordinal(exp):
+    """'YYYY-MM-DD' -> số thứ tự ngày, None nếu sai định dạng."""
+    try:
+        return date.fromisoformat(exp).toordinal()
+    except (TypeError, ValueError):
+        return None
+
+
+class ExpiryIndex:
+    """Danh sách (ordinal, product_id, import_id) đã sắp xếp; import_id rỗng = hạn của sản phẩm."""
+
+    def __init__(self):
+        self.keys = []
+        self._product_exp = {}     # pid -> exp_date đang có trong chỉ mục
+        self.lots = {}             # pid -> [(import_id, số lượng)] theo thứ tự nhập
+        self._lot_ids = set()
+
+    def _insert(self, key):
+        bisect.insort(self.keys, key)
+
+    def _discard(self, key):
+        i = bisect.bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            del self.keys[i]
+
+    # ── Hạn của sản phẩm ──────────────────────────────────────────────────────
+    def update_product(self, product):
+        pid = product.get("product_id")
+        exp = product.get("exp_date", "") or ""
+        if self._product_exp.get(pid, "") == exp:
+            return
+        self.remove_product(pid)
+        ordinal = to_ordinal(exp) if exp else None
+        if ordinal is not None:
+            self._insert((ordinal, pid, ""))
+            self._product_exp[pid] = exp
+
+    def remove_product(self, pid):
+        """Bỏ hạn của sản phẩm (lô của sản phẩm đã xóa được bỏ qua khi truy vấn)."""
+        old = self._product_exp.pop(pid, "")
+        if old:
+            self._discard((to_ordinal(old), pid, ""))
+
+    # ── Hạn của lô nhập ───────────────────────────────────────────────────────
+    def add_lot(self, receipt):
+        iid, pid = receipt.get("import_id"), receipt.get("product_id")
+        if iid in self._lot_ids:
+            return
+        self._lot_ids.add(iid)
+        self.lots.setdefault(pid, []).append((iid, receipt.get("quantity", 0)))
+        ordinal = to_ordinal(receipt.get("exp_date"))
+        if ordinal is not None:
+            self._insert((ordinal, pid, iid))
+
+    def lot_remaining(self, pid, import_id, stock):
+        """Số lượng còn lại của lô: tồn kho phân bổ cho các lô mới nhất trước."""
+        left = stock
+        for iid, qty in reversed(self.lots.get(pid, [])):
+            take = max(0, min(qty, left))
+            if iid == import_id:
+                return take
+            left -= take
+        return 0
+
+    def sync(self, products, imports=None):
+        """
+        Đối chiếu với dữ liệu đầy đủ; chỉ sản phẩm có exp_date đổi mới được sắp xếp lại.
+        imports: truyền vào khi imports.json đổi từ nơi khác -> dựng lại toàn bộ lô
+        (phiếu nhập có thể bị sửa số lượng / hạn, không chỉ thêm hoặc bớt).
+        """
+        seen = set()
+        for p in products:
+            self.update_product(p)
+            seen.add(p.get("product_id"))
+        for pid in [pid for pid in self._product_exp if pid not in seen]:
+            self.remove_product(pid)
+        if imports is not None:
+            self.keys = [k for k in self.keys if not k[2]]
+            self.lots, self._lot_ids = {}, set()
+            for rec in imports:
+                self.add_lot(rec)
+
+    def due(self, until_ordinal):
+        """Các mục có hạn <= until_ordinal (đã sắp xếp theo hạn)."""
+        return self.keys[:bisect.bisect_left(self.keys, (until_ordinal + 1,))]
+
+
+_INDEX = ExpiryIndex()
+_INDEX_VERSION = None
+
+
+def _versions():
+    return data_version("products.json"), data_version("imports.json")
+
+
+def get_index():
+    """Chỉ mục hiện tại; đối chiếu lại khi products.json / imports.json bị thay đổi."""
+    global _INDEX_VERSION
+    version = _versions()
+    if version != _INDEX_VERSION:
+        imports_changed = _INDEX_VERSION is None or version[1] != _INDEX_VERSION[1]
+        _INDEX.sync(load_products(), load_json("imports.json") if imports_changed else None)
+        _INDEX_VERSION = version
+    return _INDEX
+
+
+def _resync():
+    global _INDEX_VERSION
+    if _INDEX_VERSION is not None:
+        _INDEX_VERSION = _versions()
+
+
+def on_product_saved(product):
+    """Cập nhật sau khi thêm/sửa sản phẩm (gọi sau khi đã lưu products.json)."""
+    if _INDEX_VERSION is None:
+        return
+    _INDEX.update_product(product)
+    _resync()
+
+
+def on_product_deleted(product_id):
+    if _INDEX_VERSION is None:
+        return
+    _INDEX.remove_product(product_id)
+    _resync()
+
+
+def on_receipt(receipt):
+    """Thêm lô vừa nhập (gọi sau khi đã lưu imports.json và products.json)."""
+    if _INDEX_VERSION is None:
+        return
+    _INDEX.add_lot(receipt)
+    _resync()
+
+
+def expiring(days=30, today=None, products=None):
+    """
+    Sản phẩm / lô hết hạn hoặc hết hạn trong `days` ngày tới, hạn gần nhất trước.
+    Mỗi phần tử là bản sao sản phẩm kèm exp_date, days_left; với lô có thêm
+    import_id và lot_quantity (số lượng còn lại của lô, lô đã bán hết bị bỏ qua).
+    """
+    today = (today or date.today()).toordinal()
+    index = get_index()
+    entries = index.due(today + days)
+    if not entries:
+        return []
+    if products is None:
+        get = stock_watch.get_product      # bản ghi trong bộ nhớ, không đọc lại products.json
+    else:
+        get = {p.get("product_id"): p for p in products}.get
+    result = []
+    for ordinal, pid, iid in entries:
+        p = get(pid)
+        if p is None:
+            continue
+        item = {**p, "exp_date": date.fromordinal(ordinal).isoformat(),
+                "days_left": ordinal - today}
+        if iid:
+            remaining = index.lot_remaining(pid, iid, p.get("stock_quantity", 0))
+            if remaining <= 0:
+                continue
+            item.update(import_id=iid, lot_quantity=remaining)
+        result.append(item)
+    return result
@@ -0,0 +1,107 @@
+"""
+export_cache.py - Bộ nhớ đệm file hóa đơn PDF/Excel theo hash nội dung đơn hàng
+Cùng một đơn (không đổi nội dung, khách hàng, tên sản phẩm) chỉ xuất file một lần;
+thư mục exports/ được dọn theo dung lượng và tuổi file.
+"""
+import os
+import time
+import json
+import hashlib
+from pathlib import Path
+
+from modules import pdf_export, excel_export
+
+EXPORT_DIR = pdf_export.EXPORT_DIR
+
+MAX_CACHE_BYTES = 200 * 1024 * 1024   # tổng dung lượng hóa đơn tối đa trong exports/
+MAX_CACHE_AGE_DAYS = 30               # hóa đơn không dùng quá số ngày này sẽ bị xóa
+
+# Các trường khách hàng được in trên hóa đơn (điểm tích lũy đổi không làm mất cache)
+INVOICE_CUSTOMER_FIELDS = ("name", "phone", "rank")
+
+_EXPORTERS = {
+    "pdf": (pdf_export.export_invoice_pdf, ".pdf"),
+    "excel": (excel_export.export_invoice_excel, ".xlsx"),
+}
+
+
+def invoice_key(order: dict, customer: dict = None, products_map: dict = None) -> str:
+    """Hash nội dung hóa đơn: đơn hàng, thông tin khách in trên hóa đơn và tên các sản phẩm."""
+    names = {}
+    for item in order.get("items", []):
+        pid = item.get("product_id", "")
+        if products_map and pid in products_map:
+            names[pid] = products_map[pid].get("name", "")
+    shown = {f: customer.get(f) for f in INVOICE_CUSTOMER_FIELDS} if customer else None
+    payload = {"order": order, "customer": shown, "names": names}
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def cached_invoice_path(kind: str, order: dict, customer: dict = None,
+                        products_map: dict = None) -> Path:
+    _, ext = _EXPORTERS[kind]
+    key = invoice_key(order, customer, products_map)
+    return EXPORT_DIR / f"HoaDon_{order.get('order_id', 'UNKNOWN')}_{key}{ext}"
+
+
+def get_or_export_invoice(kind: str, order: dict, customer: dict = None,
+                          products_map: dict = None):
+    """
+    Trả về (đường dẫn, cache_hit). kind: "pdf" hoặc "excel".
+    Nếu file cùng nội dung đã tồn tại thì dùng lại ngay, ngược lại xuất mới rồi dọn cache.
+    """
+    exporter, _ = _EXPORTERS[kind]
+    path = cached_invoice_path(kind, order, customer, products_map)
+    if path.exists():
+        os.utime(path)  # đánh dấu vừa dùng cho chính sách dọn theo thời gian
+        return str(path), True
+
+    # Ghi ra file tạm rồi đổi tên để không bao giờ trả về file ghi dở
+    tmp = path.with_name(f"{path.stem}.part{path.suffix}")
+    try:
+        exporter(order, customer, products_map, out_path=tmp)
+        os.replace(tmp, path)
+    except Exception:
+        tmp.unlink(missing_ok=True)
+        raise
+    evict_exports(keep=path)
+    return str(path), False
+
+
+def evict_exports(max_bytes: int = MAX_CACHE_BYTES, max_age_days: int = MAX_CACHE_AGE_DAYS,
+                  keep=None) -> int:
+    """
+    Dọn file hóa đơn trong exports/: xóa file quá hạn, rồi xóa file cũ nhất
+    cho tới khi tổng dung lượng <= max_bytes. Trả về số file đã xóa.
+    """
+    if not EXPORT_DIR.exists():
+        return 0
+    keep = Path(keep) if keep else None
+    now = time.time()
+    files = []
+    for f in EXPORT_DIR.glob("HoaDon_*"):
+        if f.suffix not in (".pdf", ".xlsx"):
+            continue
+        try:
+            st = f.stat()
+        except OSError:
+            continue
+        files.append((st.st_mtime, st.st_size, f))
+    files.sort()
+
+    removed = 0
+    total = sum(size for _, size, _ in files)
+    max_age = max_age_days * 86400
+    for mtime, size, f in files:
+        if f == keep:
+            continue
+        if now - mtime <= max_age and total <= max_bytes:
+            continue
+        try:
+            f.unlink()
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
@@ -0,0 +1,113 @@
+"""
+forecast.py - Dự báo tốc độ bán và số lượng cần nhập cho từng sản phẩm
+Tốc độ bán (SP/ngày) là trung bình trượt hàm mũ trên doanh số theo ngày, khởi đầu
+bằng trung bình WARM_UP_DAYS ngày đầu tiên có bán (không bắt đầu từ 0), tính cho
+mọi sản phẩm trong một lượt đọc kho dữ kiện bán hàng (sales_facts) và lưu cache
+theo ngày; đơn mới / đơn hủy xóa cache (orders gọi invalidate()).
+Điểm đặt hàng = nhu cầu trong thời gian chờ hàng + tồn kho an toàn; số lượng đề xuất
+nhập đưa tồn kho lên đủ bán thêm COVER_DAYS ngày, tối thiểu MIN_COVER_FACTOR x mức
+tối thiểu (như quy tắc cũ) khi chưa có nhu cầu.
+"""
+import math
+from datetime import date
+
+from modules.data_handler import load_products
+from modules import sales_facts, stock_watch
+
+ALPHA = 0.1            # hệ số làm trơn (ngày gần đây nặng hơn)
+LEAD_TIME_DAYS = 7     # số ngày chờ hàng mặc định (ghi đè bằng trường lead_time_days)
+SAFETY_DAYS = 3        # tồn kho an toàn tính theo số ngày bán
+COVER_DAYS = 30        # mỗi lần nhập đủ bán bao nhiêu ngày
+WARM_UP_DAYS = 14      # số ngày đầu lấy trung bình làm mức khởi đầu của đường làm trơn
+MIN_COVER_FACTOR = 3   # mỗi lần nhập đưa tồn kho lên ít nhất 3 x min_quantity
+
+_CACHE = {}            # (ngày, alpha) -> {pid: tốc độ bán}
+
+
+def _daily_sales():
+    """{ordinal ngày: {pid: số lượng}} từ kho dữ kiện (đã trừ đơn hủy)."""
+    days = {}
+    for fact in sales_facts.iter_facts():
+        try:
+            day = date.fromisoformat(fact["sale_date"]).toordinal()
+        except ValueError:
+            continue
+        row = days.setdefault(day, {})
+        row[fact["product_id"]] = row.get(fact["product_id"], 0) + fact["quantity"]
+    return days
+
+
+def compute_velocities(daily, today, alpha=ALPHA, warm_up=WARM_UP_DAYS):
+    """
+    Làm trơn hàm mũ theo ngày cho mọi sản phẩm cùng lúc: L_t = a*x_t + (1-a)*L_{t-1}.
+    Mức khởi đầu là trung bình `warm_up` ngày kể từ ngày bán đầu tiên (chưa đủ số ngày
+    thì lấy trung bình các ngày đã qua), nên lần bán đầu không bị tính chỉ a*x.
+    Ngày không bán (x_t = 0) chỉ nhân (1-a) nên được gộp thành (1-a)^k khi gặp ngày
+    bán kế tiếp — không phải duyệt từng ngày cho từng sản phẩm.
+    """
+    first, warm, level, last = {}, {}, {}, {}
+    keep = 1 - alpha
+    for day in sorted(d for d in daily if d <= today):
+        for pid, qty in daily[day].items():
+            start = first.setdefault(pid, day)
+            if day < start + warm_up:          # còn trong giai đoạn khởi đầu
+                warm[pid] = warm.get(pid, 0) + qty
+                continue
+            if pid in warm:                    # mức tại ngày cuối giai đoạn khởi đầu
+                level[pid], last[pid] = warm.pop(pid) / warm_up, start + warm_up - 1
+            level[pid] = alpha * qty + level[pid] * keep ** (day - last[pid])
+            last[pid] = day
+    result = {pid: lv * keep ** (today - last[pid]) for pid, lv in level.items()}
+    for pid, total in warm.items():
+        end = first[pid] + warm_up - 1
+        if today >= end:
+            result[pid] = total / warm_up * keep ** (today - end)
+        else:
+            result[pid] = total / (today - first[pid] + 1)
+    return result
+
+
+def get_velocities(today=None, alpha=ALPHA):
+    """{product_id: SP bán/ngày}; tính một lần mỗi ngày."""
+    today = today or date.today()
+    key = (today, alpha)
+    if key not in _CACHE:
+        _CACHE.clear()
+        _CACHE[key] = compute_velocities(_daily_sales(), today.toordinal(), alpha)
+    return _CACHE[key]
+
+
+def invalidate():
+    _CACHE.clear()
+
+
+def plan(product, velocity):
+    """Điểm đặt hàng và số lượng đề xuất nhập cho một sản phẩm."""
+    stock = product.get("stock_quantity", 0)
+    lead = product.get("lead_time_days", LEAD_TIME_DAYS)
+    safety = max(product.get("min_quantity", stock_watch.DEFAULT_MIN_QUANTITY),
+                 velocity * SAFETY_DAYS)
+    reorder_point = velocity * lead + safety
+    order_up_to = max(reorder_point + velocity * COVER_DAYS,
+                      product.get("min_quantity", stock_watch.DEFAULT_MIN_QUANTITY) * MIN_COVER_FACTOR)
+    suggested = max(0, math.ceil(order_up_to - stock)) if stock <= reorder_point else 0
+    return {
+        "product_id": product.get("product_id"),
+        "velocity": velocity,
+        "days_of_stock": stock / velocity if velocity > 0 else None,
+        "reorder_point": math.ceil(reorder_point),
+        "suggested_quantity": suggested,
+    }
+
+
+def reorder_plan(products=None, today=None):
+    """{product_id: kế hoạch nhập hàng} cho mọi sản phẩm."""
+    velocities = get_velocities(today)
+    if products is None:
+        products = load_products()
+    return {p.get("product_id"): plan(p, velocities.get(p.get("product_id"), 0.0))
+            for p in products}
+
+
+def suggested_quantity(product, today=None):
+    return plan(product, get_velocities(today).get(product.get("product_id"), 0.0))["suggested_quantity"]
@@ -0,0 +1,135 @@
+"""
+ingredients.py - Cơ sở tri thức thành phần mỹ phẩm (data/ingredients.json)
+Tra cứu theo tên chuẩn và tên gọi khác bằng dict (O(1)), có tra gần đúng;
+liên kết với sản phẩm qua mảng `ingredients` để liệt kê sản phẩm còn hàng.
+"""
+import re
+import difflib
+
+from modules.data_handler import load_json, load_products, data_version
+
+MAX_NGRAM = 3            # số từ tối đa của một tên thành phần khi quét tin nhắn
+FUZZY_CUTOFF = 0.85      # độ giống tối thiểu khi tra gần đúng
+FUZZY_MIN_LEN = 4        # chỉ tra gần đúng với cụm từ đủ dài (tránh "ha" ~ "sa")
+
+_TOKEN_RE = re.compile(r"[\w\-]+", re.UNICODE)
+
+
+def normalize(name):
+    """Chuẩn hóa tên để so khớp: chữ thường, gộp khoảng trắng."""
+    return " ".join(_TOKEN_RE.findall(str(name).lower()))
+
+
+class IngredientIndex:
+    """Chỉ mục tên chuẩn + tên gọi khác -> thành phần, và thành phần -> sản phẩm."""
+
+    def __init__(self, entries):
+        self.entries = list(entries)
+        self.by_key = {}        # tên đã chuẩn hóa -> vị trí trong entries
+        self._by_initial = {}   # ký tự đầu -> [tên đã chuẩn hóa] (cho tra gần đúng)
+        for i, entry in enumerate(self.entries):
+            for name in [entry.get("name", "")] + entry.get("aliases", []):
+                key = normalize(name)
+                if key and key not in self.by_key:
+                    self.by_key[key] = i
+                    self._by_initial.setdefault(key[0], []).append(key)
+        self._products = {}     # vị trí thành phần -> [sản phẩm]
+        self._products_version = None
+
+    def get(self, name, fuzzy=True):
+        """Thành phần ứng với tên (chính xác, rồi gần đúng). Không có -> None."""
+        key = normalize(name)
+        i = self.by_key.get(key)
+        if i is None and fuzzy:
+            i = self._fuzzy(key)
+        return None if i is None else self.entries[i]
+
+    def _fuzzy(self, key):
+        if len(key) < FUZZY_MIN_LEN:
+            return None
+        close = difflib.get_close_matches(key, self._by_initial.get(key[0], []),
+                                          n=1, cutoff=FUZZY_CUTOFF)
+        return self.by_key[close[0]] if close else None
+
+    def find_in_text(self, text, fuzzy=True):
+        """
+        Các thành phần được nhắc tới trong câu, theo thứ tự khai báo trong file.
+        Quét các cụm 1..MAX_NGRAM từ và tra dict, nên "ha" chỉ khớp khi là một từ riêng.
+        """
+        tokens = _TOKEN_RE.findall(str(text).lower())
+        found = set()
+        for n in range(1, MAX_NGRAM + 1):
+            for start in range(len(tokens) - n + 1):
+                gram = " ".join(tokens[start:start + n])
+                i = self.by_key.get(gram)
+                if i is not None:
+                    found.add(i)
+        if not found and fuzzy:
+            for n in range(1, MAX_NGRAM + 1):
+                for start in range(len(tokens) - n + 1):
+                    i = self._fuzzy(" ".join(tokens[start:start + n]))
+                    if i is not None:
+                        found.add(i)
+        return [self.entries[i] for i in sorted(found)]
+
+    def products_with(self, entry, in_stock=True, limit=None):
+        """Sản phẩm có chứa thành phần (liên kết qua mảng `ingredients` của sản phẩm)."""
+        self._sync_products()
+        i = self.by_key.get(normalize(entry.get("name", "")))
+        products = self._products.get(i, [])
+        if in_stock:
+            products = [p for p in products if p.get("stock_quantity", 0) > 0]
+        return products[:limit] if limit else list(products)
+
+    def _sync_products(self):
+        version = data_version("products.json")
+        if version == self._products_version:
+            return
+        linked = {}
+        for p in load_products():
+            seen = set()
+            for name in p.get("ingredients", []):
+                i = self.by_key.get(normalize(name))
+                if i is not None and i not in seen:
+                    seen.add(i)
+                    linked.setdefault(i, []).append(p)
+        self._products = linked
+        self._products_version = version
+
+
+def format_entry(entry):
+    """Nội dung giải thích một thành phần cho chatbot."""
+    lines = [f"{entry.get('icon', '💊')} **{entry.get('title') or entry['name'].upper()}**", ""]
+    lines += [f"• {b}" for b in entry.get("benefits", [])]
+    if entry.get("note"):
+        lines += ["", entry["note"]]
+    return "\n".join(lines)
+
+
+_INDEX = None
+_INDEX_VERSION = None
+
+
+def get_index():
+    """Chỉ mục hiện tại; dựng lại khi ingredients.json thay đổi."""
+    global _INDEX, _INDEX_VERSION
+    version = data_version("ingredients.json")
+    if _INDEX is None or version != _INDEX_VERSION:
+        _INDEX = IngredientIndex(load_json("ingredients.json"))
+        _INDEX_VERSION = version
+    return _INDEX
+
+
+def lookup(name, fuzzy=True):
+    return get_index().get(name, fuzzy)
+
+
+def find_in_text(text, fuzzy=True):
+    return get_index().find_in_text(text, fuzzy)
+
+
+def products_with_ingredient(name, in_stock=True, limit=None):
+    """Sản phẩm (còn hàng) có chứa thành phần `name`."""
+    idx = get_index()
+    entry = idx.get(name)
+    return idx.products_with(entry, in_stock, limit) if entry else []
@@ -2,7 +2,7 @@
 inventory.py - Quản lý kho hàng sản phẩm (CRUD)
 """
 from modules.data_handler import load_products, save_products, generate_product_id
-from datetime import date
+from modules import product_types, stock_ledger, expiry, stock_watch
 
 
 def get_all_products():
@@ -40,6 +40,11 @@ def add_product(product_data: dict):
         product_data["product_id"] = generate_product_id(products)
     products.append(product_data)
     save_products(products)
+    product_types.on_product_saved(product_data)
+    expiry.on_product_saved(product_data)
+    stock_watch.on_product_saved(product_data)
+    stock_ledger.record(product_data["product_id"], product_data.get("stock_quantity", 0),
+                        stock_ledger.KIND_ADJUST, "add_product")
     return product_data["product_id"]
 
 
@@ -48,8 +53,14 @@ def update_product(product_id, updated_data: dict):
     products = load_products()
     for i, p in enumerate(products):
         if p.get("product_id") == product_id:
+            old_qty = p.get("stock_quantity", 0)
             products[i].update(updated_data)
             save_products(products)
+            product_types.on_product_saved(products[i])
+            expiry.on_product_saved(products[i])
+            stock_watch.on_product_saved(products[i])
+            stock_ledger.record(product_id, products[i].get("stock_quantity", 0) - old_qty,
+                                stock_ledger.KIND_ADJUST, "update_product")
             return True
     return False
 
@@ -59,13 +70,19 @@ def delete_product(product_id):
     products = load_products()
     new_list = [p for p in products if p.get("product_id") != product_id]
     if len(new_list) < len(products):
+        removed = next(p for p in products if p.get("product_id") == product_id)
         save_products(new_list)
+        product_types.on_product_deleted(product_id)
+        expiry.on_product_deleted(product_id)
+        stock_watch.on_product_deleted(product_id)
+        stock_ledger.record(product_id, -removed.get("stock_quantity", 0),
+                            stock_ledger.KIND_ADJUST, "delete_product")
         return True
     return False
 
 
-def deduct_stock(product_id, quantity):
-    """Trừ số lượng tồn kho khi bán hàng."""
+def deduct_stock(product_id, quantity, ref=""):
+    """Trừ số lượng tồn kho khi bán hàng (ref: mã đơn hàng, ghi vào sổ cái kho)."""
     products = load_products()
     for p in products:
         if p.get("product_id") == product_id:
@@ -74,51 +91,69 @@ def deduct_stock(product_id, quantity):
                 return False, "Không đủ hàng trong kho"
             p["stock_quantity"] = current - quantity
             save_products(products)
+            stock_ledger.record(product_id, -quantity, stock_ledger.KIND_SALE, ref)
+            stock_watch.on_product_saved(p)
             return True, "OK"
     return False, "Không tìm thấy sản phẩm"
 
 
-def restore_stock(product_id, quantity):
+def deduct_stock_many(lines, ref=""):
+    """
+    Trừ kho cho cả đơn một lần: lines = [(product_id, số lượng)].
+    Chỉ trừ khi mọi dòng đủ hàng, nên đơn lỗi không để lại dòng nào đã trừ / ghi sổ cái.
+    Trả về {} nếu thành công, ngược lại {product_id: lỗi}.
+    """
+    wanted = {}
+    for pid, qty in lines:
+        wanted[pid] = wanted.get(pid, 0) + qty
+    products = load_products()
+    by_id = {p.get("product_id"): p for p in products}
+    errors = {}
+    for pid, qty in wanted.items():
+        p = by_id.get(pid)
+        if p is None:
+            errors[pid] = "Không tìm thấy sản phẩm"
+        elif p.get("stock_quantity", 0) < qty:
+            errors[pid] = "Không đủ hàng trong kho"
+    if errors:
+        return errors
+    for pid, qty in wanted.items():
+        by_id[pid]["stock_quantity"] = by_id[pid].get("stock_quantity", 0) - qty
+    save_products(products)
+    stock_ledger.record_many([(pid, -qty, stock_ledger.KIND_SALE, ref)
+                              for pid, qty in wanted.items()])
+    for pid in wanted:
+        stock_watch.on_product_saved(by_id[pid])
+    return {}
+
+
+def restore_stock(product_id, quantity, ref=""):
     """Hoàn trả số lượng tồn kho (hủy đơn)."""
     products = load_products()
     for p in products:
         if p.get("product_id") == product_id:
             p["stock_quantity"] = p.get("stock_quantity", 0) + quantity
             save_products(products)
+            stock_ledger.record(product_id, quantity, stock_ledger.KIND_CANCEL, ref)
+            stock_watch.on_product_saved(p)
             return True
     return False
 
 
 def check_low_stock(min_qty=10):
-    """Lấy danh sách sản phẩm sắp hết hàng."""
-    products = load_products()
-    return [p for p in products if p.get("stock_quantity", 0) <= min_qty]
+    """Lấy danh sách sản phẩm sắp hết hàng (tồn kho <= min_qty, theo thứ tự danh mục)."""
+    return stock_watch.at_most(min_qty)
 
 
-def check_expired():
-    """Lấy danh sách sản phẩm hết hạn hoặc sắp hết hạn trong 30 ngày."""
-    products = load_products()
-    today = date.today()
-    result = []
-    for p in products:
-        exp = p.get("exp_date", "")
-        if exp:
-            try:
-                exp_date = date.fromisoformat(exp)
-                days_left = (exp_date - today).days
-                if days_left <= 30:
-                    result.append({**p, "days_left": days_left})
-            except ValueError:
-                pass
-    return result
+def check_expired(days=30):
+    """
+    Lấy danh sách sản phẩm / lô nhập hết hạn hoặc sắp hết hạn trong `days` ngày
+    (hạn gần nhất trước). Lô nhập có thêm import_id và lot_quantity.
+    """
+    return expiry.expiring(days)
 
 
 def get_product_status(product):
     """Xác định trạng thái sản phẩm (còn hàng / sắp hết / hết hàng)."""
-    qty = product.get("stock_quantity", 0)
-    min_qty = product.get("min_quantity", 5)
-    if qty == 0:
-        return "Hết hàng"
-    elif qty <= min_qty:
-        return "Sắp hết"
-    return "Còn hàng"
+    return stock_watch.status_of(product.get("stock_quantity", 0),
+                                 product.get("min_quantity", stock_watch.DEFAULT_MIN_QUANTITY))
@@ -0,0 +1,300 @@
+"""
+loyalty.py - Điểm tích lũy và hạng thành viên
+Mỗi lần cộng điểm (earn) / trừ điểm khi hủy đơn (revert) được ghi nối vào sổ
+data/loyalty_ledger.jsonl; phần điểm chưa ghi vào customers.json được giữ trong bộ nhớ
+(pending) và ghi theo lô — mỗi FLUSH_EVERY sự kiện, khi gọi flush() (lúc đóng ứng dụng)
+hoặc khi tính lại toàn bộ — qua chỉ mục customer_id -> vị trí. Các hàm đọc khách hàng
+dùng with_balances() để thấy điểm + hạng mới nhất. Sự kiện sau mốc "flush" cuối cùng
+trong sổ là phần chưa ghi, được nạp lại khi khởi động. Khi đổi quy tắc tích điểm/hạng,
+recompute_all() tính lại điểm + hạng của mọi khách trong một lượt đọc lịch sử đơn.
+Lần đầu dùng, sổ được khởi tạo bằng số điểm hiện có (opening = điểm hiện tại - điểm
+tính từ lịch sử đơn) để tính lại không làm mất điểm cũ.
+Quy tắc đang áp dụng (số tiền / 1 điểm, ngưỡng hạng) lưu ở data/loyalty_rules.json;
+recompute_all(rate, rules) ghi quy tắc mới vào file để earn/revert dùng tiếp.
+Hủy đơn trừ đúng số điểm đã cộng cho đơn đó theo sổ (không tính lại theo quy tắc mới).
+"""
+import json
+import threading
+from datetime import datetime
+
+from modules.data_handler import (DATA_DIR, load_customers, save_customers, load_json,
+                                  save_json, data_version)
+from modules.bought_together import iter_orders_file
+
+LEDGER_FILE = DATA_DIR / "loyalty_ledger.jsonl"
+RULES_FILE = "loyalty_rules.json"
+ORDERS_FILE = DATA_DIR / "orders.json"
+CANCELLED = "Đã hủy"
+
+# Quy tắc mặc định khi chưa có data/loyalty_rules.json
+LOYALTY_RATE = 10_000  # 1 điểm / 10,000đ
+RANK_RULES = [("Vàng", 5000), ("Bạc", 2000), ("Đồng", 0)]   # (hạng, điểm tối thiểu), cao -> thấp
+
+KIND_OPENING = "opening"   # điểm có sẵn khi khởi tạo sổ
+KIND_EARN = "earn"         # cộng điểm theo đơn
+KIND_REVERT = "revert"     # trừ điểm khi hủy đơn
+KIND_ADJUST = "adjust"     # điều chỉnh tay
+KIND_RECOMPUTE = "recompute"   # mốc tính lại toàn bộ (điểm các đơn trước mốc theo quy tắc mới)
+KIND_FLUSH = "flush"       # mốc đã ghi điểm vào customers.json
+FLUSH_EVERY = 50           # số sự kiện chưa ghi tối đa trước khi ghi customers.json
+
+_lock = threading.RLock()
+_state = None      # {"opening": {cid: điểm}, "done": {(order_id, kind)}, "earned": {order_id: điểm},
+                   #  "pending": {cid: điểm chưa ghi vào customers.json}, "unflushed": số sự kiện}
+_customers = None  # (version, danh sách, {cid: vị trí})
+_rules = None      # (version, rate, rank rules)
+
+
+def get_rules():
+    """(rate, rank rules) đang áp dụng; chỉ đọc lại khi loyalty_rules.json đổi."""
+    global _rules
+    version = data_version(RULES_FILE)
+    if _rules is None or _rules[0] != version:
+        data = load_json(RULES_FILE)
+        data = data if isinstance(data, dict) else {}
+        ranks = [(r["rank"], r["min_points"]) for r in data.get("ranks", [])
+                 if "rank" in r and "min_points" in r]
+        _rules = (version, data.get("rate") or LOYALTY_RATE,
+                  sorted(ranks, key=lambda r: -r[1]) or RANK_RULES)
+    return _rules[1], _rules[2]
+
+
+def save_rules(rate, rules):
+    save_json(RULES_FILE, {"rate": rate,
+                           "ranks": [{"rank": r, "min_points": t} for r, t in rules]})
+
+
+def rank_for(points, rules=None):
+    rules = rules or get_rules()[1]
+    for rank, threshold in rules:
+        if points >= threshold:
+            return rank
+    return rules[-1][0]
+
+
+def points_for(total, rate=None):
+    return int(total // (rate or get_rules()[0]))
+
+
+def _orders():
+    try:
+        yield from iter_orders_file(ORDERS_FILE)
+    except FileNotFoundError:
+        return
+
+
+def _history_points(rate=None):
+    """{customer_id: điểm} tính từ các đơn chưa hủy — một lượt đọc orders.json."""
+    points = {}
+    for o in _orders():
+        cid = o.get("customer_id")
+        if cid and o.get("status") != CANCELLED:
+            points[cid] = points.get(cid, 0) + points_for(o.get("total", 0), rate)
+    return points
+
+
+# ── Sổ điểm ───────────────────────────────────────────────────────────────────
+def _append(events):
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with open(LEDGER_FILE, "a", encoding="utf-8") as f:
+        for ev in events:
+            f.write(json.dumps({"ts": ts, **ev}, ensure_ascii=False) + "\n")
+
+
+def _seed(pending=None):
+    """
+    Ghi điểm đầu kỳ cho mọi khách. pending = (customer_id, điểm) của đơn đang được cộng (+)
+    hoặc trừ (-): orders.json đã ghi đơn đó nhưng customers.json chưa cập nhật điểm.
+    """
+    history = _history_points()
+    if pending:
+        cid, points = pending
+        history[cid] = history.get(cid, 0) - points
+    events = [{"customer_id": c.get("customer_id"), "order_id": "", "kind": KIND_OPENING,
+               "points": c.get("loyalty_points", 0) - history.get(c.get("customer_id"), 0)}
+              for c in load_customers()]
+    LEDGER_FILE.write_text("", encoding="utf-8")
+    _append(events)
+
+
+def _get_state(pending=None):
+    global _state
+    if _state is None:
+        if not LEDGER_FILE.exists():
+            _seed(pending)
+        opening, done, earned, pending, unflushed = {}, set(), {}, {}, 0
+        with open(LEDGER_FILE, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                ev = json.loads(line)
+                if ev["kind"] in (KIND_FLUSH, KIND_RECOMPUTE):
+                    pending, unflushed = {}, 0
+                    if ev["kind"] == KIND_RECOMPUTE:
+                        earned.clear()
+                    continue
+                if ev["kind"] in (KIND_OPENING, KIND_ADJUST):
+                    opening[ev["customer_id"]] = opening.get(ev["customer_id"], 0) + ev["points"]
+                else:
+                    done.add((ev["order_id"], ev["kind"]))
+                    if ev["kind"] == KIND_EARN:
+                        earned[ev["order_id"]] = ev["points"]
+                if ev["kind"] != KIND_OPENING:
+                    pending[ev["customer_id"]] = pending.get(ev["customer_id"], 0) + ev["points"]
+                    unflushed += 1
+        _state = {"opening": opening, "done": done, "earned": earned, "pending": pending,
+                  "unflushed": unflushed}
+    return _state
+
+
+def _get_customers():
+    """(danh sách khách hàng, {customer_id: vị trí}); chỉ nạp lại khi customers.json đổi."""
+    global _customers
+    version = data_version("customers.json")
+    if _customers is None or _customers[0] != version:
+        customers = load_customers()
+        _customers = (version, customers,
+                      {c.get("customer_id"): i for i, c in enumerate(customers)})
+    return _customers[1], _customers[2]
+
+
+def _save(customers, positions):
+    global _customers
+    save_customers(customers)
+    _customers = (data_version("customers.json"), customers, positions)
+
+
+def _apply_pending(c, pending, rules=None):
+    delta = pending.get(c.get("customer_id"))
+    if not delta:
+        return c
+    points = c.get("loyalty_points", 0) + delta
+    return {**c, "loyalty_points": points, "rank": rank_for(points, rules)}
+
+
+def with_balances(customers):
+    """Khách hàng kèm điểm + hạng mới nhất (cộng phần chưa ghi vào customers.json)."""
+    with _lock:
+        if _state is None and not LEDGER_FILE.exists():
+            return customers
+        pending = _get_state()["pending"]
+        if not pending:
+            return customers
+        rules = get_rules()[1]
+        return [_apply_pending(c, pending, rules) for c in customers]
+
+
+def flush():
+    """Ghi phần điểm chưa ghi vào customers.json (một lần ghi cho mọi khách)."""
+    with _lock:
+        if _state is None or not _state["unflushed"]:
+            return
+        pending = _state["pending"]
+        customers, positions = _get_customers()
+        rules = get_rules()[1]
+        for cid in pending:
+            i = positions.get(cid)
+            if i is not None:
+                customers[i] = _apply_pending(customers[i], pending, rules)
+        _save(customers, positions)
+        _append([{"customer_id": "", "order_id": "", "kind": KIND_FLUSH, "points": 0}])
+        _state["pending"], _state["unflushed"] = {}, 0
+
+
+def _apply(customer_id, order_id, kind, points):
+    """Ghi sự kiện và cộng điểm chờ ghi của một khách. Trả về bản ghi khách hàng (điểm mới)."""
+    with _lock:
+        state = _get_state((customer_id, points) if order_id else None)
+        if order_id and (order_id, kind) in state["done"]:
+            return None
+        customers, positions = _get_customers()
+        i = positions.get(customer_id)
+        if i is None:
+            return None
+        _append([{"customer_id": customer_id, "order_id": order_id, "kind": kind,
+                  "points": points}])
+        if order_id:
+            state["done"].add((order_id, kind))
+            if kind == KIND_EARN:
+                state["earned"][order_id] = points
+        else:
+            state["opening"][customer_id] = state["opening"].get(customer_id, 0) + points
+        state["pending"][customer_id] = state["pending"].get(customer_id, 0) + points
+        state["unflushed"] += 1
+        c = _apply_pending(customers[i], state["pending"])
+        if state["unflushed"] >= FLUSH_EVERY:
+            flush()
+        return c
+
+
+def earn(order):
+    """Cộng điểm cho đơn mới (gọi sau khi đã lưu orders.json). Trả về số điểm đã cộng."""
+    cid, points = order.get("customer_id"), points_for(order.get("total", 0))
+    if not cid or _apply(cid, order.get("order_id"), KIND_EARN, points) is None:
+        return 0
+    return points
+
+
+def earned_for(order):
+    """
+    Số điểm đơn đang đóng góp: theo sổ nếu đơn được cộng điểm sau lần tính lại gần nhất,
+    ngược lại (đơn cũ, đã được tính lại) theo quy tắc hiện hành.
+    """
+    with _lock:
+        earned = _get_state()["earned"]
+        if order.get("order_id") in earned:
+            return earned[order["order_id"]]
+    return points_for(order.get("total", 0))
+
+
+def revert(order):
+    """Trừ lại điểm của đơn bị hủy (gọi sau khi đã lưu orders.json). Trả về số điểm đã trừ."""
+    cid = order.get("customer_id")
+    if not cid:
+        return 0
+    with _lock:
+        points = earned_for(order) if LEDGER_FILE.exists() else points_for(order.get("total", 0))
+        if _apply(cid, order.get("order_id"), KIND_REVERT, -points) is None:
+            return 0
+    return points
+
+
+def adjust(customer_id, points):
+    """Cộng/trừ điểm thủ công (được giữ lại khi tính lại toàn bộ)."""
+    return _apply(customer_id, "", KIND_ADJUST, points)
+
+
+# ── Tính lại hàng loạt ────────────────────────────────────────────────────────
+def recompute_all(rate=None, rules=None):
+    """
+    Tính lại điểm + hạng mọi khách hàng từ lịch sử đơn theo quy tắc hiện tại (hoặc rate/rules
+    truyền vào — được lưu thành quy tắc hiện hành): điểm = điểm đầu kỳ + điều chỉnh + điểm
+    của các đơn chưa hủy. Một lượt đọc orders.json, một lần ghi customers.json.
+    Trả về {customer_id: (điểm cũ, điểm mới, hạng cũ, hạng mới)} cho khách bị thay đổi.
+    """
+    with _lock:
+        state = _get_state()
+        flush()
+        if rate or rules:
+            current_rate, current_rules = get_rules()
+            save_rules(rate or current_rate, rules or current_rules)
+        rate, rules = get_rules()
+        opening = state["opening"]
+        history = _history_points(rate)
+        customers, positions = _get_customers()
+        changes = {}
+        for c in customers:
+            cid = c.get("customer_id")
+            points = opening.get(cid, 0) + history.get(cid, 0)
+            rank = rank_for(points, rules)
+            old = (c.get("loyalty_points", 0), c.get("rank", ""))
+            if old != (points, rank):
+                changes[cid] = (old[0], points, old[1], rank)
+                c["loyalty_points"], c["rank"] = points, rank
+        if changes:
+            _save(customers, positions)
+        # từ mốc này, điểm của mọi đơn đã có tính theo quy tắc vừa áp dụng
+        _append([{"customer_id": "", "order_id": "", "kind": KIND_RECOMPUTE, "points": 0}])
+        state["earned"].clear()
+        state["pending"], state["unflushed"] = {}, 0
+    return changes
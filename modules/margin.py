@@ -0,0 +1,286 @@
+"""
+margin.py - Giá vốn hàng bán (COGS) và lãi gộp theo sản phẩm / theo ngày
+Giá vốn lấy từ import_price trong imports.json, tính theo bình quân gia quyền (wac)
+hoặc nhập trước xuất trước (fifo). Trạng thái được dựng một lần từ lịch sử rồi cập
+nhật dần theo từng phiếu nhập, đơn mới và đơn hủy, nên bảng thống kê không chậm đi
+khi lịch sử lớn lên.
+"""
+import time
+import random
+from collections import deque, Counter
+from datetime import datetime
+
+from modules.data_handler import load_json, load_orders, data_version, parse_datetime
+
+COST_WAC = "wac"     # bình quân gia quyền
+COST_FIFO = "fifo"   # nhập trước xuất trước
+COST_METHOD = COST_WAC
+CANCELLED = "Đã hủy"
+
+
+def _day_key(order):
+    dt = parse_datetime(order.get("datetime"))
+    return dt.strftime("%Y-%m-%d") if dt else "unknown"
+
+
+def _pct(margin, revenue):
+    return margin / revenue * 100 if revenue else 0.0
+
+
+class MarginTracker:
+    """Tồn kho theo giá vốn + doanh thu/giá vốn cộng dồn theo sản phẩm và theo ngày."""
+
+    def __init__(self, method=COST_METHOD):
+        if method not in (COST_WAC, COST_FIFO):
+            raise ValueError(f"Phương pháp giá vốn không hợp lệ: {method}")
+        self.method = method
+        self.lots = {}            # wac: pid -> [số lượng, giá bình quân]; fifo: pid -> deque[[sl, giá]]
+        self.last_cost = {}       # pid -> giá vốn gần nhất (khi bán vượt số lượng đã nhập)
+        self.sales = {}           # order_id -> (ngày, [(pid, sl, doanh thu, giá vốn, lô đã lấy)])
+        self.by_product = {}      # pid -> [đã bán, doanh thu, giá vốn]
+        self.by_day = {}          # YYYY-MM-DD -> [doanh thu, giá vốn]
+        self.uncosted = Counter()  # pid -> số lượng đã bán nhưng chưa từng có giá nhập
+
+    # ── Nhập hàng ─────────────────────────────────────────────────────────────
+    def add_receipt(self, product_id, quantity, unit_cost):
+        if quantity <= 0:
+            return
+        self._put(product_id, [(quantity, unit_cost)])
+        self.last_cost[product_id] = unit_cost
+
+    def _put(self, pid, lots):
+        """Đưa các lô (số lượng, giá) vào kho; fifo: lô hoàn trả được xếp lên đầu hàng đợi."""
+        lots = [(q, c) for q, c in lots if q > 0 and c is not None]
+        if not lots:
+            return
+        if self.method == COST_WAC:
+            qty, avg = self.lots.get(pid, (0, 0.0))
+            value = qty * avg + sum(q * c for q, c in lots)
+            qty += sum(q for q, _ in lots)
+            self.lots[pid] = [qty, value / qty]
+        else:
+            queue = self.lots.setdefault(pid, deque())
+            for q, c in lots:
+                queue.append([q, c])
+
+    def _restore(self, pid, lots):
+        if self.method == COST_FIFO:
+            queue = self.lots.setdefault(pid, deque())
+            for q, c in reversed(lots):
+                if q > 0 and c is not None:
+                    queue.appendleft([q, c])
+        else:
+            self._put(pid, lots)
+
+    def _take(self, pid, quantity):
+        """Xuất `quantity` đơn vị: trả về (giá vốn, [(số lượng, giá)] đã lấy)."""
+        taken = []
+        fallback = self.last_cost.get(pid)
+        if self.method == COST_WAC:
+            lot = self.lots.get(pid)
+            if lot:
+                fallback = lot[1]
+            if lot and lot[0] > 0:
+                q = min(lot[0], quantity)
+                taken.append((q, lot[1]))
+                lot[0] -= q
+                quantity -= q
+        else:
+            queue = self.lots.get(pid) or ()
+            while quantity > 0 and queue:
+                head = queue[0]
+                q = min(head[0], quantity)
+                taken.append((q, head[1]))
+                head[0] -= q
+                quantity -= q
+                if head[0] <= 0:
+                    queue.popleft()
+        if quantity > 0:
+            # Bán vượt số đã nhập (tồn đầu kỳ chưa có phiếu nhập): dùng giá vốn đã biết gần nhất
+            taken.append((quantity, fallback))
+        cogs = sum(q * c for q, c in taken if c is not None)
+        return cogs, taken
+
+    # ── Bán hàng ──────────────────────────────────────────────────────────────
+    def add_order(self, order):
+        order_id = order.get("order_id")
+        items = order.get("items", [])
+        if not items or order_id in self.sales:
+            return
+        subtotal = sum(it.get("price", 0) * it.get("quantity", 0) for it in items)
+        # Phân bổ giảm giá của đơn cho từng dòng để tổng doanh thu khớp với total
+        factor = order.get("total", subtotal) / subtotal if subtotal else 1.0
+        day = _day_key(order)
+        lines = []
+        for it in items:
+            pid, qty = it.get("product_id"), it.get("quantity", 0)
+            revenue = it.get("price", 0) * qty * factor
+            cogs, taken = self._take(pid, qty)
+            lines.append((pid, qty, revenue, cogs, taken))
+            self._add_line(day, pid, qty, revenue, cogs, taken, 1)
+        self.sales[order_id] = (day, lines)
+
+    def cancel_order(self, order_id):
+        """Trừ đơn đã hủy khỏi thống kê và trả hàng về kho theo đúng giá vốn đã xuất."""
+        day, lines = self.sales.pop(order_id, (None, ()))
+        for pid, qty, revenue, cogs, taken in lines:
+            self._add_line(day, pid, qty, revenue, cogs, taken, -1)
+            self._restore(pid, taken)
+
+    def _add_line(self, day, pid, qty, revenue, cogs, taken, sign):
+        row = self.by_product.setdefault(pid, [0, 0.0, 0.0])
+        row[0] += sign * qty
+        row[1] += sign * revenue
+        row[2] += sign * cogs
+        bucket = self.by_day.setdefault(day, [0.0, 0.0])
+        bucket[0] += sign * revenue
+        bucket[1] += sign * cogs
+        missing = sum(q for q, c in taken if c is None)
+        if missing:
+            self.uncosted[pid] += sign * missing
+
+    # ── Truy vấn ──────────────────────────────────────────────────────────────
+    def unit_cost(self, product_id):
+        """Giá vốn đơn vị hiện tại của hàng tồn (fifo: lô cũ nhất)."""
+        lot = self.lots.get(product_id)
+        if self.method == COST_WAC:
+            return lot[1] if lot and lot[0] > 0 else self.last_cost.get(product_id)
+        return lot[0][1] if lot else self.last_cost.get(product_id)
+
+    def totals(self, date_from=None, date_to=None):
+        """Tổng doanh thu / giá vốn / lãi gộp, có thể lọc theo khoảng ngày (kiểu date)."""
+        lo = date_from.isoformat() if date_from else ""
+        hi = date_to.isoformat() if date_to else "9999"
+        revenue = cogs = 0.0
+        for day, (r, c) in self.by_day.items():
+            if (date_from or date_to) and not (lo <= day <= hi):
+                continue
+            revenue += r
+            cogs += c
+        return {"revenue": revenue, "cogs": cogs, "gross_margin": revenue - cogs,
+                "margin_pct": _pct(revenue - cogs, revenue),
+                "uncosted_qty": sum(v for v in self.uncosted.values() if v > 0)}
+
+    def by_month(self):
+        monthly = {}
+        for day, (r, c) in self.by_day.items():
+            key = day[:7] if day != "unknown" else day
+            row = monthly.setdefault(key, [0.0, 0.0])
+            row[0] += r
+            row[1] += c
+        return {k: {"revenue": r, "cogs": c, "gross_margin": r - c, "margin_pct": _pct(r - c, r)}
+                for k, (r, c) in sorted(monthly.items())}
+
+    def products(self):
+        return {pid: {"sold": q, "revenue": r, "cogs": c, "gross_margin": r - c,
+                      "margin_pct": _pct(r - c, r)}
+                for pid, (q, r, c) in self.by_product.items() if q}
+
+
+def build_tracker(imports, orders, method=COST_METHOD):
+    """Dựng từ lịch sử: phiếu nhập và đơn hàng được áp dụng theo thứ tự thời gian."""
+    events = []
+    for rec in imports:
+        events.append((parse_datetime(rec.get("date")) or datetime.min, 0, len(events), rec))
+    for o in orders:
+        if o.get("status") != CANCELLED:
+            events.append((parse_datetime(o.get("datetime")) or datetime.min, 1, len(events), o))
+    events.sort(key=lambda e: e[:3])
+    tracker = MarginTracker(method)
+    # Hàng bán trước phiếu nhập đầu tiên (tồn đầu kỳ) được ước tính theo giá nhập đầu tiên
+    for _, kind, _, rec in reversed(events):
+        if kind == 0:
+            tracker.last_cost[rec.get("product_id")] = rec.get("import_price", 0)
+    for _, kind, _, rec in events:
+        if kind == 0:
+            tracker.add_receipt(rec.get("product_id"), rec.get("quantity", 0),
+                                rec.get("import_price", 0))
+        else:
+            tracker.add_order(rec)
+    return tracker
+
+
+_TRACKERS = {}   # phương pháp -> MarginTracker
+_VERSION = None
+
+
+def _versions():
+    return data_version("imports.json"), data_version("orders.json")
+
+
+def get_tracker(method=None):
+    """Tracker hiện tại; dựng lại khi imports.json/orders.json bị thay đổi từ nơi khác."""
+    global _VERSION
+    method = method or COST_METHOD
+    version = _versions()
+    if version != _VERSION:
+        _TRACKERS.clear()
+        _VERSION = version
+    if method not in _TRACKERS:
+        _TRACKERS[method] = build_tracker(load_json("imports.json"), load_orders(), method)
+    return _TRACKERS[method]
+
+
+def _resync():
+    global _VERSION
+    _VERSION = _versions()
+
+
+def on_receipt(record):
+    """Cập nhật khi có phiếu nhập mới (gọi sau khi đã lưu imports.json)."""
+    if _VERSION is None:
+        return
+    for tracker in _TRACKERS.values():
+        tracker.add_receipt(record.get("product_id"), record.get("quantity", 0),
+                            record.get("import_price", 0))
+    _resync()
+
+
+def on_order_created(order):
+    """Cập nhật khi có đơn mới (gọi sau khi đã lưu orders.json)."""
+    if _VERSION is None:
+        return
+    for tracker in _TRACKERS.values():
+        tracker.add_order(order)
+    _resync()
+
+
+def on_order_cancelled(order):
+    """Trừ đơn vừa hủy (gọi sau khi đã lưu orders.json)."""
+    if _VERSION is None:
+        return
+    for tracker in _TRACKERS.values():
+        tracker.cancel_order(order.get("order_id"))
+    _resync()
+
+
+# ── Benchmark ─────────────────────────────────────────────────────────────────
+def benchmark_margin(n_orders=100_000, n_products=500, seed=1):
+    """
+    So sánh dựng lại toàn bộ từ lịch sử `n_orders` đơn với cập nhật dần một đơn mới.
+    Trả về (ms dựng lại, ms mỗi lần cập nhật dần).
+    """
+    rnd = random.Random(seed)
+    pids = [f"P{i:04d}" for i in range(n_products)]
+    imports = [{"product_id": pid, "quantity": 10 * n_orders // n_products,
+                "import_price": rnd.randint(50, 300) * 1000, "date": "01/01/2024 08:00"}
+               for pid in pids]
+    orders = []
+    for n in range(n_orders):
+        items = [{"product_id": rnd.choice(pids), "quantity": rnd.randint(1, 3),
+                  "price": rnd.randint(100, 500) * 1000} for _ in range(rnd.randint(1, 4))]
+        orders.append({"order_id": f"O{n:06d}", "datetime": "02/01/2024 10:00",
+                       "items": items, "total": sum(i["price"] * i["quantity"] for i in items)})
+    start = time.perf_counter()
+    tracker = build_tracker(imports, orders[:-100])
+    rebuild = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    for o in orders[-100:]:
+        tracker.add_order(o)
+    incremental = (time.perf_counter() - start) * 1000 / 100
+    return rebuild, incremental
+
+
+if __name__ == "__main__":
+    rebuild, incremental = benchmark_margin()
+    print(f"Dựng lại từ lịch sử: {rebuild:8.1f} ms | cập nhật dần: {incremental:.3f} ms/đơn")
@@ -2,16 +2,11 @@
 orders.py - Xử lý đơn hàng, giỏ hàng, thanh toán
 """
 from datetime import datetime
-from modules.data_handler import load_orders, save_orders, load_customers, generate_order_id
-from modules.inventory import deduct_stock
-
-DISCOUNT_MAP = {
-    "Vàng": 0.10,
-    "Bạc": 0.08,
-    "Đồng": 0.05,
-}
-
-LOYALTY_RATE = 10_000  # 1 điểm / 10,000đ
+from modules.data_handler import (load_orders, save_orders, load_customers, generate_order_id,
+                                  parse_datetime)
+from modules.inventory import deduct_stock_many
+from modules import bought_together, margin, sales_facts, forecast, loyalty, pricing
+from modules.pricing import DISCOUNT_MAP   # giữ tên cũ orders.DISCOUNT_MAP
 
 
 def get_all_orders():
@@ -28,8 +23,31 @@ def get_orders_by_customer(customer_id):
     return [o for o in orders if o.get("customer_id") == customer_id]
 
 
+def parse_order_datetime(order):
+    """Đọc trường datetime (DD/MM/YYYY HH:MM hoặc ISO) của đơn hàng, trả None nếu sai định dạng."""
+    return parse_datetime(order.get("datetime", ""))
+
+
+def get_orders_by_date(date_from=None, date_to=None, orders=None):
+    """Lọc đơn hàng theo khoảng ngày [date_from, date_to] (kiểu date, có thể bỏ trống)."""
+    if orders is None:
+        orders = load_orders()
+    result = []
+    for o in orders:
+        dt = parse_order_datetime(o)
+        if dt is None:
+            continue
+        d = dt.date()
+        if date_from and d < date_from:
+            continue
+        if date_to and d > date_to:
+            continue
+        result.append(o)
+    return result
+
+
 def find_customer_by_phone(phone):
-    customers = load_customers()
+    customers = loyalty.with_balances(load_customers())
     return next((c for c in customers if c.get("phone") == phone.strip()), None)
 
 
@@ -40,26 +58,27 @@ def calculate_total(items, discount_rate=0.0):
     return subtotal, discount, subtotal - discount
 
 
-def create_order(customer_id, items, staff_id="S01"):
-    """Tạo đơn hàng mới và trừ kho."""
+def create_order(customer_id, items, staff_id="S01", voucher=None):
+    """Tạo đơn hàng mới và trừ kho. Giá được tính bằng cùng bộ tính giá với giỏ hàng."""
     orders = load_orders()
-    customers = load_customers()
+    customers = loyalty.with_balances(load_customers())
 
     customer = next((c for c in customers if c.get("customer_id") == customer_id), None)
-    discount_rate = DISCOUNT_MAP.get(customer.get("rank", ""), 0.0) if customer else 0.0
+    quote, err = pricing.quote_items(items, customer.get("rank", "") if customer else "", voucher)
+    if err:
+        return None, err
+    price = quote.totals()
+    subtotal, discount, total = price["subtotal"], price["discount"], price["total"]
+    discount_rate = price["discount_rate"]
 
-    subtotal, discount, total = calculate_total(items, discount_rate)
+    order_id = generate_order_id(orders)
 
-    # Trừ kho
-    failed = []
-    for item in items:
-        ok, msg = deduct_stock(item["product_id"], item["quantity"])
-        if not ok:
-            failed.append(f"{item.get('name', item['product_id'])}: {msg}")
-    if failed:
-        return None, "\n".join(failed)
+    # Trừ kho cho cả đơn (thiếu hàng một dòng -> không trừ dòng nào)
+    errors = deduct_stock_many([(it["product_id"], it["quantity"]) for it in items], ref=order_id)
+    if errors:
+        names = {it["product_id"]: it.get("name") or it["product_id"] for it in items}
+        return None, "\n".join(f"{names[pid]}: {msg}" for pid, msg in errors.items())
 
-    order_id = generate_order_id(orders)
     order = {
         "order_id": order_id,
         "datetime": datetime.now().strftime("%d/%m/%Y %H:%M"),
@@ -73,34 +92,26 @@ def create_order(customer_id, items, staff_id="S01"):
         "total": total,
         "status": "Hoàn thành",
     }
+    if price["line_discount"] or price["order_discount"]:
+        order["promotion_discount"] = price["line_discount"] + price["order_discount"]
+    if price["promotion"]:
+        order["promotion"] = price["promotion"]
+    if price["voucher"]:
+        order["voucher"] = price["voucher"]
     orders.append(order)
     save_orders(orders)
+    bought_together.on_order_created(order)
+    margin.on_order_created(order)
+    sales_facts.on_order_created(order)
+    forecast.invalidate()
 
     # Cộng điểm tích lũy
     if customer:
-        points_earned = int(total // LOYALTY_RATE)
-        _update_loyalty(customer_id, points_earned, total)
+        loyalty.earn(order)
 
     return order, None
 
 
-def _update_loyalty(customer_id, points_earned, total_spent):
-    from modules.data_handler import save_customers
-    customers = load_customers()
-    for c in customers:
-        if c.get("customer_id") == customer_id:
-            c["loyalty_points"] = c.get("loyalty_points", 0) + points_earned
-            pts = c["loyalty_points"]
-            if pts >= 5000:
-                c["rank"] = "Vàng"
-            elif pts >= 2000:
-                c["rank"] = "Bạc"
-            else:
-                c["rank"] = "Đồng"
-            break
-    save_customers(customers)
-
-
 def cancel_order(order_id):
     """Hủy đơn hàng (hoàn trả kho)."""
     from modules.inventory import restore_stock
@@ -110,9 +121,14 @@ def cancel_order(order_id):
             if o.get("status") == "Đã hủy":
                 return False, "Đơn hàng đã hủy rồi"
             for item in o.get("items", []):
-                restore_stock(item["product_id"], item["quantity"])
+                restore_stock(item["product_id"], item["quantity"], ref=order_id)
             o["status"] = "Đã hủy"
             save_orders(orders)
+            bought_together.on_order_cancelled(o)
+            margin.on_order_cancelled(o)
+            sales_facts.on_order_cancelled(o)
+            forecast.invalidate()
+            loyalty.revert(o)
             return True, "Hủy thành công"
     return False, "Không tìm thấy đơn hàng"
 
@@ -3,15 +3,18 @@ pdf_export.py - Xuất hóa đơn điện tử dạng PDF
 Yêu cầu: pip install reportlab
 """
 import os
+import time
+import tempfile
 from pathlib import Path
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 try:
     from reportlab.lib.pagesizes import A4
     from reportlab.lib import colors
     from reportlab.lib.units import cm
     from reportlab.platypus import (SimpleDocTemplate, Table, TableStyle,
-                                    Paragraph, Spacer, HRFlowable)
+                                    Paragraph, Spacer, HRFlowable, PageBreak)
     from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
     from reportlab.pdfbase import pdfmetrics
     from reportlab.pdfbase.ttfonts import TTFont
@@ -27,22 +30,84 @@ def _ensure_export_dir():
     EXPORT_DIR.mkdir(exist_ok=True)
 
 
-def export_invoice_pdf(order: dict, customer: dict = None, products_map: dict = None) -> str:
-    """
-    Xuất hóa đơn PDF cho đơn hàng.
-    Trả về đường dẫn file PDF hoặc raise RuntimeError nếu thiếu reportlab.
-    """
+# Style, bảng mẫu dùng chung: dựng một lần cho mỗi process (kể cả worker của batch)
+_STYLES = None
+
+# products_map được gửi một lần cho mỗi worker qua initializer thay vì theo từng đơn
+_WORKER_PRODUCTS = None
+
+
+def _get_styles():
+    """Dựng stylesheet, ParagraphStyle và TableStyle một lần rồi dùng lại."""
+    global _STYLES
+    if _STYLES is not None:
+        return _STYLES
+
+    styles = getSampleStyleSheet()
+    pink = colors.HexColor("#ee609c")
+    purple = colors.HexColor("#b565a7")
+
+    normal = ParagraphStyle("norm", parent=styles["Normal"], fontSize=10, spaceAfter=2)
+    _STYLES = {
+        "pink": pink,
+        "purple": purple,
+        "title": ParagraphStyle(
+            "title",
+            parent=styles["Title"],
+            fontSize=20,
+            textColor=pink,
+            spaceAfter=4,
+            alignment=1,
+        ),
+        "sub": ParagraphStyle(
+            "sub",
+            parent=styles["Normal"],
+            fontSize=10,
+            textColor=colors.grey,
+            alignment=1,
+        ),
+        "normal": normal,
+        "bold_normal": ParagraphStyle("bold_norm", parent=normal, fontName="Helvetica-Bold"),
+        "footer": ParagraphStyle("footer", parent=styles["Normal"], fontSize=9,
+                                 textColor=colors.grey, alignment=1),
+        "items_table": TableStyle([
+            ("BACKGROUND", (0, 0), (-1, 0), pink),
+            ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+            ("FONTSIZE", (0, 0), (-1, 0), 10),
+            ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+            ("ALIGN", (1, 1), (1, -1), "LEFT"),
+            ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, colors.HexColor("#fff0f5")]),
+            ("GRID", (0, 0), (-1, -1), 0.5, colors.lightgrey),
+            ("FONTSIZE", (0, 1), (-1, -1), 9),
+            ("TOPPADDING", (0, 0), (-1, -1), 6),
+            ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
+        ]),
+        "summary_table": TableStyle([
+            ("ALIGN", (0, 0), (-1, -1), "RIGHT"),
+            ("FONTNAME", (0, 2), (-1, 2), "Helvetica-Bold"),
+            ("FONTSIZE", (0, 2), (-1, 2), 12),
+            ("TEXTCOLOR", (0, 2), (-1, 2), pink),
+            ("LINEABOVE", (0, 2), (-1, 2), 1, pink),
+            ("TOPPADDING", (0, 0), (-1, -1), 4),
+            ("BOTTOMPADDING", (0, 0), (-1, -1), 4),
+        ]),
+        "items_col_widths": [1 * cm, 8 * cm, 3 * cm, 1.5 * cm, 3 * cm],
+        "summary_col_widths": [10 * cm, 5 * cm],
+    }
+    return _STYLES
+
+
+def _require_reportlab():
     if not REPORTLAB_OK:
         raise RuntimeError(
             "Thư viện reportlab chưa được cài đặt.\n"
             "Vui lòng chạy: pip install reportlab"
         )
 
-    _ensure_export_dir()
-    order_id = order.get("order_id", "UNKNOWN")
-    filename = EXPORT_DIR / f"HoaDon_{order_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
 
-    doc = SimpleDocTemplate(
+def _new_doc(filename):
+    return SimpleDocTemplate(
         str(filename),
         pagesize=A4,
         rightMargin=2 * cm,
@@ -51,33 +116,26 @@ def export_invoice_pdf(order: dict, customer: dict = None, products_map: dict =
         bottomMargin=2 * cm,
     )
 
-    styles = getSampleStyleSheet()
-    pink = colors.HexColor("#ee609c")
-    purple = colors.HexColor("#b565a7")
 
-    title_style = ParagraphStyle(
-        "title",
-        parent=styles["Title"],
-        fontSize=20,
-        textColor=pink,
-        spaceAfter=4,
-        alignment=1,
-    )
-    sub_style = ParagraphStyle(
-        "sub",
-        parent=styles["Normal"],
-        fontSize=10,
-        textColor=colors.grey,
-        alignment=1,
-    )
-    normal = ParagraphStyle("norm", parent=styles["Normal"], fontSize=10, spaceAfter=2)
-    bold_normal = ParagraphStyle("bold_norm", parent=normal, fontName="Helvetica-Bold")
+def _invoice_filename(order, export_dir=None):
+    order_id = order.get("order_id", "UNKNOWN")
+    folder = Path(export_dir) if export_dir else EXPORT_DIR
+    return folder / f"HoaDon_{order_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+
+
+def _invoice_story(order: dict, customer: dict = None, products_map: dict = None) -> list:
+    """Dựng danh sách flowable cho một hóa đơn (dùng chung cho file lẻ và batch)."""
+    st = _get_styles()
+    pink = st["pink"]
+    normal = st["normal"]
+    bold_normal = st["bold_normal"]
+    order_id = order.get("order_id", "UNKNOWN")
 
     story = []
 
     # Header
-    story.append(Paragraph("🧴 GLOWUP BEAUTY STORE", title_style))
-    story.append(Paragraph("Cửa hàng Mỹ phẩm & Tư vấn Skincare", sub_style))
+    story.append(Paragraph("🧴 GLOWUP BEAUTY STORE", st["title"]))
+    story.append(Paragraph("Cửa hàng Mỹ phẩm & Tư vấn Skincare", st["sub"]))
     story.append(Spacer(1, 0.3 * cm))
     story.append(HRFlowable(width="100%", thickness=2, color=pink))
     story.append(Spacer(1, 0.3 * cm))
@@ -121,21 +179,8 @@ def export_invoice_pdf(order: dict, customer: dict = None, products_map: dict =
             f"{subtotal:,.0f}d",
         ])
 
-    col_widths = [1 * cm, 8 * cm, 3 * cm, 1.5 * cm, 3 * cm]
-    table = Table(data, colWidths=col_widths)
-    table.setStyle(TableStyle([
-        ("BACKGROUND", (0, 0), (-1, 0), pink),
-        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
-        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-        ("FONTSIZE", (0, 0), (-1, 0), 10),
-        ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-        ("ALIGN", (1, 1), (1, -1), "LEFT"),
-        ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, colors.HexColor("#fff0f5")]),
-        ("GRID", (0, 0), (-1, -1), 0.5, colors.lightgrey),
-        ("FONTSIZE", (0, 1), (-1, -1), 9),
-        ("TOPPADDING", (0, 0), (-1, -1), 6),
-        ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
-    ]))
+    table = Table(data, colWidths=st["items_col_widths"])
+    table.setStyle(st["items_table"])
     story.append(table)
     story.append(Spacer(1, 0.4 * cm))
 
@@ -150,16 +195,8 @@ def export_invoice_pdf(order: dict, customer: dict = None, products_map: dict =
         [f"Giảm giá ({int(discount_rate*100)}%):", f"-{discount:,.0f}d"],
         ["TỔNG THANH TOÁN:", f"{total:,.0f}d"],
     ]
-    sum_table = Table(summary_data, colWidths=[10 * cm, 5 * cm])
-    sum_table.setStyle(TableStyle([
-        ("ALIGN", (0, 0), (-1, -1), "RIGHT"),
-        ("FONTNAME", (0, 2), (-1, 2), "Helvetica-Bold"),
-        ("FONTSIZE", (0, 2), (-1, 2), 12),
-        ("TEXTCOLOR", (0, 2), (-1, 2), pink),
-        ("LINEABOVE", (0, 2), (-1, 2), 1, pink),
-        ("TOPPADDING", (0, 0), (-1, -1), 4),
-        ("BOTTOMPADDING", (0, 0), (-1, -1), 4),
-    ]))
+    sum_table = Table(summary_data, colWidths=st["summary_col_widths"])
+    sum_table.setStyle(st["summary_table"])
     story.append(sum_table)
 
     story.append(Spacer(1, 0.5 * cm))
@@ -167,9 +204,163 @@ def export_invoice_pdf(order: dict, customer: dict = None, products_map: dict =
     story.append(Spacer(1, 0.3 * cm))
     story.append(Paragraph(
         "<i>Cảm ơn bạn đã mua hàng tại GLOWUP BEAUTY STORE! 💖</i>",
-        ParagraphStyle("footer", parent=styles["Normal"], fontSize=9,
-                       textColor=colors.grey, alignment=1)
+        st["footer"]
     ))
+    return story
+
+
+def export_invoice_pdf(order: dict, customer: dict = None, products_map: dict = None,
+                       export_dir=None, out_path=None) -> str:
+    """
+    Xuất hóa đơn PDF cho đơn hàng.
+    out_path: đường dẫn file cố định (mặc định sinh tên theo thời gian).
+    Trả về đường dẫn file PDF hoặc raise RuntimeError nếu thiếu reportlab.
+    """
+    _require_reportlab()
+
+    if out_path:
+        filename = Path(out_path)
+        filename.parent.mkdir(parents=True, exist_ok=True)
+    else:
+        if export_dir:
+            Path(export_dir).mkdir(parents=True, exist_ok=True)
+        else:
+            _ensure_export_dir()
+        filename = _invoice_filename(order, export_dir)
 
-    doc.build(story)
+    doc = _new_doc(filename)
+    doc.build(_invoice_story(order, customer, products_map))
     return str(filename)
+
+
+def export_invoices_combined(orders: list, customers_map: dict = None,
+                             products_map: dict = None, out_path=None) -> str:
+    """
+    Gộp nhiều hóa đơn vào một file PDF nhiều trang (mỗi hóa đơn sang trang mới).
+    Chỉ dựng một SimpleDocTemplate cho cả lô để in cuối ngày.
+    Trả về đường dẫn file PDF hoặc raise RuntimeError nếu thiếu reportlab.
+    """
+    _require_reportlab()
+    if not orders:
+        raise ValueError("Không có đơn hàng nào để in")
+
+    if out_path:
+        filename = Path(out_path)
+        filename.parent.mkdir(parents=True, exist_ok=True)
+    else:
+        _ensure_export_dir()
+        filename = EXPORT_DIR / (f"HoaDonGop_{len(orders)}don_"
+                                 f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf")
+
+    customers_map = customers_map or {}
+    story = []
+    for i, o in enumerate(orders):
+        if i:
+            story.append(PageBreak())
+        story.extend(_invoice_story(o, customers_map.get(o.get("customer_id", "")), products_map))
+
+    _new_doc(filename).build(story)
+    return str(filename)
+
+
+# ── Xuất hóa đơn hàng loạt ────────────────────────────────────────────────────
+def _init_batch_worker(products_map):
+    """Initializer cho mỗi worker: nhận products_map và dựng style một lần."""
+    global _WORKER_PRODUCTS
+    _WORKER_PRODUCTS = products_map
+    _get_styles()
+
+
+def _export_batch_item(order, customer, export_dir):
+    return export_invoice_pdf(order, customer, _WORKER_PRODUCTS, export_dir)
+
+
+def export_invoices_batch(orders: list = None, date_from=None, date_to=None,
+                          customers_map: dict = None, products_map: dict = None,
+                          max_workers: int = None, progress=None, export_dir=None):
+    """
+    Xuất hóa đơn PDF cho nhiều đơn hàng song song bằng ProcessPoolExecutor.
+    - orders: danh sách đơn; nếu None thì lấy theo khoảng ngày date_from..date_to.
+    - progress(done, total, order_id): callback báo tiến độ (gọi ở process chính).
+    Trả về (paths, errors): paths là dict {order_id: đường dẫn}, errors là list chuỗi lỗi.
+    """
+    _require_reportlab()
+    from modules import orders as ord_mod
+    from modules.data_handler import load_customers, load_products
+
+    if orders is None:
+        orders = ord_mod.get_orders_by_date(date_from, date_to)
+    if customers_map is None:
+        customers_map = {c["customer_id"]: c for c in load_customers()}
+    if products_map is None:
+        products_map = {p["product_id"]: p for p in load_products()}
+    # Worker chỉ cần tên sản phẩm, gửi bản rút gọn để giảm chi phí pickle
+    names_map = {pid: {"name": p.get("name", pid)} for pid, p in products_map.items()}
+
+    if export_dir:
+        Path(export_dir).mkdir(parents=True, exist_ok=True)
+    else:
+        _ensure_export_dir()
+
+    total = len(orders)
+    paths, errors = {}, []
+    if not total:
+        return paths, errors
+
+    if max_workers == 1:
+        _init_batch_worker(names_map)
+        for done, o in enumerate(orders, 1):
+            oid = o.get("order_id", "")
+            try:
+                paths[oid] = _export_batch_item(o, customers_map.get(o.get("customer_id", "")),
+                                                export_dir)
+            except Exception as e:
+                errors.append(f"{oid}: {e}")
+            if progress:
+                progress(done, total, oid)
+        return paths, errors
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_batch_worker,
+                             initargs=(names_map,)) as pool:
+        futures = {
+            pool.submit(_export_batch_item, o,
+                        customers_map.get(o.get("customer_id", "")), export_dir): o.get("order_id", "")
+            for o in orders
+        }
+        for done, fut in enumerate(as_completed(futures), 1):
+            oid = futures[fut]
+            try:
+                paths[oid] = fut.result()
+            except Exception as e:
+                errors.append(f"{oid}: {e}")
+            if progress:
+                progress(done, total, oid)
+    return paths, errors
+
+
+def benchmark_batch(orders: list = None, worker_counts=(1, 2, 4), copies: int = 4) -> dict:
+    """
+    Đo thông lượng xuất hóa đơn (hóa đơn/giây) theo số worker.
+    Dữ liệu đơn hàng được nhân bản `copies` lần; file ghi vào thư mục tạm.
+    """
+    _require_reportlab()
+    from modules.data_handler import load_orders
+
+    if orders is None:
+        orders = load_orders()
+    sample = [{**o, "order_id": f"{o.get('order_id', '')}_{i}"}
+              for i in range(copies) for o in orders]
+
+    result = {}
+    for workers in worker_counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            export_invoices_batch(sample, max_workers=workers, export_dir=tmp)
+            elapsed = time.perf_counter() - start
+        result[workers] = len(sample) / elapsed if elapsed > 0 else 0.0
+    return result
+
+
+if __name__ == "__main__":
+    for workers, rate in benchmark_batch().items():
+        print(f"{workers} worker(s): {rate:,.1f} hóa đơn/giây")
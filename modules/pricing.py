@@ -0,0 +1,253 @@
+"""
+pricing.py - Bộ tính giá dùng chung cho giỏ hàng (Admin, Khách hàng) và create_order
+Quy tắc: giảm theo hạng thành viên (DISCOUNT_MAP), khuyến mãi theo sản phẩm / danh mục /
+thương hiệu, chiến dịch giảm theo đơn có khung thời gian và voucher (data/promotions.json).
+Quy tắc được biên dịch một lần thành bảng tra (chỉ biên dịch lại khi file đổi hoặc khi
+qua mốc bắt đầu/kết thúc của một chương trình); Quote cập nhật tổng tiền theo từng dòng.
+
+Mỗi chương trình trong promotions.json:
+  {"promo_id", "name", "kind": "product" | "category" | "brand" | "order" | "voucher",
+   "targets": [...] (mã SP / danh mục / thương hiệu), "percent": 10, "amount": 0,
+   "min_subtotal": 0, "code": "GLOW10" (voucher), "start": "YYYY-MM-DD", "end": "YYYY-MM-DD",
+   "active": true}
+Cách cộng dồn: dòng hàng lấy mức khuyến mãi cao nhất áp dụng được; trên phần còn lại trừ
+giảm giá theo hạng, rồi trừ thêm ưu đãi tốt nhất giữa chiến dịch theo đơn và voucher.
+Điều kiện min_subtotal luôn so với tiền hàng sau khuyến mãi dòng (trước giảm theo hạng).
+"""
+from datetime import datetime
+
+from modules.data_handler import load_json, load_products, data_version
+
+PROMOTIONS_FILE = "promotions.json"
+
+DISCOUNT_MAP = {
+    "Vàng": 0.10,
+    "Bạc": 0.08,
+    "Đồng": 0.05,
+}
+
+LINE_KINDS = ("product", "category", "brand")
+
+
+def rank_rate(rank):
+    """Tỷ lệ giảm giá theo hạng thành viên (0 nếu không có hạng / khách lẻ)."""
+    return DISCOUNT_MAP.get(rank or "", 0.0)
+
+
+def _parse_time(text, end=False):
+    if not text:
+        return None
+    try:
+        dt = datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    if end and len(text) <= 10:     # chỉ có ngày -> hết ngày đó
+        dt = dt.replace(hour=23, minute=59, second=59)
+    return dt
+
+
+class RuleSet:
+    """Các chương trình đang hiệu lực tại một thời điểm, đã biên dịch thành bảng tra."""
+
+    def __init__(self, promotions, now):
+        self.line = {kind: {} for kind in LINE_KINDS}   # kind -> {khóa: % giảm cao nhất}
+        self.order_rules = []                          # chiến dịch theo đơn
+        self.vouchers = {}                             # CODE -> chương trình
+        self.valid_until = None                        # mốc kế tiếp cần biên dịch lại
+        for promo in promotions:
+            if promo.get("active", True) is False:
+                continue
+            start = _parse_time(promo.get("start"))
+            end = _parse_time(promo.get("end"), end=True)
+            for boundary in (start, end):
+                if boundary and boundary > now and (self.valid_until is None
+                                                    or boundary < self.valid_until):
+                    self.valid_until = boundary
+            if (start and now < start) or (end and now > end):
+                continue
+            kind = promo.get("kind", "")
+            if kind in LINE_KINDS:
+                table = self.line[kind]
+                for target in promo.get("targets", []):
+                    key = str(target).lower() if kind != "product" else target
+                    table[key] = max(table.get(key, 0), promo.get("percent", 0))
+            elif kind == "order":
+                self.order_rules.append(promo)
+            elif kind == "voucher" and promo.get("code"):
+                self.vouchers[promo["code"].strip().upper()] = promo
+        self._line_cache = {}
+
+    def line_percent(self, product_id, category="", brand=""):
+        """% khuyến mãi cao nhất cho một sản phẩm (tra bảng, có cache theo sản phẩm)."""
+        key = (product_id, category, brand)
+        if key not in self._line_cache:
+            self._line_cache[key] = max(
+                self.line["product"].get(product_id, 0),
+                self.line["category"].get((category or "").lower(), 0),
+                self.line["brand"].get((brand or "").lower(), 0))
+        return self._line_cache[key]
+
+    @staticmethod
+    def _value(promo, base, eligible):
+        """Giá trị ưu đãi trên base; eligible = tiền hàng dùng để xét min_subtotal."""
+        if eligible < promo.get("min_subtotal", 0):
+            return 0
+        value = base * promo.get("percent", 0) / 100 + promo.get("amount", 0)
+        return min(value, base)
+
+    def order_discount(self, base, voucher=None, eligible=None):
+        """
+        (ưu đãi tốt nhất giữa chiến dịch theo đơn và voucher, tên chương trình).
+        eligible: tiền hàng xét điều kiện min_subtotal (mặc định = base).
+        """
+        eligible = base if eligible is None else eligible
+        best, name = 0, ""
+        candidates = list(self.order_rules)
+        if voucher and voucher in self.vouchers:
+            candidates.append(self.vouchers[voucher])
+        for promo in candidates:
+            value = self._value(promo, base, eligible)
+            if value > best:
+                best, name = value, promo.get("name") or promo.get("promo_id", "")
+        return best, name
+
+    def check_voucher(self, code, base):
+        """Trả về (mã chuẩn hóa, None) hoặc (None, lỗi)."""
+        code = (code or "").strip().upper()
+        promo = self.vouchers.get(code)
+        if not promo:
+            return None, "Mã giảm giá không tồn tại hoặc đã hết hạn"
+        if base < promo.get("min_subtotal", 0):
+            return None, f"Đơn tối thiểu {promo.get('min_subtotal', 0):,.0f}đ để dùng mã này"
+        return code, None
+
+
+_RULES = None
+_RULES_KEY = None
+
+
+def get_rules(now=None):
+    """Bộ quy tắc đã biên dịch; biên dịch lại khi promotions.json đổi hoặc qua mốc thời gian."""
+    global _RULES, _RULES_KEY
+    now = now or datetime.now()
+    version = data_version(PROMOTIONS_FILE)
+    if (_RULES is None or _RULES_KEY != version
+            or (_RULES.valid_until and now >= _RULES.valid_until)):
+        _RULES = RuleSet(load_json(PROMOTIONS_FILE), now)
+        _RULES_KEY = version
+    return _RULES
+
+
+class Quote:
+    """
+    Báo giá cho một giỏ hàng, cập nhật dần: mỗi lần thêm/sửa/xóa dòng chỉ tính lại dòng
+    đó và cộng dồn vào tổng; phần giảm theo đơn chỉ phụ thuộc các tổng này.
+    """
+
+    def __init__(self, rank="", voucher=None, rules=None):
+        self._fixed_rules = rules is not None
+        self.rules = rules or get_rules()
+        self.rank = rank or ""
+        self.voucher = None
+        self.lines = {}          # pid -> {"price", "quantity", "percent", "gross", "discount", ...}
+        self.subtotal = 0
+        self.line_discount = 0
+        if voucher:
+            self.set_voucher(voucher)
+
+    def _sync_rules(self):
+        """Quy tắc đã biên dịch lại (file đổi / qua mốc thời gian) -> tính lại các dòng."""
+        if self._fixed_rules:
+            return
+        rules = get_rules()
+        if rules is self.rules:
+            return
+        self.rules = rules
+        for pid, line in list(self.lines.items()):
+            self.set_line(pid, line["price"], line["quantity"], line["category"], line["brand"])
+        if self.voucher and self.voucher not in rules.vouchers:
+            self.voucher = None
+
+    def set_line(self, product_id, price, quantity, category="", brand=""):
+        self._sync_rules()
+        self.remove_line(product_id)
+        if quantity <= 0:
+            return
+        percent = self.rules.line_percent(product_id, category, brand)
+        gross = price * quantity
+        line = {"price": price, "quantity": quantity, "category": category, "brand": brand,
+                "percent": percent, "gross": gross, "discount": gross * percent / 100}
+        self.lines[product_id] = line
+        self.subtotal += gross
+        self.line_discount += line["discount"]
+
+    def remove_line(self, product_id):
+        line = self.lines.pop(product_id, None)
+        if line:
+            self.subtotal -= line["gross"]
+            self.line_discount -= line["discount"]
+
+    def clear(self):
+        self.lines.clear()
+        self.subtotal = self.line_discount = 0
+
+    def set_rank(self, rank):
+        self.rank = rank or ""
+
+    def set_voucher(self, code):
+        """Áp mã giảm giá; trả về (True, None) hoặc (False, lỗi). code rỗng = bỏ voucher."""
+        if not code:
+            self.voucher = None
+            return True, None
+        self._sync_rules()
+        code, err = self.rules.check_voucher(code, self.subtotal - self.line_discount)
+        if err:
+            return False, err
+        self.voucher = code
+        return True, None
+
+    def totals(self):
+        self._sync_rules()
+        net = self.subtotal - self.line_discount
+        rate = rank_rate(self.rank)
+        rank_discount = net * rate
+        # voucher không còn đủ điều kiện (giỏ bị bớt hàng) thì không áp dụng / không ghi vào đơn
+        voucher = self.voucher if self.voucher and not self.rules.check_voucher(
+            self.voucher, net)[1] else None
+        order_discount, promo_name = self.rules.order_discount(net - rank_discount, voucher, net)
+        discount = self.line_discount + rank_discount + order_discount
+        return {
+            "subtotal": self.subtotal,
+            "line_discount": self.line_discount,
+            "discount_rate": rate,
+            "rank_discount": rank_discount,
+            "order_discount": order_discount,
+            "promotion": promo_name,
+            "voucher": voucher,
+            "discount": discount,
+            "total": self.subtotal - discount,
+        }
+
+
+def quote_items(items, rank="", voucher=None, products=None):
+    """
+    Báo giá cho danh sách dòng hàng [{"product_id", "price", "quantity"}].
+    Danh mục / thương hiệu (cho khuyến mãi) lấy từ products nếu có khuyến mãi theo dòng.
+    """
+    quote = Quote(rank)
+    info = {}
+    if quote.rules.line["category"] or quote.rules.line["brand"]:
+        info = {p.get("product_id"): p for p in (products or load_products())}
+    merged = {}
+    for it in items:
+        pid = it["product_id"]
+        price, qty = merged.get(pid, (it["price"], 0))
+        merged[pid] = (price, qty + it["quantity"])
+    for pid, (price, qty) in merged.items():
+        p = info.get(pid, {})
+        quote.set_line(pid, price, qty, p.get("category", ""), p.get("brand", ""))
+    if voucher:
+        ok, err = quote.set_voucher(voucher)
+        if not ok:
+            return quote, err
+    return quote, None
@@ -0,0 +1,76 @@
+"""
+print_queue.py - Hàng đợi in hóa đơn gộp
+Các yêu cầu in tới trong một khoảng thời gian ngắn được gom lại và xuất
+thành một file PDF nhiều trang duy nhất.
+"""
+import threading
+
+from modules import pdf_export
+from modules.data_handler import load_orders, load_customers, load_products
+
+
+def _thread_schedule(delay, callback):
+    timer = threading.Timer(delay, callback)
+    timer.daemon = True
+    timer.start()
+
+
+class PrintQueue:
+    """
+    Gom các mã đơn hàng gửi tới trong `window` giây rồi in một lần.
+    - on_flush(path, order_ids, err): được gọi sau mỗi lô (err là chuỗi lỗi hoặc None);
+      khi lỗi, order_ids là các đơn của lô không in được.
+    - schedule(delay, callback): cách hẹn giờ; mặc định dùng threading.Timer,
+      giao diện Qt có thể truyền QTimer.singleShot để callback chạy trên luồng UI.
+    """
+
+    def __init__(self, window=2.0, on_flush=None, schedule=None):
+        self.window = window
+        self.on_flush = on_flush
+        self._schedule = schedule or _thread_schedule
+        self._pending = []
+        self._lock = threading.Lock()
+        self._scheduled = False
+
+    def submit(self, order_ids):
+        """Thêm mã đơn vào hàng đợi (bỏ trùng). Trả về số đơn đang chờ in."""
+        if isinstance(order_ids, str):
+            order_ids = [order_ids]
+        with self._lock:
+            for oid in order_ids:
+                if oid and oid not in self._pending:
+                    self._pending.append(oid)
+            count = len(self._pending)
+            start_timer = count > 0 and not self._scheduled
+            if start_timer:
+                self._scheduled = True
+        if start_timer:
+            self._schedule(self.window, self.flush)
+        return count
+
+    def pending(self):
+        with self._lock:
+            return list(self._pending)
+
+    def flush(self):
+        """In ngay tất cả đơn đang chờ. Trả về đường dẫn PDF hoặc None."""
+        with self._lock:
+            order_ids, self._pending = self._pending, []
+            self._scheduled = False
+        if not order_ids:
+            return None
+
+        path, err, printed = None, None, order_ids
+        try:
+            wanted = set(order_ids)
+            found = {o["order_id"]: o for o in load_orders() if o.get("order_id") in wanted}
+            batch = [found[oid] for oid in order_ids if oid in found]
+            printed = [o["order_id"] for o in batch]
+            customers_map = {c["customer_id"]: c for c in load_customers()}
+            products_map = {p["product_id"]: p for p in load_products()}
+            path = pdf_export.export_invoices_combined(batch, customers_map, products_map)
+        except Exception as e:   # chạy trong callback hẹn giờ: không để lỗi làm mất cả lô
+            err = f"{type(e).__name__}: {e}"
+        if self.on_flush:
+            self.on_flush(path, printed, err)
+        return path
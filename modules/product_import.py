@@ -0,0 +1,196 @@
+"""
+product_import.py - Nhập sản phẩm hàng loạt từ file CSV / Excel
+Đọc lần lượt từng dòng (openpyxl chế độ read-only), kiểm tra dữ liệu, bỏ trùng
+theo mã SP hoặc (tên + thương hiệu), cấp mã theo khối và ghi products.json một lần.
+Yêu cầu cho file .xlsx: pip install openpyxl
+"""
+import csv
+import math
+from pathlib import Path
+from datetime import datetime
+
+try:
+    import openpyxl
+    OPENPYXL_OK = True
+except ImportError:
+    OPENPYXL_OK = False
+
+from modules.data_handler import load_products, save_products, next_id
+from modules import stock_ledger, stock_watch
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+EXPORT_DIR = BASE_DIR / "exports"
+
+# Tên cột chấp nhận được (không phân biệt hoa thường) -> khóa trong products.json
+COLUMN_ALIASES = {
+    "product_id": ["product_id", "mã sp", "mã sản phẩm", "id"],
+    "name": ["name", "tên sản phẩm", "tên"],
+    "brand": ["brand", "thương hiệu"],
+    "category": ["category", "danh mục"],
+    "price": ["price", "giá", "giá (đ)"],
+    "stock_quantity": ["stock_quantity", "số lượng", "tồn kho"],
+    "min_quantity": ["min_quantity", "số lượng tối thiểu"],
+    "skin-type": ["skin-type", "skin_type", "loại da"],
+    "effects": ["effects", "công dụng"],
+    "ingredients": ["ingredients", "thành phần"],
+}
+_HEADER_MAP = {alias: key for key, aliases in COLUMN_ALIASES.items() for alias in aliases}
+LIST_FIELDS = ("skin-type", "effects", "ingredients")
+INT_FIELDS = ("price", "stock_quantity", "min_quantity")
+
+
+def _map_header(header):
+    return [_HEADER_MAP.get(str(h or "").strip().lower()) for h in header]
+
+
+def iter_rows(path):
+    """Sinh (số dòng trong file, dict theo khóa products.json) cho từng dòng dữ liệu."""
+    path = Path(path)
+    if path.suffix.lower() == ".xlsx":
+        if not OPENPYXL_OK:
+            raise RuntimeError(
+                "Thư viện openpyxl chưa được cài đặt.\n"
+                "Vui lòng chạy: pip install openpyxl"
+            )
+        wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = wb.active.iter_rows(values_only=True)
+            keys = _map_header(next(rows, []))
+            for n, values in enumerate(rows, 2):
+                if values and any(v not in (None, "") for v in values):
+                    yield n, {k: v for k, v in zip(keys, values) if k}
+        finally:
+            wb.close()
+    elif path.suffix.lower() == ".csv":
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            reader = csv.reader(f)
+            keys = _map_header(next(reader, []))
+            for n, values in enumerate(reader, 2):
+                if any(v.strip() for v in values):
+                    yield n, {k: v for k, v in zip(keys, values) if k}
+    else:
+        raise ValueError("Chỉ hỗ trợ file .csv hoặc .xlsx")
+
+
+def _parse_int(text):
+    """'12', '1,200', '12.0' (ô số của Excel) -> int; số lẻ, inf, nan, quá lớn -> ValueError."""
+    text = text.replace(",", "")
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    num = float(text)
+    if not math.isfinite(num) or not num.is_integer():
+        raise ValueError(text)
+    return int(num)
+
+
+def parse_row(raw):
+    """
+    Chuẩn hóa một dòng. Trả về (dict sản phẩm, None) hoặc (None, lỗi).
+    Giá chỉ bắt buộc với sản phẩm mới (kiểm tra trong import_products).
+    """
+    product = {}
+    for key, val in raw.items():
+        text = "" if val is None else str(val).strip()
+        if key in LIST_FIELDS:
+            product[key] = [v.strip() for v in text.split(";") if v.strip()]
+        elif key in INT_FIELDS:
+            if not text:
+                continue
+            try:
+                num = _parse_int(text)
+            except (ValueError, OverflowError):
+                return None, f"Cột {key} không phải số nguyên: '{text}'"
+            if num < 0:
+                return None, f"Cột {key} không được âm"
+            product[key] = num
+        else:
+            product[key] = text
+    if not product.get("name"):
+        return None, "Thiếu tên sản phẩm"
+    return product, None
+
+
+def _name_key(product):
+    return (product.get("name", "").strip().lower(), product.get("brand", "").strip().lower())
+
+
+def import_products(path, update_existing=True):
+    """
+    Nhập sản phẩm từ file. Sản phẩm đã có (trùng mã hoặc trùng tên + thương hiệu) được
+    cập nhật nếu update_existing, ngược lại báo lỗi. Dòng trùng nhau trong file bị báo lỗi.
+    Trả về (tổng kết {"added", "updated", "rows"}, [(số dòng, lỗi)]).
+    """
+    products = load_products()
+    by_id = {p.get("product_id"): i for i, p in enumerate(products)}
+    by_name = {_name_key(p): i for i, p in enumerate(products)}
+    seen_ids, seen_names = {}, {}
+    new_products, errors, stock_moves, touched = [], [], [], []
+    updated = rows = 0
+
+    for n, raw in iter_rows(path):
+        rows += 1
+        product, err = parse_row(raw)
+        if err:
+            errors.append((n, err))
+            continue
+        pid = product.get("product_id") or None
+        nkey = _name_key(product)
+        dup_row = (seen_ids.get(pid) if pid else None) or seen_names.get(nkey)
+        if dup_row:
+            errors.append((n, f"Trùng với dòng {dup_row} trong file"))
+            continue
+        if pid:
+            seen_ids[pid] = n
+        seen_names[nkey] = n
+
+        existing = by_id.get(pid) if pid else None
+        if existing is None:
+            existing = by_name.get(nkey)
+        if existing is not None:
+            if not update_existing:
+                errors.append((n, f"Sản phẩm đã tồn tại ({products[existing]['product_id']})"))
+                continue
+            product.pop("product_id", None)
+            if "stock_quantity" in product:
+                stock_moves.append((products[existing]["product_id"],
+                                    product["stock_quantity"]
+                                    - products[existing].get("stock_quantity", 0)))
+            products[existing].update(product)
+            touched.append(products[existing])
+            updated += 1
+        else:
+            if "price" not in product:
+                errors.append((n, "Thiếu giá"))
+                continue
+            product.setdefault("stock_quantity", 0)
+            new_products.append(product)
+
+    # Cấp mã theo khối: tính mã kế tiếp một lần rồi đánh số liên tiếp cho cả lô
+    next_num = int(next_id(products + new_products, "product_id", "P", 4)[1:])
+    for p in new_products:
+        if not p.get("product_id"):
+            p["product_id"] = f"P{next_num:04d}"
+            next_num += 1
+    products.extend(new_products)
+
+    if new_products or updated:
+        save_products(products)
+        stock_moves += [(p["product_id"], p.get("stock_quantity", 0)) for p in new_products]
+        stock_ledger.record_many([(pid, delta, stock_ledger.KIND_ADJUST, "import")
+                                  for pid, delta in stock_moves])
+        for p in touched + new_products:
+            stock_watch.on_product_saved(p)
+    return {"added": len(new_products), "updated": updated, "rows": rows}, errors
+
+
+def write_error_report(errors, source_name="import"):
+    """Ghi báo cáo lỗi từng dòng ra exports/ (CSV). Trả về đường dẫn file."""
+    EXPORT_DIR.mkdir(exist_ok=True)
+    path = EXPORT_DIR / f"LoiNhapSP_{Path(source_name).stem}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Dòng", "Lỗi"])
+        writer.writerows(errors)
+    return str(path)
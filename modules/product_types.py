@@ -0,0 +1,102 @@
+"""
+product_types.py - Phân loại sản phẩm theo loại (serum, toner, ...) dùng chung
+cho recommendation và chatbot. Mỗi sản phẩm chỉ được phân loại một lần; chỉ mục
+được cập nhật dần khi thêm/sửa/xóa sản phẩm, lọc theo loại chỉ là tra set.
+"""
+from modules.data_handler import load_products, data_version
+
+PRODUCT_TYPES = {
+    "serum": ["serum", "retinol"],
+    "mask": ["mặt nạ", "mask", "sleeping mask"],
+    "cleanser": ["sữa rửa mặt", "gel rửa mặt", "cleanser"],
+    "toner": ["toner", "nước hoa hồng", "nước cân bằng", "xịt khoáng"],
+    "moisturizer": ["kem dưỡng", "gel dưỡng", "cream", "dưỡng ẩm", "thạch"],
+    "sunscreen": ["chống nắng", "sunscreen", "spf"],
+    "exfoliant": ["tẩy da chết", "aha", "bha"],
+    "cleansing": ["tẩy trang", "micellar"],
+    "lipcare": ["son dưỡng", "dưỡng môi"],
+}
+
+
+def classify(product):
+    """Các loại sản phẩm mà tên hoặc danh mục chứa từ khóa tương ứng."""
+    name = product.get("name", "").lower()
+    cat = product.get("category", "").lower()
+    return frozenset(t for t, kws in PRODUCT_TYPES.items()
+                     if any(kw in name or kw in cat for kw in kws))
+
+
+class ProductTypeIndex:
+    """pid -> các loại, loại -> set pid. Chỉ phân loại lại khi tên/danh mục đổi."""
+
+    def __init__(self):
+        self.types_of = {}
+        self.members = {t: set() for t in PRODUCT_TYPES}
+        self._keys = {}   # pid -> (tên, danh mục) lúc phân loại
+
+    def update(self, product):
+        pid = product.get("product_id")
+        key = (product.get("name", ""), product.get("category", ""))
+        if self._keys.get(pid) == key:
+            return
+        self.remove(pid)
+        types = classify(product)
+        self._keys[pid] = key
+        self.types_of[pid] = types
+        for t in types:
+            self.members[t].add(pid)
+
+    def remove(self, pid):
+        for t in self.types_of.pop(pid, ()):
+            self.members[t].discard(pid)
+        self._keys.pop(pid, None)
+
+    def sync(self, products):
+        """Đối chiếu với danh sách sản phẩm đầy đủ (chỉ phân loại lại sản phẩm đã đổi)."""
+        seen = set()
+        for p in products:
+            self.update(p)
+            seen.add(p.get("product_id"))
+        for pid in [pid for pid in self.types_of if pid not in seen]:
+            self.remove(pid)
+
+
+_INDEX = ProductTypeIndex()
+_INDEX_VERSION = None
+
+
+def get_index():
+    """Chỉ mục hiện tại; đối chiếu lại khi products.json bị thay đổi từ nơi khác."""
+    global _INDEX_VERSION
+    version = data_version("products.json")
+    if version != _INDEX_VERSION:
+        _INDEX.sync(load_products())
+        _INDEX_VERSION = version
+    return _INDEX
+
+
+def on_product_saved(product):
+    """Cập nhật sau khi thêm/sửa sản phẩm (gọi sau khi đã lưu products.json)."""
+    global _INDEX_VERSION
+    if _INDEX_VERSION is None:
+        return
+    _INDEX.update(product)
+    _INDEX_VERSION = data_version("products.json")
+
+
+def on_product_deleted(product_id):
+    """Cập nhật sau khi xóa sản phẩm (gọi sau khi đã lưu products.json)."""
+    global _INDEX_VERSION
+    if _INDEX_VERSION is None:
+        return
+    _INDEX.remove(product_id)
+    _INDEX_VERSION = data_version("products.json")
+
+
+def products_of_type(product_type):
+    """Set mã sản phẩm thuộc loại product_type (rỗng nếu loại không tồn tại)."""
+    return get_index().members.get(product_type, set())
+
+
+def types_of(product_id):
+    return get_index().types_of.get(product_id, frozenset())
@@ -1,142 +1,465 @@
 """
 recommendation.py - Engine gợi ý sản phẩm theo loại da và vấn đề da
+Dùng chỉ mục đặc trưng dạng bitset (bit i ứng với sản phẩm thứ i), chỉ dựng lại
+khi products.json thay đổi.
 """
-from modules.data_handler import load_products, load_customers
-
-PRODUCT_TYPES = {
-    "serum": ["serum", "retinol"],
-    "mask": ["mặt nạ", "mask", "sleeping mask"],
-    "cleanser": ["sữa rửa mặt", "gel rửa mặt", "cleanser"],
-    "toner": ["toner", "nước hoa hồng", "nước cân bằng", "xịt khoáng"],
-    "moisturizer": ["kem dưỡng", "gel dưỡng", "cream", "dưỡng ẩm", "thạch"],
-    "sunscreen": ["chống nắng", "sunscreen", "spf"],
-    "exfoliant": ["tẩy da chết", "aha", "bha"],
-    "cleansing": ["tẩy trang", "micellar"],
-    "lipcare": ["son dưỡng", "dưỡng môi"],
+import heapq
+import hashlib
+import threading
+from datetime import datetime, timedelta
+
+from modules.data_handler import load_products, load_customers, load_orders, data_version
+from modules.cache import LRUCache
+from modules import search_index, ingredients, product_types
+
+ROUTINE_KEYWORDS = {
+    "Tẩy trang": ["tẩy trang", "micellar"],
+    "Sữa rửa mặt": ["sữa rửa mặt", "gel rửa mặt", "cleanser"],
+    "Toner": ["toner", "nước hoa hồng", "nước cân bằng", "xịt khoáng"],
+    "Serum": ["serum"],
+    "Kem dưỡng": ["kem dưỡng", "thạch", "gel dưỡng"],
+    "Kem chống nắng": ["chống nắng", "sunscreen", "spf"],
 }
 
+UNIVERSAL_SKIN = "mọi loại da"
+BRAND_BONUS = 1               # điểm cộng cho thương hiệu ưu tiên trong routine
 
-def recommendation(skin_type=None, effects=None, product_type=None, limit=5):
-    """Gợi ý sản phẩm theo loại da, hiệu ứng và loại sản phẩm."""
-    products = load_products()
-    if not products:
-        return []
+CUSTOMER_CACHE_SIZE = 500     # số khách hàng giữ gợi ý trong cache (LRU)
+WARM_UP_DAYS = 90             # khách có đơn trong số ngày này được tính sẵn gợi ý
 
-    scored = []
-    for p in products:
-        if p.get("stock_quantity", 0) == 0:
-            continue
 
-        # Lọc theo loại sản phẩm
-        if product_type:
-            name = p.get("name", "").lower()
-            cat = p.get("category", "").lower()
-            matched = any(
-                kw in name or kw in cat
-                for kw in PRODUCT_TYPES.get(product_type, [])
-            )
-            if not matched:
-                continue
+class FeatureIndex:
+    """
+    Chỉ mục đặc trưng của catalog:
+    - skin_terms / effect_terms: {chuỗi đã lowercase: bitset các sản phẩm có chuỗi đó}
+    - brand_terms / ingredient_terms: như trên cho thương hiệu và thành phần
+    - in_stock: bitset sản phẩm còn hàng
+    Truy vấn so khớp chuỗi con trên từ vựng (nhỏ) thay vì trên từng sản phẩm,
+    kết quả được ghi nhớ trong vòng đời của chỉ mục.
+    """
 
-        score = 0
-        # Chấm điểm theo loại da
-        if skin_type:
+    def __init__(self, products):
+        self.products = products
+        self.size = len(products)
+        self.in_stock = 0
+        self.positions = {}
+        self.skin_terms = {}
+        self.effect_terms = {}
+        self.brand_terms = {}
+        self.ingredient_terms = {}
+        self.prices = []
+        self._names = []
+        self._cats = []
+        self._memo = {}
+        sig = hashlib.sha1()
+        for i, p in enumerate(products):
+            bit = 1 << i
+            self.positions[p.get("product_id")] = i
+            # Chữ ký catalog: mọi thứ ảnh hưởng tới gợi ý, trừ số lượng tồn kho
+            sig.update(repr((p.get("product_id"), p.get("name"), p.get("category"),
+                             p.get("skin-type"), p.get("effects"))).encode("utf-8"))
+            if p.get("stock_quantity", 0) > 0:
+                self.in_stock |= bit
             for st in p.get("skin-type", []):
-                if skin_type in st.lower() or st.lower() in skin_type or "mọi loại da" in st.lower():
-                    score += 2
-                    break
+                term = st.lower()
+                self.skin_terms[term] = self.skin_terms.get(term, 0) | bit
+            for ef in p.get("effects", []):
+                term = ef.lower()
+                self.effect_terms[term] = self.effect_terms.get(term, 0) | bit
+            brand = p.get("brand", "").lower().strip()
+            self.brand_terms[brand] = self.brand_terms.get(brand, 0) | bit
+            for ing in p.get("ingredients", []):
+                term = ingredients.normalize(ing)
+                self.ingredient_terms[term] = self.ingredient_terms.get(term, 0) | bit
+            self.prices.append(p.get("price", 0))
+            self._names.append(p.get("name", "").lower())
+            self._cats.append(p.get("category", "").lower())
+        self.universal_skin = self._terms_mask(self.skin_terms, UNIVERSAL_SKIN, False)
+        self.signature = sig.hexdigest()
+
+    @staticmethod
+    def _terms_mask(terms, query, both_ways):
+        mask = 0
+        for term, bits in terms.items():
+            if query in term or (both_ways and term in query):
+                mask |= bits
+        return mask
+
+    def skin_mask(self, query, both_ways=False, universal=False):
+        """Sản phẩm có loại da chứa query (hoặc ngược lại nếu both_ways)."""
+        key = ("skin", query, both_ways, universal)
+        mask = self._memo.get(key)
+        if mask is None:
+            mask = self._terms_mask(self.skin_terms, query, both_ways)
+            if universal:
+                mask |= self.universal_skin
+            self._memo[key] = mask
+        return mask
+
+    def effect_mask(self, query, both_ways=False):
+        """Sản phẩm có công dụng chứa query (hoặc ngược lại nếu both_ways)."""
+        key = ("effect", query, both_ways)
+        mask = self._memo.get(key)
+        if mask is None:
+            mask = self._terms_mask(self.effect_terms, query, both_ways)
+            self._memo[key] = mask
+        return mask
+
+    def keyword_mask(self, keywords, include_category=False):
+        """Sản phẩm có tên (và danh mục nếu include_category) chứa một trong các từ khóa."""
+        key = ("kw", tuple(keywords), include_category)
+        mask = self._memo.get(key)
+        if mask is None:
+            mask = 0
+            for i, name in enumerate(self._names):
+                cat = self._cats[i] if include_category else ""
+                if any(kw in name or kw in cat for kw in keywords):
+                    mask |= 1 << i
+            self._memo[key] = mask
+        return mask
+
+    def type_mask(self, product_type):
+        """Sản phẩm thuộc loại product_type (tra từ chỉ mục phân loại dùng chung)."""
+        key = ("type", product_type)
+        mask = self._memo.get(key)
+        if mask is None:
+            mask = 0
+            for pid in product_types.products_of_type(product_type):
+                i = self.positions.get(pid)
+                if i is not None:
+                    mask |= 1 << i
+            self._memo[key] = mask
+        return mask
+
+    def step_masks(self):
+        """Phân loại sản phẩm vào các bước routine (một lần cho mỗi chỉ mục)."""
+        steps = self._memo.get("routine_steps")
+        if steps is None:
+            steps = {step: self.keyword_mask(kws) for step, kws in ROUTINE_KEYWORDS.items()}
+            self._memo["routine_steps"] = steps
+        return steps
 
-        # Chấm điểm theo hiệu ứng
-        if effects:
-            for ef in effects:
-                for pe in p.get("effects", []):
-                    if ef.lower() in pe.lower() or pe.lower() in ef.lower():
-                        score += 1
-                        break
+    def brand_mask(self, brands):
+        """Sản phẩm thuộc một trong các thương hiệu (không phân biệt hoa thường)."""
+        mask = 0
+        for b in brands:
+            mask |= self.brand_terms.get(b.lower().strip(), 0)
+        return mask
 
-        if score > 0 or (not skin_type and not effects and product_type):
-            scored.append({"product": p, "score": score})
+    def ingredient_mask(self, names):
+        """Sản phẩm chứa một trong các thành phần (gộp cả tên gọi khác trong ingredients.json)."""
+        kb = ingredients.get_index()
+        mask = 0
+        for name in names:
+            keys = {ingredients.normalize(name)}
+            entry = kb.get(name, fuzzy=False)
+            if entry:
+                keys.update(ingredients.normalize(n)
+                            for n in [entry.get("name", "")] + entry.get("aliases", []))
+            for k in keys:
+                mask |= self.ingredient_terms.get(k, 0)
+        return mask
 
-    scored.sort(key=lambda x: x["score"], reverse=True)
-    return [item["product"] for item in scored[:limit]]
+    def is_in_stock(self, product_id):
+        i = self.positions.get(product_id)
+        return i is not None and bool(self.in_stock >> i & 1)
+
+    def first(self, mask, limit):
+        """Lấy tối đa `limit` sản phẩm trong mask theo thứ tự catalog."""
+        result = []
+        for i in _iter_bits(mask):
+            if len(result) >= limit:
+                break
+            result.append(self.products[i])
+        return result
+
+    def top_k(self, candidates, weighted_masks, limit):
+        """
+        Chấm điểm sản phẩm trong candidates: mỗi (trọng số, mask) cộng trọng số nếu
+        sản phẩm thuộc mask. Trả về top `limit` theo điểm giảm dần, hòa điểm giữ thứ tự catalog.
+        """
+        scored = ((sum(w for w, m in weighted_masks if m >> i & 1), i)
+                  for i in _iter_bits(candidates))
+        best = heapq.nlargest(limit, scored, key=lambda x: x[0])
+        return [self.products[i] for _, i in best]
+
+
+def _iter_bits(mask):
+    # Duyệt chuỗi nhị phân (bit thấp đứng đầu): O(số bit) kể cả với catalog rất lớn
+    bits = bin(mask)[:1:-1]
+    i = bits.find("1")
+    while i >= 0:
+        yield i
+        i = bits.find("1", i + 1)
+
+
+_INDEX = None
+_INDEX_VERSION = None
+# warm_up chạy ở luồng nền trong khi giao diện cũng đọc chỉ mục / cache gợi ý:
+# dựng chỉ mục và tính + ghi cache đều nằm trong khóa này (RLock vì compute gọi lại get_index)
+_lock = threading.RLock()
+
+
+def get_index():
+    """Chỉ mục đặc trưng hiện tại; chỉ dựng lại khi products.json thay đổi."""
+    global _INDEX, _INDEX_VERSION
+    with _lock:
+        version = data_version("products.json")
+        if _INDEX is None or version != _INDEX_VERSION:
+            _INDEX = FeatureIndex(load_products())
+            _INDEX_VERSION = version
+        return _INDEX
+
+
+def catalog_version():
+    """Phiên bản catalog dùng cho cache gợi ý (không đổi khi chỉ thay đổi tồn kho)."""
+    return get_index().signature
+
+
+def _union(weighted_masks):
+    mask = 0
+    for _, m in weighted_masks:
+        mask |= m
+    return mask
+
+
+def recommendation(skin_type=None, effects=None, product_type=None, limit=5):
+    """Gợi ý sản phẩm theo loại da, hiệu ứng và loại sản phẩm."""
+    idx = get_index()
+    if not idx.size:
+        return []
+
+    candidates = idx.in_stock
+    # Lọc theo loại sản phẩm
+    if product_type:
+        candidates &= idx.type_mask(product_type)
+
+    weighted = []
+    # Chấm điểm theo loại da
+    if skin_type:
+        weighted.append((2, idx.skin_mask(skin_type, both_ways=True, universal=True)))
+    # Chấm điểm theo hiệu ứng
+    if effects:
+        weighted.extend((1, idx.effect_mask(ef.lower(), both_ways=True)) for ef in effects)
+
+    if skin_type or effects:
+        candidates &= _union(weighted)
+    elif not product_type:
+        return []
+    return idx.top_k(candidates, weighted, limit)
 
 
 def recommend_by_skin_type(skin_type, limit=5):
     """Gợi ý sản phẩm theo loại da."""
-    products = load_products()
+    idx = get_index()
     skin_type = skin_type.lower().strip()
-    available = [p for p in products if p.get("stock_quantity", 0) > 0]
-    matches = [
-        p for p in available
-        if any(skin_type in s.lower() or "mọi loại da" in s.lower()
-               for s in p.get("skin-type", []))
-    ]
-    return (matches if matches else available)[:limit]
+    matches = idx.in_stock & idx.skin_mask(skin_type, universal=True)
+    return idx.first(matches or idx.in_stock, limit)
+
+
+def _concern_masks(idx, concerns):
+    return [(1, idx.effect_mask(c)) for c in concerns]
 
 
 def recommend_by_concern(concerns, limit=5):
     """Gợi ý sản phẩm theo vấn đề da."""
-    products = load_products()
+    idx = get_index()
     if isinstance(concerns, str):
         concerns = [concerns]
     concerns = [c.lower().strip() for c in concerns]
 
-    scored = []
-    for p in products:
-        if p.get("stock_quantity", 0) <= 0:
-            continue
-        effects = [e.lower() for e in p.get("effects", [])]
-        score = sum(1 for c in concerns if any(c in ef for ef in effects))
-        if score > 0:
-            scored.append((p, score))
+    weighted = _concern_masks(idx, concerns)
+    candidates = idx.in_stock & _union(weighted)
+    if not candidates:
+        return idx.first(idx.in_stock, limit)
+    return idx.top_k(candidates, weighted, limit)
+
 
-    if not scored:
-        return [p for p in products if p.get("stock_quantity", 0) > 0][:limit]
-    scored.sort(key=lambda x: x[1], reverse=True)
-    return [p for p, _ in scored[:limit]]
+def _routine_scores(allowed, weighted):
+    """Điểm của mọi sản phẩm thuộc ít nhất một bước routine, tính trong một lượt."""
+    scores = dict.fromkeys(_iter_bits(allowed), 0)
+    for w, m in weighted:
+        for i in _iter_bits(allowed & m):
+            scores[i] += w
+    return scores
 
 
-def recommend_skincare_routine(skin_type, concerns):
-    """Tạo skincare routine 6 bước gợi ý sản phẩm cụ thể."""
-    products = load_products()
+def _pareto_options(bucket, scores, prices):
+    """Các lựa chọn không bị lấn át (rẻ hơn hoặc điểm cao hơn) của một bước."""
+    options, best = [], None
+    for i in sorted(bucket, key=lambda i: (prices[i], -scores[i], i)):
+        if best is None or scores[i] > best:
+            options.append(i)
+            best = scores[i]
+    return options
+
+
+def _solve_budget(steps, scores, prices, budget):
+    """
+    Chọn tối đa một sản phẩm cho mỗi bước, tổng giá <= budget: ưu tiên đủ nhiều bước
+    nhất, rồi tổng điểm cao nhất, rồi rẻ nhất. Quy hoạch động nhiều lựa chọn trên các
+    trạng thái (chi phí, điểm) chỉ giữ biên Pareto sau mỗi bước.
+    """
+    states = [(0, (0, 0), ())]   # (tổng giá, (số bước, tổng điểm), các lựa chọn)
+    for step, options in steps:
+        grown = list(states)
+        for cost, (n_steps, score), picks in states:
+            for i in options:
+                c = cost + prices[i]
+                if c <= budget:
+                    grown.append((c, (n_steps + 1, score + scores[i]), picks + ((step, i),)))
+        # Giữ biên Pareto: theo chi phí tăng dần, chỉ giữ trạng thái có giá trị tốt hơn
+        grown.sort(key=lambda st: (st[0], -st[1][0], -st[1][1]))
+        states, best = [], None
+        for st in grown:
+            if best is None or st[1] > best:
+                states.append(st)
+                best = st[1]
+    _, _, picks = max(states, key=lambda st: (st[1], -st[0]))
+    return list(picks)
+
+
+def recommend_skincare_routine(skin_type, concerns, budget=None, brands=None,
+                               exclude_ingredients=None):
+    """
+    Tạo skincare routine 6 bước gợi ý sản phẩm cụ thể.
+    Ràng buộc tùy chọn: budget (tổng giá tối đa), brands (thương hiệu ưu tiên, được
+    cộng BRAND_BONUS điểm), exclude_ingredients (loại hẳn sản phẩm chứa thành phần này).
+    """
+    idx = get_index()
     skin_type = skin_type.lower().strip()
     if isinstance(concerns, str):
         concerns = [concerns]
     concerns = [c.lower().strip() for c in concerns]
 
-    routine_keywords = {
-        "Tẩy trang": ["tẩy trang", "micellar"],
-        "Sữa rửa mặt": ["sữa rửa mặt", "gel rửa mặt", "cleanser"],
-        "Toner": ["toner", "nước hoa hồng", "nước cân bằng", "xịt khoáng"],
-        "Serum": ["serum"],
-        "Kem dưỡng": ["kem dưỡng", "thạch", "gel dưỡng"],
-        "Kem chống nắng": ["chống nắng", "sunscreen", "spf"],
-    }
+    weighted = [(2, idx.skin_mask(skin_type))] + _concern_masks(idx, concerns)
+    if brands:
+        weighted.append((BRAND_BONUS, idx.brand_mask(brands)))
+    allowed = idx.in_stock
+    if exclude_ingredients:
+        allowed &= ~idx.ingredient_mask(exclude_ingredients)
 
-    routine = []
-    for step_name, keywords in routine_keywords.items():
-        candidates = [
-            p for p in products
-            if any(k in p.get("name", "").lower() for k in keywords)
-            and p.get("stock_quantity", 0) > 0
-        ]
-        if not candidates:
+    step_masks = idx.step_masks()
+    scores = _routine_scores(allowed & _union((0, m) for m in step_masks.values()), weighted)
+    buckets = [(step, [i for i in _iter_bits(mask & allowed)])
+               for step, mask in step_masks.items()]
+
+    if budget is None:
+        picks = [(step, max(bucket, key=lambda i: (scores[i], -i)))
+                 for step, bucket in buckets if bucket]
+    else:
+        steps = [(step, _pareto_options(bucket, scores, idx.prices))
+                 for step, bucket in buckets if bucket]
+        picks = _solve_budget(steps, scores, idx.prices, budget)
+    return [{"step": step, "product": idx.products[i]} for step, i in picks]
+
+
+TEXT_SKIN_BONUS = 0.1    # cộng điểm cosine cho sản phẩm hợp loại da
+TEXT_MIN_SCORE = 0.05    # bỏ các kết quả chỉ trùng vài từ phổ biến
+
+
+def recommend_by_text(text, skin_type=None, limit=10, min_score=TEXT_MIN_SCORE):
+    """Gợi ý còn hàng từ mô tả tự do (vd: "da sần, lỗ chân lông to") qua chỉ mục TF-IDF."""
+    if not text or not text.strip():
+        return []
+    idx = get_index()
+    skin = idx.skin_mask(skin_type.lower(), both_ways=True, universal=True) if skin_type else 0
+    scored = []
+    for pid, score in search_index.search(text, k=max(limit * 5, 50), min_score=min_score):
+        pos = idx.positions.get(pid)
+        if pos is None or not (idx.in_stock >> pos) & 1:
             continue
+        if (skin >> pos) & 1:
+            score += TEXT_SKIN_BONUS
+        scored.append((score, -pos))
+    return [idx.products[-neg] for _, neg in heapq.nlargest(limit, scored)]
 
-        best, best_score = None, -1
-        for p in candidates:
-            score = 0
-            if any(skin_type in s.lower() for s in p.get("skin-type", [])):
-                score += 2
-            effects = [e.lower() for e in p.get("effects", [])]
-            score += sum(1 for c in concerns if any(c in ef for ef in effects))
-            if score > best_score:
-                best_score, best = score, p
 
-        if best:
-            routine.append({"step": step_name, "product": best})
+def recommend_by_profile(skin_type, concerns, limit=10):
+    """
+    Gợi ý theo loại da và danh sách vấn đề da dạng chữ (tab 'Gợi ý theo da').
+    Vấn đề da không nằm trong bảng CONCERN_TO_EFFECT được tìm bằng văn bản tự do.
+    """
+    from modules.chatbot import extract_effects, CONCERN_TO_EFFECT
+    concerns = concerns or []
+    effects = extract_effects(concerns) if concerns else []
+    unknown = [c for c in concerns if c not in CONCERN_TO_EFFECT]
+    if not unknown:
+        return recommendation(skin_type=skin_type.lower(), effects=effects, limit=limit)
 
-    return routine
+    found = recommend_by_text(", ".join(unknown), skin_type, limit)
+    if effects:
+        found = recommendation(skin_type=skin_type.lower(), effects=effects, limit=limit) + found
+    elif not found:
+        return recommendation(skin_type=skin_type.lower(), limit=limit)
+    seen, result = set(), []
+    for p in found:
+        if p["product_id"] not in seen:
+            seen.add(p["product_id"])
+            result.append(p)
+    return result[:limit]
+
+
+def _score_for_customer(customer, limit=10):
+    idx = get_index()
+    skin_type = customer.get("skin-type", "").lower().strip()
+    concerns = [c.lower() for c in customer.get("skin_concern", [])]
+
+    weighted = [(2, idx.skin_mask(skin_type))] + _concern_masks(idx, concerns)
+    candidates = idx.in_stock & _union(weighted)
+    if not candidates:
+        return idx.first(idx.in_stock, limit)
+    return idx.top_k(candidates, weighted, limit)
+
+
+# ── Cache gợi ý theo khách hàng ───────────────────────────────────────────────
+_customer_cache = LRUCache(CUSTOMER_CACHE_SIZE)
+
+
+def _profile_key(skin_type, concerns):
+    return ((skin_type or "").lower().strip(),
+            tuple(c.lower().strip() for c in (concerns or [])))
+
+
+def cached_customer_recommend(customer_id, kind, skin_type, concerns, compute):
+    """
+    Trả về gợi ý đã cache cho (khách hàng, kind). Cache bị bỏ khi hồ sơ da thay đổi,
+    catalog thay đổi, hoặc một sản phẩm đã gợi ý hết hàng; khi đó compute() được gọi lại.
+    """
+    with _lock:
+        idx = get_index()
+        key = (customer_id, kind)
+        profile = _profile_key(skin_type, concerns)
+        entry = _customer_cache.get(key)
+        if (entry and entry["profile"] == profile and entry["catalog"] == idx.signature
+                and all(idx.is_in_stock(pid) for pid in entry["product_ids"])):
+            return [idx.products[idx.positions[pid]] for pid in entry["product_ids"]]
+
+        products = compute()
+        _customer_cache.put(key, {
+            "profile": profile,
+            "catalog": idx.signature,
+            "product_ids": [p.get("product_id") for p in products],
+        })
+        return products
+
+
+def invalidate_customer(customer_id):
+    """Xóa gợi ý đã cache của khách hàng (gọi khi hồ sơ thay đổi)."""
+    for key in _customer_cache.keys():
+        if key[0] == customer_id:
+            _customer_cache.pop(key)
+
+
+def customer_cache_stats():
+    return _customer_cache.stats()
+
+
+def recommend_for_profile_cached(customer_id, skin_type, concerns, limit=10):
+    """recommend_by_profile có cache theo khách hàng."""
+    return cached_customer_recommend(
+        customer_id, ("profile", limit), skin_type, concerns,
+        lambda: recommend_by_profile(skin_type, concerns, limit))
 
 
 def recommend_for_customer(customer_id):
@@ -145,24 +468,113 @@ def recommend_for_customer(customer_id):
     customer = next((c for c in customers if c.get("customer_id") == customer_id), None)
     if not customer:
         return []
+    return cached_customer_recommend(
+        customer_id, "customer", customer.get("skin-type", ""),
+        customer.get("skin_concern", []), lambda: _score_for_customer(customer))
 
-    products = load_products()
-    skin_type = customer.get("skin-type", "").lower().strip()
-    concerns = [c.lower() for c in customer.get("skin_concern", [])]
 
-    scored = []
-    for p in products:
-        if p.get("stock_quantity", 0) <= 0:
+def warm_up(customer_ids=None, days=WARM_UP_DAYS):
+    """
+    Tính sẵn gợi ý cho khách hàng đang hoạt động (có đơn trong `days` ngày gần nhất,
+    hoặc danh sách customer_ids chỉ định). Trả về số khách đã tính.
+    """
+    from modules.orders import parse_order_datetime
+    customers = {c.get("customer_id"): c for c in load_customers()}
+    if customer_ids is None:
+        since = datetime.now() - timedelta(days=days)
+        active = {}     # dict giữ thứ tự lần đầu xuất hiện, tra trùng O(1)
+        for o in load_orders():
+            cid = o.get("customer_id")
+            if cid in customers and cid not in active:
+                dt = parse_order_datetime(o)
+                if dt and dt >= since:
+                    active[cid] = None
+        customer_ids = list(active)
+
+    count = 0
+    for cid in customer_ids:
+        c = customers.get(cid)
+        if not c:
             continue
-        score = 0
-        if any(skin_type in s.lower() for s in p.get("skin-type", [])):
-            score += 2
-        effects = [e.lower() for e in p.get("effects", [])]
-        score += sum(1 for c in concerns if any(c in ef for ef in effects))
-        if score > 0:
-            scored.append((p, score))
-
-    if not scored:
-        return [p for p in products if p.get("stock_quantity", 0) > 0][:10]
-    scored.sort(key=lambda x: x[1], reverse=True)
-    return [p for p, _ in scored[:10]]
+        recommend_for_customer(cid)
+        recommend_for_profile_cached(cid, c.get("skin-type", ""), c.get("skin_concern", []))
+        count += 1
+    return count
+
+
+def start_warm_up(customer_ids=None, days=WARM_UP_DAYS):
+    """Chạy warm_up ở luồng nền."""
+    t = threading.Thread(target=warm_up, args=(customer_ids, days), daemon=True)
+    t.start()
+    return t
+
+
+# ── Benchmark ─────────────────────────────────────────────────────────────────
+def _legacy_routine(products, skin_type, concerns):
+    """Cách cũ: quét toàn bộ catalog cho từng bước (dùng để so sánh)."""
+    routine = []
+    for step_name, keywords in ROUTINE_KEYWORDS.items():
+        best, best_score = None, -1
+        for p in products:
+            if (not any(k in p.get("name", "").lower() for k in keywords)
+                    or p.get("stock_quantity", 0) <= 0):
+                continue
+            score = 2 if any(skin_type in s.lower() for s in p.get("skin-type", [])) else 0
+            effects = [e.lower() for e in p.get("effects", [])]
+            score += sum(1 for c in concerns if any(c in ef for ef in effects))
+            if score > best_score:
+                best_score, best = score, p
+        if best:
+            routine.append({"step": step_name, "product": best})
+    return routine
+
+
+def benchmark_routine(n=100_000, rounds=5):
+    """So sánh routine cũ (6 lần quét) với engine mới trên catalog giả lập n sản phẩm."""
+    import random
+    import time
+    global _INDEX, _INDEX_VERSION
+
+    base = load_products()
+    if not base:
+        return {}
+    rng = random.Random(0)
+    brands = sorted({p.get("brand", "") for p in base})
+    catalog = []
+    for k in range(n):
+        p = dict(base[k % len(base)])
+        p["product_id"] = f"B{k:07d}"
+        p["brand"] = rng.choice(brands)
+        p["price"] = rng.randrange(50_000, 1_000_000, 1000)
+        catalog.append(p)
+
+    saved = (_INDEX, _INDEX_VERSION)
+    t = time.perf_counter()
+    _INDEX = FeatureIndex(catalog)
+    _INDEX_VERSION = data_version("products.json")
+    _INDEX.step_masks()
+    build = time.perf_counter() - t
+
+    profile = ("da dầu", ["giảm mụn", "kiểm soát dầu"])
+    cases = {
+        "legacy": lambda: _legacy_routine(catalog, *profile),
+        "engine": lambda: recommend_skincare_routine(*profile),
+        "engine+budget": lambda: recommend_skincare_routine(*profile, budget=1_500_000,
+                                                            brands=brands[:2],
+                                                            exclude_ingredients=["BHA"]),
+    }
+    result = {"products": n, "build_s": build}
+    try:
+        for name, fn in cases.items():
+            t = time.perf_counter()
+            for _ in range(rounds):
+                fn()
+            result[f"{name}_ms"] = (time.perf_counter() - t) / rounds * 1000
+    finally:
+        _INDEX, _INDEX_VERSION = saved
+    return result
+
+
+if __name__ == "__main__":
+    for key, value in benchmark_routine().items():
+        print(f"{key:>18}: {value:,.2f}" if isinstance(value, float) else f"{key:>18}: {value}")
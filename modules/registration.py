@@ -0,0 +1,180 @@
+"""
+registration.py - Đăng ký tài khoản khách hàng qua chỉ mục duy nhất (username, SĐT)
+Kiểm tra trùng là tra set, mã KH/mã tài khoản lấy từ bộ đếm; danh sách tài khoản
+và khách hàng được giữ trong bộ nhớ (chỉ đọc lại khi file bị sửa từ nơi khác),
+accounts.json và customers.json được ghi cùng một giao dịch. Hỗ trợ đăng ký hàng loạt.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.data_handler import (load_accounts, load_customers, save_json_many,
+                                  data_version, next_id)
+from modules import auth
+
+MIN_PASSWORD_LEN = 4
+HASH_WORKERS = 4   # số luồng băm mật khẩu khi đăng ký hàng loạt (PBKDF2 nhả GIL)
+
+
+def validate(name, phone, username, password, require_login=True):
+    """Kiểm tra dữ liệu đăng ký, trả về thông báo lỗi hoặc None."""
+    if not all([name, phone] + ([username, password] if require_login else [])):
+        return "⚠ Vui lòng điền đầy đủ thông tin!"
+    if require_login and len(password) < MIN_PASSWORD_LEN:
+        return f"⚠ Mật khẩu phải có ít nhất {MIN_PASSWORD_LEN} ký tự!"
+    if not phone.isdigit() or len(phone) < 9:
+        return "⚠ Số điện thoại không hợp lệ!"
+    return None
+
+
+class RegistrationIndex:
+    """Set username, set SĐT và bộ đếm mã KH / mã tài khoản."""
+
+    def __init__(self, accounts, customers):
+        self.usernames = {a.get("username") for a in accounts if a.get("username")}
+        self.phones = {c.get("phone") for c in customers if c.get("phone")}
+        self.next_customer = int(next_id(customers, "customer_id", "C", 3)[1:])
+        self.next_account = int(next_id(accounts, "account_id", "ACC", 3)[3:])
+
+    def new_customer_id(self):
+        cid = f"C{self.next_customer:03d}"
+        self.next_customer += 1
+        return cid
+
+    def new_account_id(self):
+        aid = f"ACC{self.next_account:03d}"
+        self.next_account += 1
+        return aid
+
+
+_INDEX = None
+_INDEX_VERSION = None
+_ACCOUNTS = None     # danh sách đang giữ trong bộ nhớ, cùng phiên bản với _INDEX
+_CUSTOMERS = None
+_LOCK = threading.Lock()
+
+
+def _versions():
+    return data_version("accounts.json"), data_version("customers.json")
+
+
+def _load():
+    """(accounts, customers, chỉ mục) — chỉ đọc file và dựng lại khi một trong hai file đổi."""
+    global _INDEX, _INDEX_VERSION, _ACCOUNTS, _CUSTOMERS
+    version = _versions()
+    if _INDEX is None or version != _INDEX_VERSION:
+        _ACCOUNTS, _CUSTOMERS = load_accounts(), load_customers()
+        _INDEX = RegistrationIndex(_ACCOUNTS, _CUSTOMERS)
+        _INDEX_VERSION = version
+    return _ACCOUNTS, _CUSTOMERS, _INDEX
+
+
+def _check_unique(index, phone, username):
+    if username and username in index.usernames:
+        return "❌ Tên đăng nhập đã tồn tại!"
+    if phone in index.phones:
+        return "❌ Số điện thoại đã được đăng ký!"
+    return None
+
+
+def _records(index, name, phone, username, password_hash, email=""):
+    """Tạo bản ghi khách hàng (+ tài khoản nếu có username) và cập nhật chỉ mục."""
+    customer_id = index.new_customer_id()
+    customer = {
+        "customer_id": customer_id,
+        "name": name,
+        "phone": phone,
+        "email": email,
+        "skin-type": "",
+        "skin_concern": [],
+        "rank": "Đồng",
+        "loyalty_points": 0,
+    }
+    index.phones.add(phone)
+    if not username:
+        return customer, None
+    account = {
+        "account_id": index.new_account_id(),
+        "username": username,
+        "password": password_hash,
+        "role": "customer",
+        "customer_id": customer_id,
+        "full_name": name,
+    }
+    index.usernames.add(username)
+    return customer, account
+
+
+def _commit(accounts, customers):
+    """Ghi hai file; danh sách trong bộ nhớ (đã thêm bản ghi mới) trở thành bản hiện hành."""
+    global _INDEX_VERSION
+    save_json_many({"customers.json": customers, "accounts.json": accounts})
+    _INDEX_VERSION = _versions()
+
+
+def register(name, phone, username, password, email=""):
+    """Đăng ký một khách hàng + tài khoản. Trả về (customer_id, None) hoặc (None, lỗi)."""
+    name, phone, username = name.strip(), phone.strip(), username.strip()
+    err = validate(name, phone, username, password)
+    if err:
+        return None, err
+    password_hash = auth.hash_password(password)
+    with _LOCK:
+        accounts, customers, index = _load()
+        err = _check_unique(index, phone, username)
+        if err:
+            return None, err
+        customer, account = _records(index, name, phone, username, password_hash, email)
+        customers.append(customer)
+        accounts.append(account)
+        try:
+            _commit(accounts, customers)
+        except OSError as e:
+            _reset_index()
+            return None, f"❌ Không lưu được dữ liệu: {e}"
+    return customer["customer_id"], None
+
+
+def register_many(rows, workers=HASH_WORKERS):
+    """
+    Đăng ký hàng loạt (vd: nhập danh sách hội viên) trong một lần ghi.
+    rows: dict có name, phone, username, password (tùy chọn email).
+    Dòng không có username/password chỉ tạo khách hàng (chưa có tài khoản đăng nhập).
+    Trả về (danh sách customer_id đã tạo, [(số thứ tự dòng, lỗi)]).
+    """
+    rows = [{k: str(v).strip() if v is not None else "" for k, v in r.items()} for r in rows]
+    with_login = [r.get("password") for r in rows if r.get("username") and r.get("password")]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        hashes = iter(list(pool.map(auth.hash_password, with_login)))
+
+    created, errors = [], []
+    with _LOCK:
+        accounts, customers, index = _load()
+        for n, r in enumerate(rows, 1):
+            name, phone = r.get("name", ""), r.get("phone", "")
+            username, password = r.get("username", ""), r.get("password", "")
+            has_login = bool(username or password)   # chỉ điền một trong hai -> báo lỗi thiếu
+            password_hash = next(hashes) if username and password else None
+            err = (validate(name, phone, username, password, require_login=has_login)
+                   or _check_unique(index, phone, username))
+            if err:
+                errors.append((n, err))
+                continue
+            customer, account = _records(index, name, phone, username, password_hash,
+                                         r.get("email", ""))
+            customers.append(customer)
+            if account:
+                accounts.append(account)
+            created.append(customer["customer_id"])
+        if created:
+            try:
+                _commit(accounts, customers)
+            except OSError as e:
+                _reset_index()
+                return [], [(0, f"❌ Không lưu được dữ liệu: {e}")]
+    return created, errors
+
+
+def _reset_index():
+    """Ghi lỗi: bỏ danh sách + chỉ mục đã sửa dở, lần sau đọc lại từ file."""
+    global _INDEX, _INDEX_VERSION, _ACCOUNTS, _CUSTOMERS
+    _INDEX, _INDEX_VERSION, _ACCOUNTS, _CUSTOMERS = None, None, None, None
@@ -0,0 +1,283 @@
+"""
+sales_facts.py - Kho dữ kiện bán hàng chỉ ghi nối (data/sales_facts.jsonl)
+Mỗi dòng hàng của đơn là một dữ kiện cùng dạng với sales.json (sale_date, shift,
+quantity, revenue) kèm order_id và net_revenue (doanh thu sau giảm giá, phân bổ theo
+tỷ lệ total / tiền hàng của đơn); hủy đơn ghi thêm dữ kiện âm thay vì sửa dòng cũ.
+Tổng hợp theo sản phẩm / ca / tháng / đơn được giữ trong bộ nhớ và chỉ đọc thêm phần mới ghi.
+Lần đầu dùng, kho được dựng từ orders.json (đọc tuần tự từng đơn).
+"""
+import json
+import threading
+from collections import Counter
+
+from modules.data_handler import DATA_DIR, load_json, parse_datetime
+from modules.bought_together import iter_orders_file
+
+FACT_FILE = DATA_DIR / "sales_facts.jsonl"
+ORDERS_FILE = DATA_DIR / "orders.json"
+CANCELLED = "Đã hủy"
+SHIFT_NAMES = {"SH1": "morning", "SH2": "afternoon", "SH3": "evening"}
+
+_lock = threading.RLock()
+_state = None   # {"offset", "seq", "qty", "revenue", "by_shift", "by_month", "orders": Counter}
+
+
+# ── Dựng dữ kiện từ đơn hàng ──────────────────────────────────────────────────
+def _shift_ranges():
+    """[(giờ bắt đầu, giờ kết thúc, tên ca)] từ shifts.json ("08:00-12:00")."""
+    ranges = []
+    for s in load_json("shifts.json"):
+        try:
+            start, end = s.get("time", "").split("-")
+            ranges.append((start.strip(), end.strip(), SHIFT_NAMES.get(s.get("shift_id"), "")))
+        except ValueError:
+            continue
+    return ranges
+
+
+def _shift_of(order, dt, ranges):
+    if order.get("shift_id") in SHIFT_NAMES:
+        return SHIFT_NAMES[order["shift_id"]]
+    if dt is None:
+        return ""
+    hm = dt.strftime("%H:%M")
+    return next((name for start, end, name in ranges if start <= hm < end), "")
+
+
+def _net_ratio(order):
+    """Tỷ lệ total / tiền hàng: phân bổ giảm giá của đơn cho từng dòng."""
+    gross = sum(it.get("price", 0) * it.get("quantity", 0) for it in order.get("items", []))
+    if not gross or "total" not in order:
+        return 1.0
+    return order["total"] / gross
+
+
+def order_facts(order, sign=1, ranges=None):
+    """Dữ kiện (chưa có sale_id) cho từng dòng hàng; sign=-1 cho dữ kiện hủy đơn."""
+    dt = parse_datetime(order.get("datetime", ""))
+    sale_date = dt.strftime("%Y-%m-%d") if dt else ""
+    shift = _shift_of(order, dt, _shift_ranges() if ranges is None else ranges)
+    ratio = _net_ratio(order)
+    facts = []
+    for it in order.get("items", []):
+        revenue = sign * it.get("price", 0) * it.get("quantity", 0)
+        facts.append({
+            "order_id": order.get("order_id", ""),
+            "product_id": it.get("product_id", ""),
+            "sale_date": sale_date,
+            "shift": shift,
+            "quantity": sign * it.get("quantity", 0),
+            "revenue": revenue,
+            "net_revenue": revenue * ratio,
+        })
+    return facts
+
+
+def _orders():
+    try:
+        yield from iter_orders_file(ORDERS_FILE)
+    except FileNotFoundError:
+        return
+
+
+def _seed():
+    """Dựng kho từ orders.json: đơn đã hủy có cả dữ kiện bán lẫn dữ kiện hủy."""
+    ranges = _shift_ranges()
+    seq = 0
+    with open(FACT_FILE, "w", encoding="utf-8") as f:
+        for o in _orders():
+            facts = order_facts(o, 1, ranges)
+            if o.get("status") == CANCELLED:
+                facts += order_facts(o, -1, ranges)
+            for fact in facts:
+                seq += 1
+                f.write(json.dumps({"sale_id": f"S{seq:05d}", **fact}, ensure_ascii=False) + "\n")
+
+
+# ── Trạng thái tổng hợp ───────────────────────────────────────────────────────
+def _read_from(offset):
+    """Sinh (offset sau dòng, dữ kiện) từ vị trí offset."""
+    if not FACT_FILE.exists():
+        return
+    with open(FACT_FILE, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            offset += len(line)
+            if line.strip():
+                yield offset, json.loads(line)
+
+
+def _apply(state, fact):
+    pid = fact["product_id"]
+    state["qty"][pid] += fact["quantity"]
+    state["revenue"][pid] += fact["revenue"]
+    state["by_shift"][fact.get("shift", "")] += fact["revenue"]
+    state["by_month"][fact["sale_date"][:7] or "unknown"] += fact["net_revenue"]
+    # số dòng còn hiệu lực của đơn: > 0 là đơn chưa hủy
+    state["orders"][fact["order_id"]] += (fact["quantity"] > 0) - (fact["quantity"] < 0)
+    state["seq"] += 1
+
+
+def _outdated():
+    """Kho ghi bởi phiên bản cũ (chưa có net_revenue) -> cần dựng lại từ orders.json."""
+    for _, fact in _read_from(0):
+        return "net_revenue" not in fact
+    return False
+
+
+def _get_state():
+    """Tổng hợp hiện tại; khởi tạo kho nếu chưa có, đọc thêm phần được ghi nối từ nơi khác."""
+    global _state
+    if not FACT_FILE.exists() or (_state is None and _outdated()):
+        _seed()
+        _state = None
+    if _state is None:
+        _state = {"offset": 0, "seq": 0, "qty": Counter(), "revenue": Counter(),
+                  "by_shift": Counter(), "by_month": Counter(), "orders": Counter()}
+    size = FACT_FILE.stat().st_size
+    if size < _state["offset"]:        # file bị thay thế -> đọc lại từ đầu
+        _state = None
+        return _get_state()
+    if size != _state["offset"]:
+        for offset, fact in _read_from(_state["offset"]):
+            _apply(_state, fact)
+            _state["offset"] = offset
+    return _state
+
+
+def append_facts(facts):
+    """Ghi nối các dữ kiện (tự cấp sale_id) và cập nhật tổng hợp."""
+    if not facts:
+        return
+    with _lock:
+        state = _get_state()
+        lines = []
+        for fact in facts:
+            fact = {"sale_id": f"S{state['seq'] + 1:05d}", **fact}
+            _apply(state, fact)
+            lines.append(json.dumps(fact, ensure_ascii=False) + "\n")
+        data = "".join(lines).encode("utf-8")
+        with open(FACT_FILE, "ab") as f:
+            f.write(data)
+        state["offset"] += len(data)
+
+
+def _emit(order, sign):
+    with _lock:
+        existed = FACT_FILE.exists()
+        _get_state()
+        if not existed:
+            return   # kho vừa dựng từ orders.json (đã lưu) nên đã có đơn này
+        append_facts(order_facts(order, sign))
+
+
+def on_order_created(order):
+    """Ghi dữ kiện cho đơn mới (gọi sau khi đã lưu orders.json)."""
+    _emit(order, 1)
+
+
+def on_order_cancelled(order):
+    """Ghi dữ kiện âm cho đơn vừa hủy (gọi sau khi đã lưu orders.json)."""
+    _emit(order, -1)
+
+
+# ── Truy vấn ──────────────────────────────────────────────────────────────────
+def product_totals():
+    """{product_id: (số lượng, doanh thu)} đã trừ đơn hủy."""
+    with _lock:
+        state = _get_state()
+        return {pid: (q, state["revenue"][pid]) for pid, q in state["qty"].items() if q}
+
+
+def top_products(top_n=10):
+    """[(product_id, số lượng, doanh thu)] bán chạy nhất."""
+    with _lock:
+        state = _get_state()
+        top = Counter({pid: q for pid, q in state["qty"].items() if q > 0}).most_common(top_n)
+        return [(pid, q, state["revenue"][pid]) for pid, q in top]
+
+
+def revenue_by_shift():
+    """{ca: doanh thu} (morning / afternoon / evening; "" nếu ngoài giờ ca)."""
+    with _lock:
+        return {k: v for k, v in _get_state()["by_shift"].items() if v}
+
+
+def revenue_by_month():
+    """{YYYY-MM: doanh thu sau giảm giá} ("unknown" nếu đơn không có ngày hợp lệ)."""
+    with _lock:
+        return dict(sorted((k, v) for k, v in _get_state()["by_month"].items() if v))
+
+
+def totals():
+    """(số đơn chưa hủy, tổng doanh thu sau giảm giá)."""
+    with _lock:
+        state = _get_state()
+        return (sum(1 for n in state["orders"].values() if n > 0),
+                sum(state["by_month"].values()))
+
+
+def iter_facts(product_id=None, date_from=None, date_to=None):
+    """Duyệt tuần tự các dữ kiện (lọc theo sản phẩm / khoảng ngày kiểu date)."""
+    lo = date_from.isoformat() if date_from else ""
+    hi = date_to.isoformat() if date_to else "9999"
+    with _lock:
+        _get_state()
+    for _, fact in _read_from(0):
+        if product_id and fact["product_id"] != product_id:
+            continue
+        if (date_from or date_to) and not (lo <= fact["sale_date"] <= hi):
+            continue
+        yield fact
+
+
+# ── Đối soát ──────────────────────────────────────────────────────────────────
+def reconcile():
+    """
+    Đối soát kho dữ kiện với orders.json trong một lượt đọc tuần tự mỗi file.
+    Trả về danh sách (order_id, product_id, (SL, doanh thu) theo dữ kiện,
+    (SL, doanh thu) theo đơn) cho các cặp lệch nhau — kể cả dữ kiện thiếu hoặc thừa.
+    """
+    with _lock:
+        _get_state()
+        facts = {}
+        for _, fact in _read_from(0):
+            key = (fact["order_id"], fact["product_id"])
+            q, r = facts.get(key, (0, 0))
+            facts[key] = (q + fact["quantity"], r + fact["revenue"])
+    diffs = []
+    for o in _orders():
+        expected = {}
+        if o.get("status") != CANCELLED:
+            for it in o.get("items", []):
+                key = (o.get("order_id", ""), it.get("product_id", ""))
+                q, r = expected.get(key, (0, 0))
+                expected[key] = (q + it.get("quantity", 0),
+                                 r + it.get("price", 0) * it.get("quantity", 0))
+        for it in o.get("items", []):
+            expected.setdefault((o.get("order_id", ""), it.get("product_id", "")), (0, 0))
+        for key, want in expected.items():
+            got = facts.pop(key, (0, 0))
+            if got != want:
+                diffs.append((key[0], key[1], got, want))
+    diffs += [(oid, pid, got, (0, 0)) for (oid, pid), got in facts.items() if got != (0, 0)]
+    return diffs
+
+
+def repair(diffs=None):
+    """Ghi dữ kiện bù cho các cặp lệch (không sửa dòng cũ). Trả về số dữ kiện đã ghi."""
+    diffs = reconcile() if diffs is None else diffs
+    if not diffs:
+        return 0
+    orders = {o.get("order_id"): o for o in _orders()
+              if o.get("order_id") in {d[0] for d in diffs}}
+    ranges = _shift_ranges()
+    facts = []
+    for oid, pid, (got_q, got_r), (want_q, want_r) in diffs:
+        order = orders.get(oid, {"order_id": oid})
+        base = order_facts({**order, "items": [{"product_id": pid}]}, 1, ranges)[0]
+        base.update(quantity=want_q - got_q, revenue=want_r - got_r,
+                    net_revenue=(want_r - got_r) * _net_ratio(order))
+        facts.append(base)
+    append_facts(facts)
+    return len(facts)
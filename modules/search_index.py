@@ -0,0 +1,145 @@
+"""
+search_index.py - Chỉ mục TF-IDF cục bộ cho tìm kiếm sản phẩm bằng văn bản tự do
+Vector hóa tên, danh mục, công dụng, thành phần và loại da của sản phẩm; truy vấn
+bằng độ tương đồng cosine qua inverted index. Chỉ mục được lưu ra
+data/search_index.json và chỉ dựng lại khi nội dung catalog thay đổi.
+"""
+import re
+import math
+import heapq
+import hashlib
+import unicodedata
+from collections import Counter
+
+from modules.data_handler import load_json, save_json, load_products, data_version
+
+INDEX_FILE = "search_index.json"
+INDEX_FORMAT = 1
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def fold(text):
+    """Chữ thường, bỏ dấu tiếng Việt (để "mun" khớp "mụn")."""
+    text = str(text).lower().replace("đ", "d")
+    text = unicodedata.normalize("NFD", text)
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def tokenize(text):
+    """Từ đơn + cặp từ liền kề (đã bỏ dấu)."""
+    words = _WORD_RE.findall(fold(text))
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def product_text(p):
+    parts = [p.get("name", ""), p.get("category", "")]
+    parts += p.get("effects", []) + p.get("ingredients", []) + p.get("skin-type", [])
+    return " | ".join(str(x) for x in parts)
+
+
+def _doc_terms(p):
+    terms = Counter()
+    # Tách theo từng trường để không ghép cặp từ của hai trường khác nhau
+    for field in product_text(p).split(" | "):
+        terms.update(tokenize(field))
+    return terms
+
+
+def _signature(products):
+    h = hashlib.sha1()
+    for p in products:
+        h.update(f"{p.get('product_id')}\x1f{product_text(p)}\x1e".encode("utf-8"))
+    return h.hexdigest()
+
+
+class TfidfIndex:
+    """TF-IDF (tf logarit, vector chuẩn hóa L2) với inverted index term -> [(doc, trọng số)]."""
+
+    def __init__(self, doc_ids, idf, postings, signature=""):
+        self.doc_ids = doc_ids
+        self.idf = idf
+        self.postings = postings
+        self.signature = signature
+
+    @classmethod
+    def build(cls, products):
+        docs = [_doc_terms(p) for p in products]
+        n = len(docs)
+        df = Counter()
+        for terms in docs:
+            df.update(terms.keys())
+        idf = {t: math.log((n + 1) / (d + 1)) + 1 for t, d in df.items()}
+
+        postings = {}
+        for i, terms in enumerate(docs):
+            vec = {t: (1 + math.log(c)) * idf[t] for t, c in terms.items()}
+            norm = math.sqrt(sum(w * w for w in vec.values())) or 1.0
+            for t, w in vec.items():
+                postings.setdefault(t, []).append((i, w / norm))
+        doc_ids = [p.get("product_id") for p in products]
+        return cls(doc_ids, idf, postings, _signature(products))
+
+    def to_dict(self):
+        return {
+            "format": INDEX_FORMAT,
+            "signature": self.signature,
+            "doc_ids": self.doc_ids,
+            "idf": self.idf,
+            "postings": {t: [[i, round(w, 6)] for i, w in plist]
+                         for t, plist in self.postings.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        postings = {t: [(i, w) for i, w in plist] for t, plist in data["postings"].items()}
+        return cls(data["doc_ids"], data["idf"], postings, data.get("signature", ""))
+
+    def query_vector(self, text):
+        counts = Counter(t for t in tokenize(text) if t in self.idf)
+        vec = {t: (1 + math.log(c)) * self.idf[t] for t, c in counts.items()}
+        norm = math.sqrt(sum(w * w for w in vec.values())) or 1.0
+        return {t: w / norm for t, w in vec.items()}
+
+    def search(self, text, k=10, min_score=0.0):
+        """Top-k (product_id, điểm cosine) giống truy vấn nhất."""
+        scores = {}
+        for t, qw in self.query_vector(text).items():
+            for i, w in self.postings.get(t, ()):
+                scores[i] = scores.get(i, 0.0) + qw * w
+        top = heapq.nlargest(k, ((s, -i) for i, s in scores.items() if s > min_score))
+        return [(self.doc_ids[-neg_i], s) for s, neg_i in top]
+
+
+_INDEX = None
+_INDEX_VERSION = None
+
+
+def get_index():
+    """
+    Chỉ mục hiện tại. Khi products.json đổi: nếu nội dung tìm kiếm không đổi (chỉ đổi
+    tồn kho/giá) thì giữ nguyên; nạp bản đã lưu nếu còn khớp, ngược lại dựng lại và lưu.
+    """
+    global _INDEX, _INDEX_VERSION
+    version = data_version("products.json")
+    if _INDEX is not None and version == _INDEX_VERSION:
+        return _INDEX
+    products = load_products()
+    signature = _signature(products)
+    if _INDEX is None or _INDEX.signature != signature:
+        saved = load_json(INDEX_FILE)
+        if (isinstance(saved, dict) and saved.get("format") == INDEX_FORMAT
+                and saved.get("signature") == signature):
+            _INDEX = TfidfIndex.from_dict(saved)
+        else:
+            _INDEX = TfidfIndex.build(products)
+            try:
+                save_json(INDEX_FILE, _INDEX.to_dict())
+            except OSError:
+                pass  # không ghi được thì vẫn dùng chỉ mục trong bộ nhớ
+    _INDEX_VERSION = version
+    return _INDEX
+
+
+def search(text, k=10, min_score=0.0):
+    return get_index().search(text, k, min_score)
@@ -0,0 +1,271 @@
+"""
+stock_ledger.py - Sổ cái xuất nhập kho (data/stock_ledger.jsonl)
+Mỗi lần nhập hàng, bán, hủy đơn hoặc điều chỉnh tồn kho được ghi nối tiếp thành một
+dòng biến động. Tồn kho = checkpoint gần nhất + các biến động sau đó; checkpoint định
+kỳ (data/stock_checkpoints.jsonl) giúp tra tồn kho tại một thời điểm bất kỳ nhanh.
+Lần đầu dùng, sổ cái được khởi tạo bằng tồn kho hiện có trong products.json (opening).
+"""
+import json
+import bisect
+import threading
+from datetime import date, datetime
+
+from modules.data_handler import (DATA_DIR, load_products, load_json, save_json_many,
+                                  next_id)
+from modules import margin, expiry, stock_watch
+
+LEDGER_FILE = DATA_DIR / "stock_ledger.jsonl"
+CHECKPOINT_FILE = DATA_DIR / "stock_checkpoints.jsonl"
+CHECKPOINT_EVERY = 500       # số biến động giữa hai checkpoint
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+KIND_OPENING = "opening"     # tồn đầu kỳ khi khởi tạo sổ cái
+KIND_RECEIPT = "receipt"     # nhập hàng (imports.json)
+KIND_SALE = "sale"           # bán hàng
+KIND_CANCEL = "cancel"       # hủy đơn, hoàn kho
+KIND_ADJUST = "adjust"       # sửa tay / nhập file / xóa sản phẩm
+
+_lock = threading.RLock()
+_state = None   # {"stock", "seq", "offset", "checkpoints": [(ts, seq, offset_checkpoint_file)]}
+_dated = {"offset": 0, "items": []}   # biến động có thời điểm hiệu lực "at" khác lúc ghi
+
+
+def _ts(when=None):
+    if isinstance(when, str):
+        return when
+    return (when or datetime.now()).strftime(TS_FORMAT)
+
+
+# ── Đọc / khởi tạo ────────────────────────────────────────────────────────────
+def _read_from(offset):
+    """Sinh (offset sau dòng, biến động) từ vị trí offset của sổ cái."""
+    if not LEDGER_FILE.exists():
+        return
+    with open(LEDGER_FILE, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            offset += len(line)
+            if line.strip():
+                yield offset, json.loads(line)
+
+
+def _load_checkpoints():
+    checkpoints = []
+    if CHECKPOINT_FILE.exists():
+        with open(CHECKPOINT_FILE, "rb") as f:
+            pos = 0
+            for line in f:
+                if line.strip():
+                    cp = json.loads(line)
+                    checkpoints.append((cp["ts"], cp["seq"], pos))
+                pos += len(line)
+    return checkpoints
+
+
+def _read_checkpoint(pos):
+    with open(CHECKPOINT_FILE, "rb") as f:
+        f.seek(pos)
+        return json.loads(f.readline())
+
+
+def _seed(pending=()):
+    """Khởi tạo sổ cái bằng tồn kho hiện tại (trừ các biến động sắp ghi, đã có trong file)."""
+    pending_delta = {}
+    for pid, delta, *_ in pending:
+        pending_delta[pid] = pending_delta.get(pid, 0) + delta
+    opening = {p.get("product_id"): p.get("stock_quantity", 0) for p in load_products()}
+    for pid, delta in pending_delta.items():
+        opening[pid] = opening.get(pid, 0) - delta
+    ts = _ts()
+    lines = [json.dumps({"seq": seq, "ts": ts, "product_id": pid, "delta": qty,
+                         "kind": KIND_OPENING, "ref": ""}, ensure_ascii=False)
+             for seq, (pid, qty) in enumerate(opening.items(), 1)]
+    with open(LEDGER_FILE, "w", encoding="utf-8") as f:
+        f.write("".join(line + "\n" for line in lines))
+    CHECKPOINT_FILE.unlink(missing_ok=True)
+
+
+def _get_state(pending=()):
+    """Trạng thái trong bộ nhớ; đọc thêm phần sổ cái do tiến trình khác ghi nối."""
+    global _state
+    if _state is None:
+        if not LEDGER_FILE.exists():
+            _seed(pending)
+        checkpoints = _load_checkpoints()
+        stock, seq, offset = {}, 0, 0
+        if checkpoints:
+            cp = _read_checkpoint(checkpoints[-1][2])
+            stock, seq, offset = dict(cp["stock"]), cp["seq"], cp["offset"]
+        _state = {"stock": stock, "seq": seq, "offset": offset, "checkpoints": checkpoints,
+                  "since_checkpoint": 0}
+    size = LEDGER_FILE.stat().st_size if LEDGER_FILE.exists() else 0
+    if size != _state["offset"]:
+        for offset, mv in _read_from(_state["offset"]):
+            _apply(_state, mv)
+            _state["offset"] = offset
+    return _state
+
+
+def _apply(state, mv):
+    pid = mv["product_id"]
+    state["stock"][pid] = state["stock"].get(pid, 0) + mv["delta"]
+    state["seq"] = mv["seq"]
+    state["since_checkpoint"] += 1
+
+
+# ── Ghi biến động ─────────────────────────────────────────────────────────────
+def record_many(movements, when=None):
+    """
+    Ghi nhiều biến động một lần. movements: [(product_id, delta, kind, ref)].
+    Gọi SAU khi đã cập nhật stock_quantity trong products.json. Thời điểm ghi "ts" luôn
+    là hiện tại để sổ cái tăng dần theo thời gian; nếu có `when` (vd. ngày trên phiếu
+    nhập) thì lưu thêm thời điểm hiệu lực "at" để stock_at tính theo ngày đó.
+    """
+    movements = [m for m in movements if m[1]]
+    if not movements:
+        return
+    ts = _ts()
+    at = _ts(when) if when else None
+    with _lock:
+        state = _get_state(movements)
+        lines = []
+        for pid, delta, kind, ref in movements:
+            mv = {"seq": state["seq"] + 1, "ts": ts, "product_id": pid, "delta": delta,
+                  "kind": kind, "ref": ref or ""}
+            if at and at != ts:
+                mv["at"] = at
+            _apply(state, mv)
+            lines.append(json.dumps(mv, ensure_ascii=False) + "\n")
+        data = "".join(lines).encode("utf-8")
+        with open(LEDGER_FILE, "ab") as f:
+            f.write(data)
+        state["offset"] += len(data)
+        if state["since_checkpoint"] >= CHECKPOINT_EVERY:
+            checkpoint()
+
+
+def record(product_id, delta, kind, ref="", when=None):
+    record_many([(product_id, delta, kind, ref)], when)
+
+
+def checkpoint():
+    """Ghi ảnh chụp tồn kho hiện tại (kèm vị trí trong sổ cái)."""
+    with _lock:
+        state = _get_state()
+        cp = {"ts": _ts(), "seq": state["seq"], "offset": state["offset"],
+              "stock": state["stock"]}
+        pos = CHECKPOINT_FILE.stat().st_size if CHECKPOINT_FILE.exists() else 0
+        with open(CHECKPOINT_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(cp, ensure_ascii=False) + "\n")
+        state["checkpoints"].append((cp["ts"], cp["seq"], pos))
+        state["since_checkpoint"] = 0
+
+
+# ── Truy vấn ──────────────────────────────────────────────────────────────────
+def current_stock(product_id=None):
+    """Tồn kho tính từ sổ cái: dict {pid: số lượng} hoặc số lượng của một sản phẩm."""
+    with _lock:
+        stock = _get_state()["stock"]
+        return stock.get(product_id, 0) if product_id else dict(stock)
+
+
+def _dated_movements():
+    """Các biến động có "at" (đọc cả sổ cái một lần, sau đó chỉ đọc phần ghi thêm)."""
+    for offset, mv in _read_from(_dated["offset"]):
+        if "at" in mv:
+            _dated["items"].append(mv)
+        _dated["offset"] = offset
+    return _dated["items"]
+
+
+def stock_at(when, product_id=None):
+    """Tồn kho tại thời điểm `when` (datetime hoặc chuỗi 'YYYY-MM-DD HH:MM:SS')."""
+    ts = _ts(when)
+    with _lock:
+        checkpoints = _get_state()["checkpoints"]
+        k = bisect.bisect_right([c[0] for c in checkpoints], ts)
+        stock, offset = {}, 0
+        if k:
+            cp = _read_checkpoint(checkpoints[k - 1][2])
+            stock, offset = dict(cp["stock"]), cp["offset"]
+        for _, mv in _read_from(offset):
+            if mv["ts"] > ts:
+                break
+            stock[mv["product_id"]] = stock.get(mv["product_id"], 0) + mv["delta"]
+        # Sửa theo thời điểm hiệu lực: phần replay trên tính theo lúc ghi "ts"
+        for mv in _dated_movements():
+            pid = mv["product_id"]
+            if mv["ts"] <= ts < mv["at"]:
+                stock[pid] = stock.get(pid, 0) - mv["delta"]
+            elif mv["at"] <= ts < mv["ts"]:
+                stock[pid] = stock.get(pid, 0) + mv["delta"]
+    return stock.get(product_id, 0) if product_id else stock
+
+
+def movements(product_id=None, since=None, until=None):
+    """Các biến động (lọc theo sản phẩm / khoảng thời gian), theo thứ tự ghi."""
+    since, until = (_ts(since) if since else None), (_ts(until) if until else None)
+    for _, mv in _read_from(0):
+        if until and mv["ts"] > until:
+            break
+        if since and mv["ts"] < since:
+            continue
+        if product_id and mv["product_id"] != product_id:
+            continue
+        yield mv
+
+
+def reconcile():
+    """Sản phẩm có tồn kho trong products.json lệch với sổ cái: {pid: (sổ cái, products)}."""
+    ledger = current_stock()
+    diff = {}
+    for p in load_products():
+        pid = p.get("product_id")
+        if ledger.get(pid, 0) != p.get("stock_quantity", 0):
+            diff[pid] = (ledger.get(pid, 0), p.get("stock_quantity", 0))
+    return diff
+
+
+# ── Nhập hàng ─────────────────────────────────────────────────────────────────
+def load_imports():
+    return load_json("imports.json")
+
+
+def record_receipt(product_id, quantity, import_price, when=None, exp_date=None):
+    """
+    Ghi phiếu nhập hàng: thêm vào imports.json, cộng tồn kho và ghi sổ cái.
+    when: ngày trên phiếu nhập (mặc định là hiện tại).
+    exp_date: hạn sử dụng của lô (date hoặc 'YYYY-MM-DD'), tùy chọn.
+    Trả về (import_id, None) hoặc (None, lỗi).
+    """
+    if quantity <= 0:
+        return None, "Số lượng nhập phải lớn hơn 0"
+    if isinstance(exp_date, date):
+        exp_date = exp_date.isoformat()
+    if exp_date and expiry.to_ordinal(exp_date) is None:
+        return None, "Hạn sử dụng không hợp lệ (YYYY-MM-DD)"
+    with _lock:
+        _get_state()
+        products = load_products()
+        product = next((p for p in products if p.get("product_id") == product_id), None)
+        if not product:
+            return None, "Không tìm thấy sản phẩm"
+        imports = load_imports()
+        import_id = next_id(imports, "import_id", "I", 4)
+        receipt = {
+            "import_id": import_id,
+            "product_id": product_id,
+            "quantity": quantity,
+            "import_price": import_price,
+            "date": (when or datetime.now()).strftime("%d/%m/%Y %H:%M"),
+        }
+        if exp_date:
+            receipt["exp_date"] = exp_date
+        imports.append(receipt)
+        product["stock_quantity"] = product.get("stock_quantity", 0) + quantity
+        save_json_many({"imports.json": imports, "products.json": products})
+        record(product_id, quantity, KIND_RECEIPT, import_id, when=when)
+        margin.on_receipt(receipt)
+        expiry.on_receipt(receipt)
+        stock_watch.on_product_saved(product)
+    return import_id, None
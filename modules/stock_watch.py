@@ -0,0 +1,196 @@
+"""
+stock_watch.py - Theo dõi tồn kho thấp, cập nhật theo từng lần đổi tồn kho
+Giữ set sản phẩm dưới mức tối thiểu (min_quantity) và danh sách (tồn kho, mã SP)
+đã sắp xếp; "tồn kho <= N" chỉ là lấy đoạn đầu danh sách. Khi một sản phẩm đổi
+trạng thái (còn hàng / sắp hết / hết hàng), các hàm đã đăng ký qua subscribe()
+được gọi ngay — không cần quét lại hay hỏi định kỳ.
+"""
+import bisect
+import threading
+
+from modules.data_handler import load_products, data_version
+
+DEFAULT_MIN_QUANTITY = 5
+IN_STOCK, LOW, OUT = "Còn hàng", "Sắp hết", "Hết hàng"
+
+
+def status_of(qty, min_qty=DEFAULT_MIN_QUANTITY):
+    if qty == 0:
+        return OUT
+    elif qty <= min_qty:
+        return LOW
+    return IN_STOCK
+
+
+class StockWatcher:
+    """Tồn kho + mức tối thiểu theo sản phẩm, set sản phẩm cần nhập và chỉ mục theo tồn kho."""
+
+    def __init__(self):
+        self.products = {}     # pid -> bản ghi sản phẩm gần nhất
+        self.status = {}       # pid -> trạng thái hiện tại
+        self.low = set()       # pid có trạng thái sắp hết / hết hàng
+        self.by_stock = []     # [(tồn kho, pid)] đã sắp xếp
+        self.position = {}     # pid -> vị trí trong products.json (thứ tự danh mục)
+        self._next_position = 0
+
+    def update(self, product):
+        """Cập nhật một sản phẩm; trả về (trạng thái cũ, trạng thái mới) nếu đổi, ngược lại None."""
+        pid = product.get("product_id")
+        old = self.products.get(pid)
+        qty = product.get("stock_quantity", 0)
+        if old is not None:
+            old_qty = old.get("stock_quantity", 0)
+            if old_qty != qty:
+                self._unindex(old_qty, pid)
+                bisect.insort(self.by_stock, (qty, pid))
+        else:
+            bisect.insort(self.by_stock, (qty, pid))
+            if pid not in self.position:
+                self.position[pid] = self._next_position
+                self._next_position += 1
+        self.products[pid] = dict(product)
+        before = self.status.get(pid)
+        after = status_of(qty, product.get("min_quantity", DEFAULT_MIN_QUANTITY))
+        self.status[pid] = after
+        if after == IN_STOCK:
+            self.low.discard(pid)
+        else:
+            self.low.add(pid)
+        return (before, after) if before != after else None
+
+    def remove(self, pid):
+        old = self.products.pop(pid, None)
+        if old is not None:
+            self._unindex(old.get("stock_quantity", 0), pid)
+        self.position.pop(pid, None)
+        self.low.discard(pid)
+        return (self.status.pop(pid, None), None) if old is not None else None
+
+    def _unindex(self, qty, pid):
+        i = bisect.bisect_left(self.by_stock, (qty, pid))
+        if i < len(self.by_stock) and self.by_stock[i] == (qty, pid):
+            del self.by_stock[i]
+
+    def at_most(self, min_qty):
+        """Sản phẩm có tồn kho <= min_qty, giữ thứ tự danh mục như products.json."""
+        end = bisect.bisect_left(self.by_stock, (min_qty + 1,))
+        pids = sorted((pid for _, pid in self.by_stock[:end]), key=self.position.__getitem__)
+        return [self.products[pid] for pid in pids]
+
+    def low_products(self):
+        """Sản phẩm dưới mức tối thiểu của chính nó (tồn thấp nhất trước)."""
+        return sorted((self.products[pid] for pid in self.low),
+                      key=lambda p: (p.get("stock_quantity", 0), p.get("product_id")))
+
+
+_WATCHER = None
+_VERSION = None
+_LISTENERS = []
+_lock = threading.RLock()
+
+
+def subscribe(callback):
+    """
+    Đăng ký callback(product, trạng thái cũ, trạng thái mới), gọi khi sản phẩm đổi
+    trạng thái (trạng thái mới là None khi sản phẩm bị xóa).
+    """
+    get_watcher()
+    if callback not in _LISTENERS:
+        _LISTENERS.append(callback)
+
+
+def unsubscribe(callback):
+    if callback in _LISTENERS:
+        _LISTENERS.remove(callback)
+
+
+def _notify(product, change):
+    for callback in list(_LISTENERS):
+        callback(product, *change)
+
+
+def get_watcher():
+    """Bộ theo dõi hiện tại; đối chiếu lại khi products.json bị thay đổi từ nơi khác."""
+    global _WATCHER, _VERSION
+    with _lock:
+        version = data_version("products.json")
+        if _WATCHER is None:
+            _WATCHER = StockWatcher()
+            for p in load_products():
+                _WATCHER.update(p)
+        elif version != _VERSION:
+            _sync(load_products())
+        _VERSION = version
+        return _WATCHER
+
+
+def _sync(products):
+    _WATCHER.position = {p.get("product_id"): i for i, p in enumerate(products)}
+    _WATCHER._next_position = len(products)
+    seen = set()
+    for p in products:
+        seen.add(p.get("product_id"))
+        change = _WATCHER.update(p)
+        if change:
+            _notify(p, change)
+    for pid in [pid for pid in _WATCHER.products if pid not in seen]:
+        product = _WATCHER.products[pid]
+        _notify(product, _WATCHER.remove(pid))
+
+
+def on_product_saved(product):
+    """Cập nhật sau khi tồn kho / mức tối thiểu đổi (gọi sau khi đã lưu products.json)."""
+    global _VERSION
+    with _lock:
+        if _WATCHER is None:
+            return
+        change = _WATCHER.update(product)
+        _VERSION = data_version("products.json")
+    if change:
+        _notify(product, change)
+
+
+def on_product_deleted(product_id):
+    global _VERSION
+    with _lock:
+        if _WATCHER is None:
+            return
+        product = _WATCHER.products.get(product_id)
+        change = _WATCHER.remove(product_id)
+        _VERSION = data_version("products.json")
+    if change:
+        _notify(product, change)
+
+
+def at_most(min_qty):
+    with _lock:
+        return get_watcher().at_most(min_qty)
+
+
+def low_products():
+    with _lock:
+        return get_watcher().low_products()
+
+
+def low_count():
+    with _lock:
+        return len(get_watcher().low)
+
+
+def get_product(product_id):
+    """Bản ghi sản phẩm mới nhất trong bộ nhớ (None nếu không có) — không đọc lại products.json."""
+    with _lock:
+        return get_watcher().products.get(product_id)
+
+
+def in_stock_products():
+    """Sản phẩm còn hàng (theo thứ tự nạp) — tra trong bộ nhớ, không đọc lại products.json."""
+    with _lock:
+        return [p for p in get_watcher().products.values() if p.get("stock_quantity", 0) > 0]
+
+
+def stock_of(product_id):
+    """Tồn kho hiện tại của một sản phẩm (None nếu không có) — tra trong bộ nhớ."""
+    with _lock:
+        product = get_watcher().products.get(product_id)
+        return product.get("stock_quantity", 0) if product is not None else None
@@ -135,6 +135,14 @@ QStatusBar {
         self.btnDeleteProduct = QtWidgets.QPushButton("🗑️ Xóa sản phẩm")
         self.btnDeleteProduct.setStyleSheet("background-color: #f44336;")
         hl2.addWidget(self.btnDeleteProduct)
+        # ★ NÚT MỚI: Nhập sản phẩm hàng loạt từ CSV/Excel
+        self.btnImportProducts = QtWidgets.QPushButton("📥 Nhập từ file")
+        self.btnImportProducts.setStyleSheet("background-color: #009688;")
+        hl2.addWidget(self.btnImportProducts)
+        # ★ NÚT MỚI: Ghi phiếu nhập hàng (imports.json + sổ cái kho)
+        self.btnReceipt = QtWidgets.QPushButton("🚚 Nhập hàng")
+        self.btnReceipt.setStyleSheet("background-color: #3F51B5;")
+        hl2.addWidget(self.btnReceipt)
         hl2.addItem(QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Policy.Expanding,
                                            QtWidgets.QSizePolicy.Policy.Minimum))
         self.btnLowStock = QtWidgets.QPushButton("⚠️ Sắp hết hàng")
@@ -211,6 +219,14 @@ QStatusBar {
         self.btnExportPDF = QtWidgets.QPushButton("📊 Xuất Excel")
         self.btnExportPDF.setStyleSheet("background-color: #217346;")
         hl5.addWidget(self.btnExportPDF)
+        # ★ NÚT MỚI: Xuất hóa đơn PDF
+        self.btnExportInvoicePDF = QtWidgets.QPushButton("📄 Xuất PDF")
+        self.btnExportInvoicePDF.setStyleSheet("background-color: #D32F2F;")
+        hl5.addWidget(self.btnExportInvoicePDF)
+        # ★ NÚT MỚI: In gộp nhiều hóa đơn vào một file PDF
+        self.btnPrintBatch = QtWidgets.QPushButton("🖨️ In gộp")
+        self.btnPrintBatch.setStyleSheet("background-color: #795548;")
+        hl5.addWidget(self.btnPrintBatch)
         vl4.addLayout(hl5)
         hl7.addWidget(grp_orders)
 
@@ -340,14 +356,19 @@ QStatusBar {
         self.lblTotalRevenue.setStyleSheet(
             "font-size: 18px; padding: 10px; color: #4CAF50; font-weight: bold;")
         vl9.addWidget(self.lblTotalRevenue)
+        # ★ NHÃN MỚI: Lãi gộp (doanh thu - giá vốn nhập hàng)
+        self.lblGrossMargin = QtWidgets.QLabel("📊 Lãi gộp: 0đ")
+        self.lblGrossMargin.setStyleSheet(
+            "font-size: 18px; padding: 10px; color: #009688; font-weight: bold;")
+        vl9.addWidget(self.lblGrossMargin)
         hl10.addWidget(grp4)
 
         grp5 = QtWidgets.QGroupBox("🏆 Top sản phẩm bán chạy")
         grp5.setStyleSheet("QGroupBox { background-color: white; }")
         vl10 = QtWidgets.QVBoxLayout(grp5)
         self.tblTopProducts = QtWidgets.QTableWidget()
-        self.tblTopProducts.setColumnCount(4)
-        self.tblTopProducts.setHorizontalHeaderLabels(["Hạng", "Sản phẩm", "Đã bán", "Doanh thu"])
+        self.tblTopProducts.setColumnCount(5)
+        self.tblTopProducts.setHorizontalHeaderLabels(["Hạng", "Sản phẩm", "Đã bán", "Doanh thu", "Lãi gộp"])
         vl10.addWidget(self.tblTopProducts)
         hl10.addWidget(grp5)
         vl8.addLayout(hl10)
@@ -357,9 +378,10 @@ QStatusBar {
         vl11 = QtWidgets.QVBoxLayout(grp6)
         self.tblLowStock = QtWidgets.QTableWidget()
         self.tblLowStock.setMaximumHeight(200)
-        self.tblLowStock.setColumnCount(5)
+        self.tblLowStock.setColumnCount(7)
         self.tblLowStock.setHorizontalHeaderLabels(
-            ["Trạng thái", "Sản phẩm", "Tồn kho", "Tối thiểu", "Đề xuất nhập"])
+            ["Trạng thái", "Sản phẩm", "Tồn kho", "Tối thiểu", "Bán/ngày",
+             "Điểm đặt hàng", "Đề xuất nhập"])
         vl11.addWidget(self.tblLowStock)
         vl8.addWidget(grp6)
 
@@ -387,6 +387,11 @@ class Ui_CustomerWindow(object):
         sep.setStyleSheet("border: 1px solid #f0e6ef;")
         vl_co.addWidget(sep)
 
+        self.lblCartAlsoBought = QtWidgets.QLabel("")
+        self.lblCartAlsoBought.setWordWrap(True)
+        self.lblCartAlsoBought.setStyleSheet("font-size: 13px; color: #7b1fa2; padding: 6px;")
+        vl_co.addWidget(self.lblCartAlsoBought)
+
         vl_co.addWidget(QtWidgets.QLabel("Ghi chú đơn hàng:"))
         self.txtOrderNote = QtWidgets.QLineEdit()
         self.txtOrderNote.setPlaceholderText("Ghi chú cho shop...")